@@ -0,0 +1,48 @@
+import threading
+import time
+
+
+class CancelledDatesCache:
+    """
+    In-memory set of blackout dates ('YYYY-MM-DD' strings) from `cancelled_dates`.
+
+    Generation runs on every cron tick and only needs membership checks, so the
+    table is read once and then kept in memory. The add/remove endpoints update
+    the set in place; changes made by other instances are picked up after
+    `ttl_seconds`.
+    """
+
+    def __init__(self, supabase_client, ttl_seconds=300):
+        self.supabase = supabase_client
+        self.ttl_seconds = ttl_seconds
+        self._dates = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def _load(self):
+        res = self.supabase.table("cancelled_dates").select("date").execute()
+        self._dates = {str(row["date"])[:10] for row in (res.data or [])}
+        self._loaded_at = time.monotonic()
+
+    def dates(self):
+        with self._lock:
+            if self._dates is None or time.monotonic() - self._loaded_at > self.ttl_seconds:
+                self._load()
+            return frozenset(self._dates)
+
+    def __contains__(self, date_str):
+        return str(date_str)[:10] in self.dates()
+
+    def add(self, date_str):
+        with self._lock:
+            if self._dates is not None:
+                self._dates.add(str(date_str)[:10])
+
+    def discard(self, date_str):
+        with self._lock:
+            if self._dates is not None:
+                self._dates.discard(str(date_str)[:10])
+
+    def invalidate(self):
+        with self._lock:
+            self._dates = None
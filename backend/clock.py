@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta, timezone
+
+
+class SystemClock:
+    """Wall-clock time in UTC. The default clock for the app."""
+
+    def now(self):
+        return datetime.now(timezone.utc)
+
+
+class SimulatedClock:
+    """
+    A manually driven clock for simulations and tests.
+    Time only moves when `set` or `advance` is called.
+    """
+
+    def __init__(self, start):
+        if start.tzinfo is None:
+            start = start.replace(tzinfo=timezone.utc)
+        self._now = start
+
+    def now(self):
+        return self._now
+
+    def set(self, when):
+        if when < self._now:
+            raise ValueError(f"SimulatedClock cannot move backwards ({self._now.isoformat()} -> {when.isoformat()})")
+        self._now = when
+
+    def advance(self, delta=None, **kwargs):
+        self.set(self._now + (delta or timedelta(**kwargs)))
+
+
+_clock = SystemClock()
+
+def get_clock():
+    return _clock
+
+def set_clock(clock):
+    """Swaps the process-wide clock. Returns the previous one so callers can restore it."""
+    global _clock
+    previous = _clock
+    _clock = clock
+    return previous
+
+def get_now():
+    return _clock.now()
@@ -1,5 +1,8 @@
 from supabase import create_client, Client
+import asyncio
+import functools
 import os
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
 load_dotenv(os.path.join(os.path.dirname(__file__), '.env'))
@@ -20,3 +23,17 @@ except Exception as e:
     class DummyClient:
         def table(self, *args): raise Exception("Database not connected")
     supabase = DummyClient()
+
+# The supabase client is synchronous. Async handlers hand their queries to this
+# pool so a request waiting on PostgREST does not stall the event loop; its size
+# bounds the number of database calls in flight per worker.
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "32"))
+_db_executor = ThreadPoolExecutor(max_workers=DB_POOL_SIZE, thread_name_prefix="db")
+
+async def run_db(query):
+    """Executes a query builder (e.g. `supabase.table("events").select("*")`) in the database pool."""
+    return await asyncio.get_running_loop().run_in_executor(_db_executor, query.execute)
+
+async def run_db_call(fn, *args, **kwargs):
+    """Runs a blocking function that talks to the database (auth calls, logic helpers) in the database pool."""
+    return await asyncio.get_running_loop().run_in_executor(_db_executor, functools.partial(fn, *args, **kwargs))
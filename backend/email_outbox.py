@@ -0,0 +1,306 @@
+import asyncio
+import hashlib
+import os
+import random
+from datetime import datetime, timedelta, timezone
+
+from email_service import EmailService, EMAIL_BATCH_SIZE
+from email_templates import render_digest
+
+# Provider requests per second (Resend's default limit is 2; a batch call counts once)
+EMAIL_RATE_PER_SECOND = float(os.environ.get("EMAIL_RATE_PER_SECOND", "2"))
+
+# Digest window: non-urgent messages to the same recipient within one window
+# are combined into a single email at the end of it. 0 disables digests.
+EMAIL_DIGEST_MINUTES = int(os.environ.get("EMAIL_DIGEST_MINUTES", "0"))
+
+
+def dedup_key(scope, to_email, subject):
+    """Same scope + recipient + subject -> same key, so a message is only queued once."""
+    return hashlib.sha256(f"{scope}|{to_email}|{subject}".encode()).hexdigest()
+
+
+class OutboxCollector(EmailService):
+    """
+    EmailService that renders messages into outbox rows instead of sending them,
+    so they can be written together with the state change that caused them.
+    With a `scope` (e.g. "<event_id>:FINAL_ORDERING") every row gets a dedup key.
+    """
+
+    def __init__(self, scope=None):
+        self.scope = scope
+        self.messages = []
+
+    def _send(self, to_email: str, subject: str, html_content: str, digest: bool = False):
+        self.messages.append({
+            "to_email": to_email,
+            "subject": subject,
+            "html": html_content,
+            "dedup_key": dedup_key(self.scope, to_email, subject) if self.scope else None,
+            "digest": digest,
+        })
+        return {"id": "outbox"}
+
+    def _send_batch(self, to_emails: list, subject: str, html_content: str, digest: bool = False):
+        return [{"to": to, "id": self._send(to, subject, html_content, digest)["id"]} for to in dict.fromkeys(e for e in to_emails if e)]
+
+
+class EmailOutbox:
+    """
+    Durable email queue on the `email_outbox` table, plus the background
+    dispatcher that drains it.
+
+    Messages are claimed with a lease (`next_attempt_at` is pushed forward), so
+    several instances can dispatch at once and a crashed dispatcher's claims are
+    picked up again once the lease runs out (delivery is at-least-once). Failed
+    sends are retried with exponential backoff; after `max_attempts` the row is
+    marked DEAD and left for an admin to inspect or retry.
+
+    With `digest_minutes`, messages marked `digest` are held until the end of
+    the current window (windows are aligned to the clock, so every message to
+    a recipient in one window comes due together) and the dispatcher sends each
+    recipient one combined email. Urgent messages are never held.
+    """
+
+    def __init__(self, supabase_client, service, rate_per_second=EMAIL_RATE_PER_SECOND, max_attempts=8,
+                 base_delay_seconds=30, max_delay_seconds=3600, lease_seconds=300, poll_seconds=2.0, now_fn=None,
+                 digest_minutes=EMAIL_DIGEST_MINUTES):
+        self.supabase = supabase_client
+        self.service = service
+        self.rate_per_second = rate_per_second
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay_seconds
+        self.max_delay = max_delay_seconds
+        self.lease = timedelta(seconds=lease_seconds)
+        self.poll_seconds = poll_seconds
+        self.now_fn = now_fn or (lambda: datetime.now(timezone.utc))
+        self.digest_minutes = digest_minutes
+        self._task = None
+
+    # --- Writing ---
+
+    def collector(self, scope=None):
+        return OutboxCollector(scope)
+
+    def digest_release(self, now):
+        """End of the digest window containing `now`."""
+        window = self.digest_minutes * 60
+        release = (int(now.timestamp()) // window + 1) * window
+        return datetime.fromtimestamp(release, timezone.utc)
+
+    def _rows(self, messages, now):
+        # Digest messages wait for the end of the window, everything else is due now
+        release = self.digest_release(now) if self.digest_minutes > 0 else now
+        rows = []
+        for m in messages:
+            digest = bool(m.get("digest")) and self.digest_minutes > 0
+            rows.append(dict(m, digest=digest, next_attempt_at=(release if digest else now).isoformat()))
+        return rows
+
+    def enqueue(self, messages, event_id=None):
+        """
+        Queues rendered messages (see OutboxCollector). Rows whose dedup key is
+        already in the table are skipped.
+
+        Returns:
+            list: one {"to", "id"} per message; "id" is None for skipped duplicates
+        """
+        rows = [dict(row, event_id=event_id) for row in self._rows(messages, self.now_fn())]
+        keyed = [r for r in rows if r.get("dedup_key")]
+        unkeyed = [r for r in rows if not r.get("dedup_key")]
+
+        written = []
+        if keyed:
+            res = self.supabase.table("email_outbox").upsert(keyed, on_conflict="dedup_key", ignore_duplicates=True).execute()
+            written.extend(res.data or [])
+        if unkeyed:
+            res = self.supabase.table("email_outbox").insert(unkeyed).execute()
+            written.extend(res.data or [])
+
+        ids = {(w.get("dedup_key"), w["to_email"], w["subject"]): w["id"] for w in written}
+        return [{"to": r["to_email"], "id": ids.get((r.get("dedup_key"), r["to_email"], r["subject"]))} for r in rows]
+
+    def claim_transition(self, event_id, from_status, to_status, messages):
+        """
+        Compare-and-set of the event's status and insertion of its notifications
+        in one transaction (the `transition_event_with_outbox` function).
+        Returns False when another run already moved the event.
+        """
+        res = self.supabase.rpc("transition_event_with_outbox", {
+            "p_event_id": event_id,
+            "p_from": from_status,
+            "p_to": to_status,
+            "p_messages": self._rows(messages, self.now_fn()),
+        }).execute()
+        return bool(res.data)
+
+    def set_events_status(self, event_ids, from_statuses, to_status, messages):
+        """
+        Moves every event in `event_ids` to `to_status` and inserts `messages` in
+        one transaction (the `set_events_status_with_outbox` function). All or
+        nothing: returns [] when any of them is no longer AUTOMATIC and in one
+        of `from_statuses`, otherwise the updated events.
+        """
+        res = self.supabase.rpc("set_events_status_with_outbox", {
+            "p_event_ids": list(event_ids),
+            "p_from": list(from_statuses),
+            "p_to": to_status,
+            "p_messages": self._rows(messages, self.now_fn()),
+        }).execute()
+        return res.data or []
+
+    def move_signup(self, signup_id, from_list, to_list, sequence_number, messages):
+        """
+        Compare-and-set of a signup's list (the `move_signup_with_outbox`
+        function) plus its notifications, atomically. Returns False when the
+        signup is no longer on `from_list`.
+        """
+        res = self.supabase.rpc("move_signup_with_outbox", {
+            "p_signup_id": signup_id,
+            "p_from": from_list,
+            "p_to": to_list,
+            "p_sequence_number": sequence_number,
+            "p_messages": self._rows(messages, self.now_fn()),
+        }).execute()
+        return bool(res.data)
+
+    def retry(self, outbox_id):
+        """Puts a DEAD message back in the queue."""
+        res = self.supabase.table("email_outbox")\
+            .update({"status": "PENDING", "attempts": 0, "next_attempt_at": self.now_fn().isoformat(), "last_error": None})\
+            .eq("id", outbox_id)\
+            .eq("status", "DEAD")\
+            .execute()
+        return res.data[0] if res.data else None
+
+    # --- Dispatching ---
+
+    def claim(self, now, limit=EMAIL_BATCH_SIZE):
+        """
+        Leases up to `limit` due messages, plus every other due digest message
+        to the digest recipients among them, so a recipient's digest is never
+        split across claims. Only rows whose lease this call took are returned.
+        """
+        due_res = self.supabase.table("email_outbox")\
+            .select("id")\
+            .in_("status", ["PENDING", "SENDING"])\
+            .lte("next_attempt_at", now.isoformat())\
+            .order("next_attempt_at")\
+            .limit(limit)\
+            .execute()
+        ids = [row["id"] for row in (due_res.data or [])]
+        if not ids:
+            return []
+        res = self.supabase.table("email_outbox")\
+            .update({"status": "SENDING", "next_attempt_at": (now + self.lease).isoformat()})\
+            .in_("id", ids)\
+            .in_("status", ["PENDING", "SENDING"])\
+            .lte("next_attempt_at", now.isoformat())\
+            .execute()
+        rows = res.data or []
+
+        recipients = list(dict.fromkeys(row["to_email"] for row in rows if row.get("digest")))
+        if recipients:
+            rest_res = self.supabase.table("email_outbox")\
+                .update({"status": "SENDING", "next_attempt_at": (now + self.lease).isoformat()})\
+                .in_("to_email", recipients)\
+                .eq("digest", True)\
+                .in_("status", ["PENDING", "SENDING"])\
+                .lte("next_attempt_at", now.isoformat())\
+                .execute()
+            rows.extend(rest_res.data or [])
+        return rows
+
+    def backoff(self, attempts):
+        delay = min(self.base_delay * 2 ** (attempts - 1), self.max_delay)
+        return timedelta(seconds=delay * random.uniform(1.0, 1.1))
+
+    def record_results(self, rows, results, now):
+        """Marks delivered rows SENT in one update; failed rows are rescheduled or dead-lettered."""
+        sent_ids = []
+        for row, result in zip(rows, results):
+            if result and result.get("id"):
+                sent_ids.append(row["id"])
+                continue
+            attempts = (row.get("attempts") or 0) + 1
+            error = (result or {}).get("error") or "send failed"
+            if attempts >= self.max_attempts:
+                print(f"Email outbox: giving up on {row['to_email']} ({row['subject']}) after {attempts} attempts: {error}")
+                update = {"status": "DEAD", "attempts": attempts, "last_error": error}
+            else:
+                update = {"status": "PENDING", "attempts": attempts, "last_error": error, "next_attempt_at": (now + self.backoff(attempts)).isoformat()}
+            self.supabase.table("email_outbox").update(update).eq("id", row["id"]).execute()
+
+        if sent_ids:
+            self.supabase.table("email_outbox")\
+                .update({"status": "SENT", "sent_at": now.isoformat()})\
+                .in_("id", sent_ids)\
+                .execute()
+        return len(sent_ids)
+
+    async def dispatch_once(self):
+        """
+        Claims one batch of due messages and delivers them: messages with the
+        same subject and body share a provider batch call, and a recipient's
+        due digest messages go out as one combined email. Calls are paced to
+        `rate_per_second`. Returns the number of messages claimed.
+        """
+        now = self.now_fn()
+        rows = await asyncio.to_thread(self.claim, now)
+        if not rows:
+            return 0
+
+        # Each recipient's held digest messages become one combined email
+        digests = {}
+        for row in rows:
+            if row.get("digest"):
+                digests.setdefault(row["to_email"], []).append(row)
+
+        sends = []
+        groups = {}
+        for row in rows:
+            held = digests.get(row["to_email"]) if row.get("digest") else None
+            if held and len(held) > 1:
+                if held[0] is row:
+                    subject, html = render_digest([(r["subject"], r["html"]) for r in held])
+                    sends.append((subject, html, held, True))
+                continue
+            groups.setdefault((row["subject"], row["html"]), []).append(row)
+        sends.extend((subject, html, group, False) for (subject, html), group in groups.items())
+
+        for i, (subject, html, group, combined) in enumerate(sends):
+            if i and self.rate_per_second:
+                await asyncio.sleep(1 / self.rate_per_second)
+            if combined:
+                # One email covers every held row
+                result = (await self.service._send_batch_async([group[0]["to_email"]], subject, html))[0]
+                results = [result] * len(group)
+            else:
+                results = await self.service._send_batch_async([row["to_email"] for row in group], subject, html)
+            await asyncio.to_thread(self.record_results, group, results, self.now_fn())
+        return len(rows)
+
+    async def run(self):
+        while True:
+            try:
+                claimed = await self.dispatch_once()
+            except Exception as e:
+                print(f"Email outbox: dispatch failed: {e}")
+                claimed = 0
+            # Keep draining while there is a backlog
+            if not claimed:
+                await asyncio.sleep(self.poll_seconds)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run())
+        return self._task
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
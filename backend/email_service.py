@@ -1,41 +1,233 @@
 
+import asyncio
 import os
 import resend
 
+from email_sinks import sink_from_env
+from email_templates import render_event_notification, render_date_change, format_event_date, PROMOTED, NOBODY_PROMOTED
+
 RESEND_API_KEY = os.environ.get("RESEND_API_KEY")
+RESEND_API_URL = "https://api.resend.com"
+FROM_ADDRESS = "Skeddle <support@skeddle.net>" # Updated to verified domain
+
+# Async delivery: at most this many requests in flight, each bounded by the timeout
+EMAIL_MAX_CONCURRENCY = int(os.environ.get("EMAIL_MAX_CONCURRENCY", "8"))
+EMAIL_TIMEOUT_SECONDS = float(os.environ.get("EMAIL_TIMEOUT_SECONDS", "10"))
+
+# Resend's batch endpoint takes at most 100 messages per call
+EMAIL_BATCH_SIZE = 100
 
 class EmailService:
-    def __init__(self):
-        if RESEND_API_KEY:
+    def __init__(self, transport=None, sink=None):
+        self._sink = sink if sink is not None else sink_from_env() # local delivery instead of Resend (email_sinks)
+        if self._sink is not None:
+            print(f"Email delivery goes to {self._sink!r} instead of Resend.")
+        elif RESEND_API_KEY:
             resend.api_key = RESEND_API_KEY
         else:
             print("WARNING: RESEND_API_KEY not set. Email sending will be skipped (or mocked).")
+        self._transport = transport # httpx transport override for the async client
+        self._client = None
+        self._semaphore = None
+        self._loop = None
+        self._pending = set()
+        self._outbox = None
+
+    def _params(self, to_email: str, subject: str, html_content: str):
+        return {
+            "from": FROM_ADDRESS,
+            "to": [to_email],
+            "subject": subject,
+            "html": html_content,
+        }
+
+    def _mock_send(self, to_email: str, subject: str, html_content: str):
+        print(f"--- MOCK EMAIL ---")
+        print(f"To: {to_email}")
+        print(f"Subject: {subject}")
+        print(f"Body: {html_content[:100]}...")
+        print(f"------------------")
+        return {"id": "mock-email-id"}
+
+    def _sink_batch(self, to_emails: list, subject: str, html_content: str):
+        try:
+            sent = self._sink.send([self._params(to, subject, html_content) for to in to_emails])
+            return [{"to": to, "id": result["id"]} for to, result in zip(to_emails, sent)]
+        except Exception as e:
+            print(f"Error sending {len(to_emails)} emails to {self._sink!r} ({subject}): {e}")
+            return [{"to": to, "id": None, "error": str(e)} for to in to_emails]
 
-    def _send(self, to_email: str, subject: str, html_content: str):
+    def _send(self, to_email: str, subject: str, html_content: str, digest: bool = False):
         """
         Internal wrapper to send email via Resend if key exists, else print mock.
+        After `start()`, delivery is queued on the event loop instead (see _send_async);
+        with an outbox (`use_outbox`) the message is written to email_outbox.
+        `digest` marks messages that may wait for the recipient's digest (outbox only).
         """
+        if self._outbox is not None:
+            return self._outbox.enqueue([{"to_email": to_email, "subject": subject, "html": html_content, "digest": digest}])[0]
+        if self._loop is not None:
+            if self._schedule(self._send_async(to_email, subject, html_content)):
+                return {"id": "queued"}
+
+        if self._sink is not None:
+            result = self._sink_batch([to_email], subject, html_content)[0]
+            return result if result["id"] else None
         if not RESEND_API_KEY:
-            print(f"--- MOCK EMAIL ---")
-            print(f"To: {to_email}")
-            print(f"Subject: {subject}")
-            print(f"Body: {html_content[:100]}...")
-            print(f"------------------")
-            return {"id": "mock-email-id"}
+            return self._mock_send(to_email, subject, html_content)
 
         try:
-            params = {
-                "from": "Skeddle <support@skeddle.net>", # Updated to verified domain
-                "to": [to_email],
-                "subject": subject,
-                "html": html_content,
-            }
-            email = resend.Emails.send(params)
+            email = resend.Emails.send(self._params(to_email, subject, html_content))
             return email
         except Exception as e:
             print(f"Error sending email to {to_email}: {e}")
             return None
 
+    def _send_batch(self, to_emails: list, subject: str, html_content: str, digest: bool = False):
+        """
+        Sends the same message to each recipient (one email each, so addresses
+        are not shared) through Resend's batch endpoint, EMAIL_BATCH_SIZE per call.
+        Recipients are deduplicated, keeping their order.
+
+        Returns:
+            list: one {"to", "id"} per recipient; "id" is None (with an "error")
+            when that recipient's chunk failed
+        """
+        to_emails = list(dict.fromkeys(e for e in to_emails if e))
+        if not to_emails:
+            return []
+        if self._outbox is not None:
+            return self._outbox.enqueue([{"to_email": to, "subject": subject, "html": html_content, "digest": digest} for to in to_emails])
+        if self._loop is not None:
+            if self._schedule(self._send_batch_async(to_emails, subject, html_content)):
+                return [{"to": to, "id": "queued"} for to in to_emails]
+
+        if self._sink is not None:
+            return self._sink_batch(to_emails, subject, html_content)
+        if not RESEND_API_KEY:
+            return [{"to": to, "id": self._mock_send(to, subject, html_content)["id"]} for to in to_emails]
+
+        results = []
+        for start in range(0, len(to_emails), EMAIL_BATCH_SIZE):
+            chunk = to_emails[start:start + EMAIL_BATCH_SIZE]
+            try:
+                res = resend.Batch.send([self._params(to, subject, html_content) for to in chunk])
+                results.extend(self._batch_results(chunk, res))
+            except Exception as e:
+                print(f"Error sending batch of {len(chunk)} emails ({subject}): {e}")
+                results.extend({"to": to, "id": None, "error": str(e)} for to in chunk)
+        return results
+
+    def _batch_results(self, chunk, response):
+        # The batch response lists the created emails in request order
+        data = (response or {}).get("data") or []
+        return [
+            {"to": to, "id": data[i].get("id")} if i < len(data) else {"to": to, "id": None, "error": "missing from batch response"}
+            for i, to in enumerate(chunk)
+        ]
+
+    # --- Async delivery ---
+
+    def _get_client(self):
+        # One keep-alive connection pool per event loop, created on first use
+        if self._client is None:
+            import httpx
+            self._client = httpx.AsyncClient(
+                base_url=RESEND_API_URL,
+                headers={"Authorization": f"Bearer {RESEND_API_KEY}"},
+                timeout=httpx.Timeout(EMAIL_TIMEOUT_SECONDS, connect=5.0),
+                limits=httpx.Limits(max_connections=EMAIL_MAX_CONCURRENCY, max_keepalive_connections=EMAIL_MAX_CONCURRENCY),
+                transport=self._transport,
+            )
+            self._semaphore = asyncio.Semaphore(EMAIL_MAX_CONCURRENCY)
+        return self._client
+
+    async def _send_async(self, to_email: str, subject: str, html_content: str):
+        """
+        Async equivalent of `_send` over the shared HTTP client. Never raises:
+        returns the provider response, or None on failure.
+        """
+        if self._sink is not None:
+            result = (await asyncio.to_thread(self._sink_batch, [to_email], subject, html_content))[0]
+            return result if result["id"] else None
+        if not RESEND_API_KEY:
+            return self._mock_send(to_email, subject, html_content)
+
+        client = self._get_client()
+        try:
+            async with self._semaphore:
+                res = await client.post("/emails", json=self._params(to_email, subject, html_content))
+            res.raise_for_status()
+            return res.json()
+        except Exception as e:
+            print(f"Error sending email to {to_email}: {e}")
+            return None
+
+    async def _send_batch_async(self, to_emails: list, subject: str, html_content: str):
+        """Async equivalent of `_send_batch`; chunks are posted concurrently (bounded by the semaphore)."""
+        if self._sink is not None:
+            return await asyncio.to_thread(self._sink_batch, to_emails, subject, html_content)
+        if not RESEND_API_KEY:
+            return [{"to": to, "id": self._mock_send(to, subject, html_content)["id"]} for to in to_emails]
+
+        client = self._get_client()
+
+        async def post_chunk(chunk):
+            try:
+                async with self._semaphore:
+                    res = await client.post("/emails/batch", json=[self._params(to, subject, html_content) for to in chunk])
+                res.raise_for_status()
+                return self._batch_results(chunk, res.json())
+            except Exception as e:
+                print(f"Error sending batch of {len(chunk)} emails ({subject}): {e}")
+                return [{"to": to, "id": None, "error": str(e)} for to in chunk]
+
+        chunks = [to_emails[i:i + EMAIL_BATCH_SIZE] for i in range(0, len(to_emails), EMAIL_BATCH_SIZE)]
+        return [r for chunk_results in await asyncio.gather(*(post_chunk(c) for c in chunks)) for r in chunk_results]
+
+    def use_outbox(self, outbox):
+        """Routes every send_* call into the durable email_outbox (see email_outbox.EmailOutbox)."""
+        self._outbox = outbox
+
+    def start(self, loop=None):
+        """
+        Switches to fire-and-forget delivery on `loop` (the app's running loop):
+        send_* calls queue their messages and return immediately, including
+        calls from worker threads (asyncio.to_thread).
+        """
+        self._loop = loop or asyncio.get_running_loop()
+
+    def _track(self, coro):
+        task = asyncio.get_running_loop().create_task(coro)
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    def _schedule(self, coro):
+        """Queues `coro` on the app loop. Returns False (and drops it) when there is none."""
+        app_loop = self._loop
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if app_loop is not None and loop is app_loop:
+            self._track(coro)
+            return True
+        if app_loop is not None and loop is None and app_loop.is_running():
+            # Called from a worker thread: hand over to the app loop
+            app_loop.call_soon_threadsafe(self._track, coro)
+            return True
+        coro.close()
+        return False
+
+    async def aclose(self, timeout: float = EMAIL_TIMEOUT_SECONDS):
+        """Waits (briefly) for queued messages, then closes the HTTP client."""
+        self._loop = None
+        if self._pending:
+            await asyncio.wait(list(self._pending), timeout=timeout)
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
     def send_user_acknowledgement(self, to_email: str, name: str):
         subject = "Registration Request Received - Skeddle"
         html = f"""
@@ -157,154 +349,71 @@ class EmailService:
     
     def _format_event_date(self, event_data: dict) -> str:
         """Helper to format ISO datetime cleanly for emails."""
-        from datetime import datetime
-        try:
-            dt = datetime.fromisoformat(str(event_data.get('event_date')).replace('Z', '+00:00'))
-            return dt.strftime("%A, %B %d, %Y at %I:%M %p")
-        except Exception:
-            return str(event_data.get('event_date', 'Unknown Date'))
+        return format_event_date(event_data.get('event_date', 'Unknown Date'))
+
+    def _render_event(self, kind: str, event_data: dict, **fields):
+        # Memoized: the HTML is built once per event and notification type
+        return render_event_notification(kind, event_data.get('name'), event_data.get('event_date'), **fields)
 
     def send_roster_open_notification(self, event_data: dict, group_email: str):
         if not group_email: return None
-        date_str = self._format_event_date(event_data)
-        subject = f"Signups Open: {event_data.get('name', 'Event')}"
-        
-        html = f"""
-        <html>
-            <body style="font-family: sans-serif; color: #333; line-height: 1.5;">
-                <p>Hello Roster Member,</p>
-                <p>Signups are now <strong>OPEN</strong> for the following event:</p>
-                <div style="background: #f4f6f8; padding: 15px; border-left: 4px solid #4CAF50; margin: 20px 0;">
-                    <h3 style="margin-top: 0;">{event_data.get('name')}</h3>
-                    <p><strong>Date:</strong> {date_str}</p>
-                </div>
-                <p>Please log in to your account to sign up or opt-out.</p>
-                <p><a href="https://bethamhoops.skeddle.net" style="background-color: #2196F3; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px; display: inline-block;">Go to Skeddle</a></p>
-                <br>
-                <p>Best,<br>The Skeddle Team</p>
-            </body>
-        </html>
-        """
-        return self._send(group_email, subject, html)
+        subject, html = self._render_event("roster_open", event_data)
+        return self._send(group_email, subject, html, digest=True)
 
     def send_reserve_open_notification(self, event_data: dict, group_email: str):
         if not group_email: return None
-        date_str = self._format_event_date(event_data)
-        subject = f"Waitlist/Reserve Open: {event_data.get('name', 'Event')}"
-        
-        html = f"""
-        <html>
-            <body style="font-family: sans-serif; color: #333; line-height: 1.5;">
-                <p>Hello Reserves,</p>
-                <p>The reserve signing window is now <strong>OPEN</strong> for the following event:</p>
-                <div style="background: #f4f6f8; padding: 15px; border-left: 4px solid #FF9800; margin: 20px 0;">
-                    <h3 style="margin-top: 0;">{event_data.get('name')}</h3>
-                    <p><strong>Date:</strong> {date_str}</p>
-                </div>
-                <p>Please log in to add your name to the holding queue. The preliminary schedule will be finalized soon.</p>
-                <p><a href="https://bethamhoops.skeddle.net" style="background-color: #2196F3; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px; display: inline-block;">Go to Skeddle</a></p>
-                <br>
-                <p>Best,<br>The Skeddle Team</p>
-            </body>
-        </html>
-        """
-        return self._send(group_email, subject, html)
+        subject, html = self._render_event("reserve_open", event_data)
+        return self._send(group_email, subject, html, digest=True)
 
     def send_initial_schedule_notification(self, event_data: dict, roster_email: str, reserve_emails: list):
-        date_str = self._format_event_date(event_data)
-        subject = f"Initial Schedule Released: {event_data.get('name', 'Event')}"
-        
         # Combine roster group email and individual reserve emails
         to_emails = []
         if roster_email: to_emails.append(roster_email)
         if reserve_emails: to_emails.extend(reserve_emails)
-        
+
         if not to_emails: return None
-        
-        html = f"""
-        <html>
-            <body style="font-family: sans-serif; color: #333; line-height: 1.5;">
-                <p>Hello,</p>
-                <p>The <strong>Preliminary Schedule</strong> has been generated for:</p>
-                <div style="background: #f4f6f8; padding: 15px; border-left: 4px solid #2196F3; margin: 20px 0;">
-                    <h3 style="margin-top: 0;">{event_data.get('name')}</h3>
-                    <p><strong>Date:</strong> {date_str}</p>
-                </div>
-                <p>Please log in to check the event page. If you are on the list but can no longer attend, please remove yourself immediately to allow others to play.</p>
-                <p><a href="https://bethamhoops.skeddle.net" style="background-color: #2196F3; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px; display: inline-block;">Go to Skeddle</a></p>
-                <br>
-                <p>Best,<br>The Skeddle Team</p>
-            </body>
-        </html>
-        """
-        # Batch send or loop (Resend API allows batch or comma separated in some plans, we'll loop for safety if not supported, but let's try looping to trigger individual mock prints correctly)
-        results = []
-        for email in list(set(to_emails)): # Deduplicate
-            res = self._send(email, subject, html)
-            results.append(res)
-        return results
+
+        subject, html = self._render_event("initial_schedule", event_data)
+        return self._send_batch(to_emails, subject, html, digest=True)
 
     def send_final_schedule_notification(self, event_data: dict, roster_email: str, lineup_emails: list):
-        date_str = self._format_event_date(event_data)
-        subject = f"Final Schedule Locked: {event_data.get('name', 'Event')}"
-        
         to_emails = []
         if roster_email: to_emails.append(roster_email)
         if lineup_emails: to_emails.extend(lineup_emails)
-        
+
         if not to_emails: return None
-        
-        html = f"""
-        <html>
-            <body style="font-family: sans-serif; color: #333; line-height: 1.5;">
-                <p>Hello,</p>
-                <p>The <strong>Final Schedule</strong> is now locked in for:</p>
-                <div style="background: #f4f6f8; padding: 15px; border-left: 4px solid #9C27B0; margin: 20px 0;">
-                    <h3 style="margin-top: 0;">{event_data.get('name')}</h3>
-                    <p><strong>Date:</strong> {date_str}</p>
-                </div>
-                <p><strong>IMPORTANT:</strong> If anything changes and you cannot play, you MUST remove your signup to allow the waitlist to move up.</p>
-                <p><a href="https://bethamhoops.skeddle.net" style="background-color: #2196F3; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px; display: inline-block;">Check Roster</a></p>
-                <br>
-                <p>Best,<br>The Skeddle Team</p>
-            </body>
-        </html>
-        """
-        results = []
-        for email in list(set(to_emails)):
-            res = self._send(email, subject, html)
-            results.append(res)
-        return results
+
+        subject, html = self._render_event("final_schedule", event_data)
+        return self._send_batch(to_emails, subject, html)
 
     def send_late_stage_change_notification(self, event_data: dict, dropout_name: str, promoted_name: str, all_emails: list):
         if not all_emails: return None
-        date_str = self._format_event_date(event_data)
-        subject = f"Late Roster Change: {event_data.get('name', 'Event')}"
-        
-        promoted_text = f"<p><strong>{promoted_name}</strong> has been promoted from the waitlist! Please confirm your attendance.</p>" if promoted_name else "<p>No waitlist members were available to fill the slot.</p>"
-        
-        html = f"""
-        <html>
-            <body style="font-family: sans-serif; color: #333; line-height: 1.5;">
-                <p>Hello,</p>
-                <p>There has been a late-stage change to the roster for:</p>
-                <div style="background: #fef0f0; padding: 15px; border-left: 4px solid #F44336; margin: 20px 0;">
-                    <h3 style="margin-top: 0;">{event_data.get('name')}</h3>
-                    <p><strong>Date:</strong> {date_str}</p>
-                </div>
-                <p><strong>{dropout_name}</strong> has dropped out of the event.</p>
-                {promoted_text}
-                <p><a href="https://bethamhoops.skeddle.net" style="background-color: #2196F3; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px; display: inline-block;">Review the Roster</a></p>
-                <br>
-                <p>Best,<br>The Skeddle Team</p>
-            </body>
-        </html>
+        promoted_text = PROMOTED.substitute(promoted_name=promoted_name) if promoted_name else NOBODY_PROMOTED
+        subject, html = self._render_event("late_stage_change", event_data, dropout_name=dropout_name, promoted_text=promoted_text)
+        return self._send_batch(all_emails, subject, html)
+
+    def send_date_change_notification(self, date_str: str, events_by_email: dict, cancelled: bool = True, reason: str = None):
+        """
+        Notifies signups about a blackout date that was just added (cancelled=True)
+        or removed. `events_by_email` maps each recipient to the events they are
+        signed up for, so each recipient gets a single email listing only their
+        affected events. Recipients with the same events share one batch send.
         """
+        batches = {}
+        for email, events in events_by_email.items():
+            if events:
+                key = tuple(sorted({str(e["id"]) for e in events}))
+                batches.setdefault(key, ([], events))[0].append(email)
         results = []
-        for email in list(set(all_emails)):
-            res = self._send(email, subject, html)
-            results.append(res)
-        return results
+        for emails, events in batches.values():
+            subject, html = render_date_change(
+                date_str,
+                [(e.get('name') or (e.get('event_types') or {}).get('name', 'Event'), e.get('event_date')) for e in sorted(events, key=lambda e: e.get('event_date') or '')],
+                cancelled=cancelled,
+                reason=reason,
+            )
+            results.extend(self._send_batch(emails, subject, html) or [])
+        return results or None
 
 email_service = EmailService()
 
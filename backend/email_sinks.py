@@ -0,0 +1,86 @@
+"""
+Local delivery sinks for EmailService, so load and integration tests can run
+the real send paths without network access. Pick one with EMAIL_SINK:
+
+    EMAIL_SINK=file:/tmp/skeddle-emails.jsonl   # one JSON object per email
+    EMAIL_SINK=smtp://localhost:1025            # e.g. MailHog or `python -m aiosmtpd -n`
+
+A sink takes precedence over Resend. Each sink has a blocking `send(messages)`
+taking Resend-style params ({"from", "to", "subject", "html"}) and returning
+one {"id"} per message; the async paths run it in a worker thread.
+"""
+
+import json
+import os
+import smtplib
+import threading
+import uuid
+from datetime import datetime, timezone
+from email.message import EmailMessage
+from email.utils import make_msgid
+from urllib.parse import urlparse
+
+
+class FileSink:
+    """Appends every email as a JSON line to `path`. Safe to share between threads."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def send(self, messages):
+        sent_at = datetime.now(timezone.utc).isoformat()
+        records = [dict(m, id=str(uuid.uuid4()), sent_at=sent_at) for m in messages]
+        lines = "".join(json.dumps(record) + "\n" for record in records)
+        with self._lock, open(self.path, "a") as f:
+            f.write(lines)
+        return [{"id": record["id"]} for record in records]
+
+    def read(self):
+        """Every email written so far, oldest first."""
+        if not os.path.exists(self.path):
+            return []
+        with self._lock, open(self.path) as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def __repr__(self):
+        return f"FileSink({self.path!r})"
+
+
+class SmtpSink:
+    """Hands emails to a local SMTP server (no auth or TLS), one connection per call."""
+
+    def __init__(self, host="localhost", port=1025, timeout=10.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+    def send(self, messages):
+        results = []
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            for m in messages:
+                msg = EmailMessage()
+                msg["From"] = m["from"]
+                msg["To"] = ", ".join(m["to"])
+                msg["Subject"] = m["subject"]
+                msg["Message-ID"] = make_msgid(domain="skeddle.local")
+                msg.set_content(m["html"], subtype="html")
+                smtp.send_message(msg)
+                results.append({"id": msg["Message-ID"]})
+        return results
+
+    def __repr__(self):
+        return f"SmtpSink({self.host!r}, {self.port})"
+
+
+def sink_from_env(value=None):
+    """Builds the sink named by EMAIL_SINK (or `value`); None when unset."""
+    value = os.environ.get("EMAIL_SINK") if value is None else value
+    if not value:
+        return None
+    if value.startswith("file:"):
+        return FileSink(value[len("file:"):])
+    parsed = urlparse(value)
+    if parsed.scheme == "smtp":
+        return SmtpSink(parsed.hostname or "localhost", parsed.port or 25)
+    raise ValueError(f"Unsupported EMAIL_SINK: {value}")
@@ -0,0 +1,169 @@
+"""
+Compiled templates for the event notification emails.
+
+The templates are `string.Template`s built once at import. A notification is
+rendered once per event and notification type (`render_event_notification` is
+memoized), so a fan-out to many recipients - or the same message to several
+group aliases - reuses one HTML string instead of rebuilding it per call.
+"""
+
+import re
+from datetime import datetime
+from functools import lru_cache
+from string import Template
+
+APP_URL = "https://bethamhoops.skeddle.net"
+
+LAYOUT = Template("""
+        <html>
+            <body style="font-family: sans-serif; color: #333; line-height: 1.5;">
+                $body
+                <p><a href="$app_url" style="background-color: #2196F3; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px; display: inline-block;">$button</a></p>
+                <br>
+                <p>Best,<br>The Skeddle Team</p>
+            </body>
+        </html>
+        """)
+
+EVENT_CARD = Template("""
+                <div style="background: $background; padding: 15px; border-left: 4px solid $accent; margin: 20px 0;">
+                    <h3 style="margin-top: 0;">$name</h3>
+                    <p><strong>Date:</strong> $date</p>
+                </div>""")
+
+# kind -> subject, card colours, body (around the $event_card) and button label
+EVENT_NOTIFICATIONS = {
+    "roster_open": {
+        "subject": Template("Signups Open: $name"),
+        "accent": "#4CAF50",
+        "body": Template("""<p>Hello Roster Member,</p>
+                <p>Signups are now <strong>OPEN</strong> for the following event:</p>$event_card
+                <p>Please log in to your account to sign up or opt-out.</p>"""),
+        "button": "Go to Skeddle",
+    },
+    "reserve_open": {
+        "subject": Template("Waitlist/Reserve Open: $name"),
+        "accent": "#FF9800",
+        "body": Template("""<p>Hello Reserves,</p>
+                <p>The reserve signing window is now <strong>OPEN</strong> for the following event:</p>$event_card
+                <p>Please log in to add your name to the holding queue. The preliminary schedule will be finalized soon.</p>"""),
+        "button": "Go to Skeddle",
+    },
+    "initial_schedule": {
+        "subject": Template("Initial Schedule Released: $name"),
+        "accent": "#2196F3",
+        "body": Template("""<p>Hello,</p>
+                <p>The <strong>Preliminary Schedule</strong> has been generated for:</p>$event_card
+                <p>Please log in to check the event page. If you are on the list but can no longer attend, please remove yourself immediately to allow others to play.</p>"""),
+        "button": "Go to Skeddle",
+    },
+    "final_schedule": {
+        "subject": Template("Final Schedule Locked: $name"),
+        "accent": "#9C27B0",
+        "body": Template("""<p>Hello,</p>
+                <p>The <strong>Final Schedule</strong> is now locked in for:</p>$event_card
+                <p><strong>IMPORTANT:</strong> If anything changes and you cannot play, you MUST remove your signup to allow the waitlist to move up.</p>"""),
+        "button": "Check Roster",
+    },
+    "late_stage_change": {
+        "subject": Template("Late Roster Change: $name"),
+        "accent": "#F44336",
+        "background": "#fef0f0",
+        "body": Template("""<p>Hello,</p>
+                <p>There has been a late-stage change to the roster for:</p>$event_card
+                <p><strong>$dropout_name</strong> has dropped out of the event.</p>
+                $promoted_text"""),
+        "button": "Review the Roster",
+    },
+}
+
+EVENT_LIST = Template("""
+                <div style="background: #f4f6f8; padding: 15px; border-left: 4px solid $accent; margin: 20px 0;">
+                    <ul style="margin: 0;">$items</ul>
+                </div>""")
+EVENT_LIST_ITEM = Template("<li><strong>$name</strong> &mdash; $date</li>")
+
+DIGEST_SECTION = Template("""
+                <div style="border-top: 1px solid #ddd; padding-top: 10px; margin-top: 20px;">
+                    <h2 style="font-size: 18px;">$subject</h2>
+                    $content
+                </div>""")
+
+# The per-message content a digest keeps: the rendered body minus the shared
+# greeting, call-to-action button and sign-off
+_BODY = re.compile(r"<body[^>]*>(.*?)<p><a href=", re.S)
+_GREETING = re.compile(r"^\s*<p>Hello[^<]*</p>", re.S)
+
+PROMOTED = Template("<p><strong>$promoted_name</strong> has been promoted from the waitlist! Please confirm your attendance.</p>")
+NOBODY_PROMOTED = "<p>No waitlist members were available to fill the slot.</p>"
+
+
+@lru_cache(maxsize=1024)
+def format_event_date(event_date) -> str:
+    """Formats an ISO datetime cleanly for emails (parsed once per distinct value)."""
+    try:
+        dt = datetime.fromisoformat(str(event_date).replace('Z', '+00:00'))
+        return dt.strftime("%A, %B %d, %Y at %I:%M %p")
+    except Exception:
+        return str(event_date if event_date is not None else 'Unknown Date')
+
+
+@lru_cache(maxsize=1024)
+def render_event_notification(kind, name, event_date, **fields):
+    """
+    Renders one event notification.
+
+    Returns:
+        tuple: (subject, html)
+    """
+    spec = EVENT_NOTIFICATIONS[kind]
+    event_card = EVENT_CARD.substitute(
+        background=spec.get("background", "#f4f6f8"),
+        accent=spec["accent"],
+        name=name,
+        date=format_event_date(event_date),
+    )
+    body = spec["body"].substitute(fields, event_card=event_card)
+    html = LAYOUT.substitute(body=body, app_url=APP_URL, button=spec["button"])
+    return spec["subject"].substitute(name=name or 'Event'), html
+
+
+def render_date_change(date_str, events, cancelled=True, reason=None):
+    """
+    Renders the blackout date email listing every affected event.
+    `events` is a list of (name, event_date) pairs.
+
+    Returns:
+        tuple: (subject, html)
+    """
+    if cancelled:
+        subject = f"Events Cancelled: {date_str}"
+        intro = "The following events have been <strong>CANCELLED</strong>:"
+        accent = "#F44336"
+    else:
+        subject = f"Events Back On: {date_str}"
+        intro = "The following previously cancelled events are <strong>BACK ON</strong> the schedule:"
+        accent = "#4CAF50"
+
+    items = "".join(EVENT_LIST_ITEM.substitute(name=name, date=format_event_date(event_date)) for name, event_date in events)
+    body = f"<p>Hello,</p>\n                <p>{intro}</p>" + EVENT_LIST.substitute(accent=accent, items=items)
+    if reason:
+        body += f"\n                <p><strong>Reason:</strong> {reason}</p>"
+    return subject, LAYOUT.substitute(body=body, app_url=APP_URL, button="Go to Skeddle")
+
+
+def render_digest(messages):
+    """
+    Combines several rendered emails to one recipient into a single message.
+    `messages` is a list of (subject, html) pairs, in the order they were queued.
+
+    Returns:
+        tuple: (subject, html)
+    """
+    sections = []
+    for subject, html in messages:
+        match = _BODY.search(html)
+        content = _GREETING.sub("", match.group(1)) if match else html
+        sections.append(DIGEST_SECTION.substitute(subject=subject, content=content.strip()))
+    body = f"<p>Hello,</p>\n                <p>Here are your latest Skeddle updates:</p>" + "".join(sections)
+    return f"Skeddle Updates ({len(messages)})", LAYOUT.substitute(body=body, app_url=APP_URL, button="Go to Skeddle")
@@ -0,0 +1,166 @@
+import os
+import threading
+import time
+
+# Postgres NOTIFY channel fired by the event_types trigger (see database/migrations)
+NOTIFY_CHANNEL = "event_types_changed"
+
+GROUP_ROLES = ["roster_user_group", "reserve_first_priority_user_group", "reserve_second_priority_user_group"]
+
+
+class EventTypeCache:
+    """
+    Process-wide cache of `event_types`, with the three user group names resolved.
+
+    Event types only change when an admin edits them, so event queries can select
+    plain `events` columns and join the type in memory (`attach`). The admin CRUD
+    endpoints call `invalidate()` on their own instance; other instances hear
+    about the change through Postgres LISTEN/NOTIFY (`start_listener`). Without a
+    DATABASE_URL for the listener, entries expire after `ttl_seconds` instead.
+    """
+
+    def __init__(self, supabase_client, ttl_seconds=60):
+        self.supabase = supabase_client
+        self.ttl_seconds = ttl_seconds
+        self.version = 0
+        self._types = None
+        self._group_names = {}
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self._listener = None
+        self._listening = False
+        self._stop = threading.Event()
+
+    # --- Loading ---
+
+    def _load(self):
+        types_res = self.supabase.table("event_types").select("*").execute()
+        types = {str(t["id"]): t for t in (types_res.data or [])}
+
+        group_ids = {t.get(role) for t in types.values() for role in GROUP_ROLES} - {None}
+        group_names = {}
+        if group_ids:
+            groups_res = self.supabase.table("user_groups").select("id, name").in_("id", list(group_ids)).execute()
+            group_names = {str(g["id"]): g["name"] for g in (groups_res.data or [])}
+
+        self._types = types
+        self._group_names = group_names
+        self._loaded_at = time.monotonic()
+        self.version += 1
+
+    def _ensure_loaded(self):
+        with self._lock:
+            expired = not self._listening and time.monotonic() - self._loaded_at > self.ttl_seconds
+            if self._types is None or expired:
+                self._load()
+            return self._types
+
+    def invalidate(self):
+        with self._lock:
+            self._types = None
+
+    # --- Reads ---
+
+    def get(self, event_type_id):
+        """The raw event_types row, reloading once if the id is unknown (created elsewhere)."""
+        if event_type_id is None:
+            return None
+        event_type = self._ensure_loaded().get(str(event_type_id))
+        if event_type is None:
+            self.invalidate()
+            event_type = self._ensure_loaded().get(str(event_type_id))
+        return event_type
+
+    def all(self):
+        return list(self._ensure_loaded().values())
+
+    def group_name(self, group_id):
+        self._ensure_loaded()
+        return self._group_names.get(str(group_id)) if group_id else None
+
+    def attach(self, events):
+        """
+        In-memory equivalent of selecting `events` with `event_types(*)`.
+        Accepts a single row or a list; returns what it was given.
+        """
+        rows = events if isinstance(events, list) else [events]
+        for row in rows:
+            if row is not None and "event_type_id" in row:
+                row["event_types"] = self.get(row["event_type_id"])
+        return events
+
+    def admin_view(self):
+        """Flattened rows for the admin event type list, ordered by name."""
+        from logic import parse_interval_to_minutes
+
+        data = []
+        for row in sorted(self.all(), key=lambda t: t["name"]):
+            event_type = {
+                "id": row["id"],
+                "name": row["name"],
+                "day_of_week": row["day_of_week"],
+                "time_of_day": row["time_of_day"],
+                "time_zone": row["time_zone"],
+                "max_signups": row["max_signups"],
+                "roster_sign_up_open_minutes": row["roster_sign_up_open_minutes"],
+                "reserve_sign_up_open_minutes": row["reserve_sign_up_open_minutes"],
+                "initial_reserve_scheduling_minutes": row["initial_reserve_scheduling_minutes"],
+                "final_reserve_scheduling_minutes": row["final_reserve_scheduling_minutes"],
+            }
+            for role in GROUP_ROLES:
+                event_type[f"{role}_id"] = row.get(role)
+                event_type[f"{role}_name"] = self.group_name(row.get(role))
+            event_type["duration_minutes"] = parse_interval_to_minutes(row.get("duration"))
+            event_type["generation_horizon_days"] = row.get("generation_horizon_days")
+            data.append(event_type)
+        return data
+
+    # --- Cross-instance invalidation ---
+
+    def start_listener(self, database_url=None):
+        """
+        Starts a daemon thread that LISTENs on NOTIFY_CHANNEL and invalidates the
+        cache whenever any instance (or a SQL edit) changes event_types.
+        Returns False when no DATABASE_URL is configured.
+        """
+        database_url = database_url or os.environ.get("DATABASE_URL")
+        if not database_url or self._listener is not None:
+            return False
+        self._stop.clear()
+        self._listener = threading.Thread(target=self._listen, args=(database_url,), daemon=True)
+        self._listener.start()
+        return True
+
+    def stop_listener(self):
+        self._stop.set()
+        self._listener = None
+        self._listening = False
+
+    def _listen(self, database_url):
+        import select
+        import psycopg2
+
+        while not self._stop.is_set():
+            try:
+                conn = psycopg2.connect(database_url)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {NOTIFY_CHANNEL};")
+                # Anything may have changed while we were not listening
+                self._listening = True
+                self.invalidate()
+                print(f"Event type cache listening on '{NOTIFY_CHANNEL}'.")
+                while not self._stop.is_set():
+                    if select.select([conn], [], [], 5) == ([], [], []):
+                        continue
+                    conn.poll()
+                    if conn.notifies:
+                        conn.notifies.clear()
+                        self.invalidate()
+                self._listening = False
+                conn.close()
+            except Exception as e:
+                print(f"Event type cache listener error: {e}. Reconnecting...")
+                # Fall back to TTL expiry while disconnected
+                self._listening = False
+                self._stop.wait(10)
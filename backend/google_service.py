@@ -1,8 +1,18 @@
+import asyncio
 import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
 from typing import List, Dict, Any
+import google_auth_httplib2
+import httplib2
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest
 from db import supabase
+from membership_cache import PAGE_SIZE
 
 # Scopes required for managing Admin SDK Groups
 SCOPES = [
@@ -10,8 +20,26 @@ SCOPES = [
     'https://www.googleapis.com/auth/admin.directory.group.member'
 ]
 
-def get_google_service():
-    """Builds and returns the Admin SDK Directory service."""
+# Member inserts/deletes per batch request. The API accepts up to 1000 calls
+# per batch, but every call still counts against the per-user rate limit, so
+# larger batches mostly trade round trips for 403 rateLimitExceeded errors.
+GOOGLE_BATCH_SIZE = int(os.environ.get("GOOGLE_BATCH_SIZE", "50"))
+GOOGLE_MAX_ATTEMPTS = 5
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded", "quotaExceeded"}
+
+# Full reconciliation backstop for the incremental (change log) sync
+GOOGLE_FULL_SYNC_HOURS = float(os.environ.get("GOOGLE_FULL_SYNC_HOURS", "24"))
+
+GOOGLE_TIMEOUT_SECONDS = float(os.environ.get("GOOGLE_TIMEOUT_SECONDS", "30"))
+
+# Process-wide Directory service (see get_google_service)
+_service = None
+_service_lock = threading.Lock()
+_thread_local = threading.local()
+
+def _load_credentials():
     creds_path = os.environ.get("GOOGLE_APPLICATION_CREDENTIALS")
     admin_email = os.environ.get("GOOGLE_ADMIN_EMAIL")
 
@@ -27,9 +55,56 @@ def get_google_service():
     )
     
     # Delegate as the domain admin
-    creds = creds.with_subject(admin_email)
-    
-    return build('admin', 'directory_v1', credentials=creds)
+    return creds.with_subject(admin_email)
+
+def _thread_http(credentials):
+    # httplib2 connections are not thread-safe, so each thread gets its own.
+    # AuthorizedHttp refreshes the shared credentials when the token expires.
+    http = getattr(_thread_local, "http", None)
+    if http is None or http.credentials is not credentials:
+        http = google_auth_httplib2.AuthorizedHttp(credentials, http=httplib2.Http(timeout=GOOGLE_TIMEOUT_SECONDS))
+        _thread_local.http = http
+    return http
+
+def get_google_service():
+    """
+    Returns the Admin SDK Directory service, built once per process.
+
+    The discovery document is the one bundled with the client library
+    (`static_discovery`), so nothing is fetched or re-parsed per sync. The
+    service object is shared by concurrent syncs: every request it creates runs
+    on the calling thread's own authorized connection. Configuration errors
+    raise ValueError and are retried on the next call.
+
+    With GOOGLE_DIRECTORY=fake, returns the in-memory fake from
+    mock_google_service instead (offline runs and benchmarks).
+    """
+    global _service
+    if os.environ.get("GOOGLE_DIRECTORY") == "fake":
+        from mock_google_service import get_fake_directory
+        return get_fake_directory()
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                creds = _load_credentials()
+
+                def request_builder(http, *args, **kwargs):
+                    return HttpRequest(_thread_http(creds), *args, **kwargs)
+
+                _service = build(
+                    'admin', 'directory_v1',
+                    http=_thread_http(creds),
+                    requestBuilder=request_builder,
+                    static_discovery=True,
+                    cache_discovery=False,
+                )
+    return _service
+
+def reset_google_service():
+    """Drops the cached service, e.g. after rotating the service-account key."""
+    global _service
+    with _service_lock:
+        _service = None
 
 def get_google_members(service, google_group_email: str) -> List[str]:
     """Fetches all member emails for a given Google Group."""
@@ -55,9 +130,149 @@ def get_google_members(service, google_group_email: str) -> List[str]:
             
     return members
 
-async def sync_to_google(group_id: str) -> Dict[str, Any]:
+def _error_status(exception):
+    return int(exception.resp.status) if isinstance(exception, HttpError) else None
+
+def _is_retryable(exception):
+    status = _error_status(exception)
+    if status is None:
+        return True # transport error (timeout, connection reset)
+    if status == 403:
+        return bool(RATE_LIMIT_REASONS & {d.get("reason") for d in (exception.error_details or []) if isinstance(d, dict)})
+    return status in RETRYABLE_STATUSES
+
+def apply_member_changes(service, google_group_email: str, to_add: List[str], to_remove: List[str],
+                         batch_size: int = GOOGLE_BATCH_SIZE, max_attempts: int = GOOGLE_MAX_ATTEMPTS,
+                         base_delay: float = 1.0, sleep=time.sleep) -> Dict[str, Any]:
+    """
+    Applies member inserts and deletes to a Google Group with batch requests
+    (`batch_size` calls per HTTP round trip). Each call's outcome is handled on
+    its own: rate limits, 5xx and transport errors are retried in a later round
+    with exponential backoff, other errors fail just that member. Adding an
+    existing member (409) or deleting a missing one (404) counts as done.
+
+    Returns:
+        dict: {"added": [...], "removed": [...], "failed": [{"email", "action", "error"}]}
+    """
+    result = {"added": [], "removed": [], "failed": []}
+    pending = [("add", email) for email in to_add] + [("remove", email) for email in to_remove]
+
+    for attempt in range(max_attempts):
+        retry = []
+        for start in range(0, len(pending), batch_size):
+            chunk = pending[start:start + batch_size]
+            outcomes = {}
+
+            def on_response(request_id, response, exception):
+                outcomes[request_id] = exception
+
+            batch = service.new_batch_http_request(callback=on_response)
+            for i, (action, email) in enumerate(chunk):
+                if action == "add":
+                    request = service.members().insert(groupKey=google_group_email, body={"email": email, "role": "MEMBER"})
+                else:
+                    request = service.members().delete(groupKey=google_group_email, memberKey=email)
+                batch.add(request, request_id=str(i))
+            try:
+                batch.execute()
+            except Exception as e:
+                # The whole round trip failed; every call in it is retried
+                outcomes = {str(i): e for i in range(len(chunk))}
+
+            for i, (action, email) in enumerate(chunk):
+                exception = outcomes.get(str(i), ValueError("no response in batch"))
+                status = _error_status(exception)
+                if exception is None or (action == "add" and status == 409) or (action == "remove" and status == 404):
+                    if action == "add":
+                        result["added"].append(email)
+                        print(f"[+] Added {email} to {google_group_email}")
+                    else:
+                        result["removed"].append(email)
+                        print(f"[-] Removed {email} from {google_group_email}")
+                elif _is_retryable(exception) and attempt + 1 < max_attempts:
+                    retry.append((action, email))
+                else:
+                    print(f"[!] Failed to {action} {email} ({google_group_email}): {exception}")
+                    result["failed"].append({"email": email, "action": action, "error": str(exception)})
+
+        if not retry:
+            break
+        pending = retry
+        delay = base_delay * 2 ** attempt * random.uniform(1.0, 1.5)
+        print(f"[~] Retrying {len(retry)} member changes for {google_group_email} in {delay:.1f}s")
+        sleep(delay)
+
+    return result
+
+def _latest_change_id(group_id: str) -> int:
+    res = supabase.table("group_membership_changes")\
+        .select("id")\
+        .eq("group_id", group_id)\
+        .order("id", desc=True)\
+        .limit(1)\
+        .execute()
+    return res.data[0]["id"] if res.data else 0
+
+def _fetch_changes(group_id: str, after_id: int) -> List[Dict[str, Any]]:
+    """Change log rows for the group newer than `after_id`, oldest first."""
+    changes, start = [], 0
+    while True:
+        res = supabase.table("group_membership_changes")\
+            .select("id, email, op")\
+            .eq("group_id", group_id)\
+            .gt("id", after_id)\
+            .order("id")\
+            .range(start, start + PAGE_SIZE - 1)\
+            .execute()
+        page = res.data or []
+        changes.extend(page)
+        if len(page) < PAGE_SIZE:
+            return changes
+        start += PAGE_SIZE
+
+def collapse_changes(changes: List[Dict[str, Any]]):
+    """
+    Reduces a run of change log rows to the net member changes: the last op
+    per email wins, so an add followed by a remove cancels out.
+
+    Returns:
+        tuple: (to_add, to_remove)
+    """
+    latest = {}
+    for change in changes:
+        if change.get("email"):
+            email = change["email"].lower()
+            latest.pop(email, None) # keep the order of the last change
+            latest[email] = change["op"]
+    return [e for e, op in latest.items() if op == "ADD"], [e for e, op in latest.items() if op == "REMOVE"]
+
+def _needs_full_sync(group: Dict[str, Any], now: datetime) -> bool:
+    if group.get("google_synced_change_id") is None or not group.get("google_full_sync_at"):
+        return True
+    full_sync_at = datetime.fromisoformat(str(group["google_full_sync_at"]).replace('Z', '+00:00'))
+    return now - full_sync_at >= timedelta(hours=GOOGLE_FULL_SYNC_HOURS)
+
+def _mark_synced(group_id: str, change_id: int, full: bool, now: datetime):
+    """Advances the group's watermark and prunes the change log up to it."""
+    update = {"google_synced_change_id": change_id, "google_synced_at": now.isoformat()}
+    if full:
+        update["google_full_sync_at"] = now.isoformat()
+    supabase.table("user_groups").update(update).eq("id", group_id).execute()
+    supabase.table("group_membership_changes").delete().eq("group_id", group_id).lte("id", change_id).execute()
+
+async def sync_to_google(group_id: str, full: bool = False) -> Dict[str, Any]:
+    """Runs `sync_group` in a worker thread, so several syncs can proceed at once."""
+    return await asyncio.to_thread(sync_group, group_id, full)
+
+def sync_group(group_id: str, full: bool = False) -> Dict[str, Any]:
     """
     Syncs a Supabase user group to its corresponding Google Group.
+
+    Normally only the profile_groups changes logged since the last successful
+    sync are applied (group_membership_changes). A full reconciliation - list
+    the Google Group and diff it against every member - runs on request, for a
+    group that was never synced, and when the last one is older than
+    GOOGLE_FULL_SYNC_HOURS, as a backstop for anything the log missed.
     """
     try:
         # 1. Fetch group details
@@ -72,63 +287,67 @@ async def sync_to_google(group_id: str) -> Dict[str, Any]:
         if not google_group_email:
             return {"status": "error", "message": f"Group '{group_name}' does not have a Google Group Email assigned in Supabase."}
 
-        # 2. Fetch Supabase members (Ground Truth)
-        members_res = supabase.table("profile_groups")\
-            .select("profiles(email)")\
-            .eq("group_id", group_id)\
-            .execute()
-        
-        supabase_emails = set()
-        if members_res.data:
-            for m in members_res.data:
-                profile = m.get("profiles")
-                if profile and profile.get("email"):
-                    supabase_emails.add(profile["email"].lower())
-
-        # 3. Authenticate and build Google Service
+        now = datetime.now(timezone.utc)
+        full = full or _needs_full_sync(group, now)
+
+        # 2. Authenticate and build Google Service
         try:
             service = get_google_service()
         except ValueError as ve:
             return {"status": "error", "message": str(ve)}
 
-        # 4. Fetch Current Google Members
-        try:
-            google_members_list = get_google_members(service, google_group_email)
-            google_emails = set(email.lower() for email in google_members_list if email)
-        except Exception as e:
-            return {"status": "error", "message": str(e)}
+        if full:
+            # Changes logged from here on are applied by the next incremental sync
+            change_id = _latest_change_id(group_id)
 
-        # 5. Calculate Delta
-        to_add = list(supabase_emails - google_emails)
-        to_remove = list(google_emails - supabase_emails)
+            # 3. Fetch Supabase members (Ground Truth)
+            members_res = supabase.table("profile_groups")\
+                .select("profiles(email)")\
+                .eq("group_id", group_id)\
+                .execute()
+            
+            supabase_emails = set()
+            if members_res.data:
+                for m in members_res.data:
+                    profile = m.get("profiles")
+                    if profile and profile.get("email"):
+                        supabase_emails.add(profile["email"].lower())
 
-        # 6. Apply Actions to Google Groups
-        for email in to_add:
+            # 4. Fetch Current Google Members
             try:
-                service.members().insert(
-                    groupKey=google_group_email,
-                    body={"email": email, "role": "MEMBER"}
-                ).execute()
-                print(f"[+] Added {email} to {google_group_email}")
+                google_members_list = get_google_members(service, google_group_email)
+                google_emails = set(email.lower() for email in google_members_list if email)
             except Exception as e:
-                print(f"[!] Failed to add {email} to {google_group_email}: {str(e)}")
+                return {"status": "error", "message": str(e)}
 
-        for email in to_remove:
-            try:
-                service.members().delete(
-                    groupKey=google_group_email,
-                    memberKey=email
-                ).execute()
-                print(f"[-] Removed {email} from {google_group_email}")
-            except Exception as e:
-                print(f"[!] Failed to remove {email} from {google_group_email}: {str(e)}")
+            # 5. Calculate Delta
+            to_add = list(supabase_emails - google_emails)
+            to_remove = list(google_emails - supabase_emails)
+        else:
+            # 3-5. Net changes since the last sync
+            changes = _fetch_changes(group_id, group["google_synced_change_id"])
+            change_id = changes[-1]["id"] if changes else group["google_synced_change_id"]
+            to_add, to_remove = collapse_changes(changes)
+
+        # 6. Apply Actions to Google Groups (batched)
+        applied = apply_member_changes(service, google_group_email, to_add, to_remove)
+
+        # 7. Only a clean run moves the watermark; failed members are retried next
+        # time (re-applying the rest is harmless, adds and removes are idempotent)
+        if not applied["failed"]:
+            _mark_synced(group_id, change_id, full, now)
 
+        summary = f"{'Full' if full else 'Incremental'} Sync Complete: Added {len(applied['added'])}, Removed {len(applied['removed'])}"
+        if applied["failed"]:
+            summary += f", Failed {len(applied['failed'])}"
         return {
             "status": "success",
             "group_name": group_name,
-            "added": to_add,
-            "removed": to_remove,
-            "summary": f"Sync Complete: Added {len(to_add)}, Removed {len(to_remove)}"
+            "mode": "full" if full else "incremental",
+            "added": applied["added"],
+            "removed": applied["removed"],
+            "failed": applied["failed"],
+            "summary": summary
         }
     except Exception as e:
         print(f"Error syncing group to Google: {e}")
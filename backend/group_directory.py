@@ -0,0 +1,79 @@
+from event_type_cache import GROUP_ROLES
+from membership_cache import PAGE_SIZE
+
+
+class GroupDirectory:
+    """
+    Run-scoped lookup of `user_groups` rows (group_email, name, ...).
+
+    Many events share the same roster and reserve groups, so a scheduler run
+    resolves every group its events reference with one `in_()` query up front,
+    and the notification code reads emails from here instead of querying per
+    event per group. Group members (from profile_groups) are loaded on first use,
+    once per group. Build a new directory per run; it is never refreshed.
+    """
+
+    def __init__(self, groups=None, supabase_client=None):
+        self.supabase = supabase_client
+        self._groups = {str(g["id"]): g for g in (groups or [])}
+        self._members = {}
+
+    @classmethod
+    def load(cls, supabase_client, group_ids):
+        group_ids = sorted({str(gid) for gid in group_ids if gid})
+        if not group_ids:
+            return cls(supabase_client=supabase_client)
+        res = supabase_client.table("user_groups").select("id, name, group_email").in_("id", group_ids).execute()
+        return cls(res.data or [], supabase_client)
+
+    @classmethod
+    def for_events(cls, supabase_client, events):
+        """Loads every roster/reserve group referenced by `events` (rows with `event_types` attached, or enriched events)."""
+        group_ids = set()
+        for event in events:
+            source = event.get("event_types") or event
+            group_ids.update(source.get(role) for role in GROUP_ROLES)
+        return cls.load(supabase_client, group_ids)
+
+    def group(self, group_id):
+        return self._groups.get(str(group_id)) if group_id else None
+
+    def email(self, group_id):
+        group = self.group(group_id)
+        return group.get("group_email") if group else None
+
+    def members(self, group_id):
+        """Profile ids in the group, per profile_groups (what the Google Group alias is synced from)."""
+        group_id = str(group_id)
+        if group_id not in self._members:
+            member_ids, start = set(), 0
+            while self.supabase is not None:
+                res = self.supabase.table("profile_groups")\
+                    .select("profile_id")\
+                    .eq("group_id", group_id)\
+                    .order("profile_id")\
+                    .range(start, start + PAGE_SIZE - 1)\
+                    .execute()
+                page = res.data or []
+                member_ids.update(str(row["profile_id"]) for row in page)
+                if len(page) < PAGE_SIZE:
+                    break
+                start += PAGE_SIZE
+            self._members[group_id] = frozenset(member_ids)
+        return self._members[group_id]
+
+    def not_covered_by(self, group_id, recipients):
+        """
+        Drops the (profile_id, email) recipients that already get mail through the
+        group's alias, i.e. members of a group that has a group_email.
+
+        Returns:
+            list: emails of the remaining recipients
+        """
+        if not self.email(group_id):
+            return [email for _, email in recipients]
+        members = self.members(group_id)
+        return [email for profile_id, email in recipients if str(profile_id) not in members]
+
+    def __len__(self):
+        return len(self._groups)
@@ -0,0 +1,133 @@
+import asyncio
+import os
+import uuid
+from datetime import datetime, timezone
+
+from google_service import sync_to_google
+
+# Groups synced at the same time by a sync-all job
+GROUP_SYNC_CONCURRENCY = int(os.environ.get("GROUP_SYNC_CONCURRENCY", "4"))
+
+
+class GroupSyncJob:
+    """
+    One run of syncing every group that has a group_email to Google.
+
+    Groups are synced concurrently, at most `concurrency` at a time (each sync
+    runs in a worker thread, see google_service.sync_to_google). `progress()`
+    reports the job status and the result for every group so far.
+    """
+
+    def __init__(self, supabase_client, full=False, concurrency=GROUP_SYNC_CONCURRENCY, sync_fn=sync_to_google):
+        self.id = str(uuid.uuid4())
+        self.supabase = supabase_client
+        self.full = full
+        self.concurrency = max(1, concurrency)
+        self.sync_fn = sync_fn
+        self.status = "PENDING" # PENDING, RUNNING, FINISHED, FAILED
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+        self.groups = {} # group id -> {"name", "status", "result"}
+        self._task = None
+
+    def _load_groups(self):
+        res = self.supabase.table("user_groups").select("id, name, group_email").order("name").execute()
+        return [g for g in (res.data or []) if g.get("group_email")]
+
+    async def _sync_one(self, semaphore, group):
+        entry = self.groups[str(group["id"])]
+        async with semaphore:
+            entry["status"] = "RUNNING"
+            try:
+                result = await self.sync_fn(str(group["id"]), full=self.full)
+            except Exception as e:
+                result = {"status": "error", "message": str(e)}
+        entry["result"] = result
+        if result.get("status") == "error":
+            entry["status"] = "FAILED"
+        elif result.get("failed"):
+            entry["status"] = "PARTIAL"
+        else:
+            entry["status"] = "SYNCED"
+
+    async def run(self):
+        self.status = "RUNNING"
+        self.started_at = datetime.now(timezone.utc).isoformat()
+        try:
+            groups = await asyncio.to_thread(self._load_groups)
+            self.groups = {str(g["id"]): {"name": g.get("name"), "status": "PENDING", "result": None} for g in groups}
+            semaphore = asyncio.Semaphore(self.concurrency)
+            await asyncio.gather(*(self._sync_one(semaphore, g) for g in groups))
+            self.status = "FINISHED"
+        except Exception as e:
+            print(f"Group sync job {self.id} failed: {e}")
+            self.status = "FAILED"
+            self.error = str(e)
+        finally:
+            self.finished_at = datetime.now(timezone.utc).isoformat()
+        return self.progress()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run())
+        return self._task
+
+    @property
+    def done(self):
+        return self.status in ("FINISHED", "FAILED")
+
+    def progress(self):
+        counts = {}
+        for entry in self.groups.values():
+            counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+        return {
+            "id": self.id,
+            "status": self.status,
+            "full": self.full,
+            "concurrency": self.concurrency,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+            "total": len(self.groups),
+            "completed": sum(n for status, n in counts.items() if status in ("SYNCED", "PARTIAL", "FAILED")),
+            "counts": counts,
+            "groups": [{"id": group_id, **entry} for group_id, entry in self.groups.items()],
+        }
+
+
+class GroupSyncJobs:
+    """In-process registry of sync-all jobs; one runs at a time, the last `keep` are remembered."""
+
+    def __init__(self, supabase_client, keep=10, sync_fn=sync_to_google):
+        self.supabase = supabase_client
+        self.keep = keep
+        self.sync_fn = sync_fn
+        self._jobs = {}
+
+    def start(self, full=False, concurrency=GROUP_SYNC_CONCURRENCY):
+        """Starts a job on the running loop, or returns the one still running."""
+        running = self.latest()
+        if running is not None and not running.done:
+            return running
+        job = GroupSyncJob(self.supabase, full=full, concurrency=concurrency, sync_fn=self.sync_fn)
+        self._jobs[job.id] = job
+        while len(self._jobs) > self.keep:
+            self._jobs.pop(next(iter(self._jobs)))
+        job.start()
+        return job
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def latest(self):
+        return next(reversed(self._jobs.values()), None)
+
+    async def stop(self):
+        for job in self._jobs.values():
+            if job._task is not None and not job._task.done():
+                job._task.cancel()
+                try:
+                    await job._task
+                except asyncio.CancelledError:
+                    pass
@@ -1,5 +1,9 @@
+import hashlib
 import random
+import secrets
 from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 def enrich_event(event_data, now=None):
     """
@@ -139,6 +143,30 @@ def parse_interval_to_minutes(interval_str):
         
     return 120 # Default
 
+# Linear order of the automatic statuses (CANCELLED is a manual override)
+STATUS_ORDER = [
+    "NOT_YET_OPEN",
+    "OPEN_FOR_ROSTER",
+    "OPEN_FOR_RESERVES",
+    "PRELIMINARY_ORDERING",
+    "FINAL_ORDERING",
+    "FINISHED",
+]
+
+def phases_between(current_status, target_status):
+    """
+    Lists every status entered when moving from `current_status` to `target_status`,
+    in order and including the target. More than one entry means phases were skipped
+    (e.g. the cron missed a window) and their side effects still need to run.
+    Unknown statuses (or moving backwards) yield just the target.
+    """
+    if current_status in STATUS_ORDER and target_status in STATUS_ORDER:
+        start = STATUS_ORDER.index(current_status)
+        end = STATUS_ORDER.index(target_status)
+        if end > start:
+            return STATUS_ORDER[start + 1:end + 1]
+    return [target_status]
+
 def determine_event_status(event, now):
     """
     Calculates the correct EventStatus based on time windows.
@@ -261,7 +289,19 @@ def check_signup_eligibility(event, user_groups, now):
              
     return {"allowed": False, "error_message": f"Unknown event status: {status}"}
 
-def randomize_holding_queue(holding_users):
+def new_lottery_seed():
+    """Draws a fresh per-event lottery seed (fits a Postgres BIGINT)."""
+    return secrets.randbits(63)
+
+def lottery_key(seed, signup_id):
+    """
+    Position key of a signup in a seeded lottery. Each entrant's key depends only
+    on the seed and its own signup id, so the relative order of any two entrants
+    never changes when others join or withdraw.
+    """
+    return hashlib.sha256(f"{seed}:{signup_id}".encode()).hexdigest()
+
+def randomize_holding_queue(holding_users, seed=None):
     """
     Randomizes a list of holding_users based on Tier logic:
     - Group by Tier
@@ -269,6 +309,10 @@ def randomize_holding_queue(holding_users):
     - Randomize Tier 3
     - Return Tier 2 + Tier 3
     
+    With a `seed` (the event's stored lottery_seed) the order is fully
+    reproducible: it only depends on the seed and the tier membership, not on
+    the input order. Without one, the global random module is used.
+    
     Returns:
         list: Sorted list of users (dicts)
     """
@@ -282,19 +326,62 @@ def randomize_holding_queue(holding_users):
     others = [u for u in holding_users if u.get("tier") not in [2, 3]]
     
     # Randomize
-    random.shuffle(tier2)
-    random.shuffle(tier3)
+    if seed is not None:
+        tier2.sort(key=lambda u: lottery_key(seed, u["id"]))
+        tier3.sort(key=lambda u: lottery_key(seed, u["id"]))
+    else:
+        random.shuffle(tier2)
+        random.shuffle(tier3)
     # Others? Maybe append at end
     
     return tier2 + tier3 + others
 
+def recompute_lottery(signups, seed, drawn_at=None):
+    """
+    Replays an event's lottery from its stored seed, e.g. for admin views and disputes.
+
+    Entrants are the Tier 2/3 signups that existed when the lottery was drawn
+    (created_at <= drawn_at, when known), wherever they are now. Returns them in
+    lottery order, each with its 1-based "lottery_position".
+    """
+    if isinstance(drawn_at, str):
+        drawn_at = datetime.fromisoformat(drawn_at.replace('Z', '+00:00'))
+
+    entrants = []
+    for signup in signups:
+        if signup.get("tier") not in (2, 3):
+            continue
+        created_at = signup.get("created_at")
+        if drawn_at and created_at:
+            if isinstance(created_at, str):
+                created_at = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
+            if created_at > drawn_at:
+                continue
+        entrants.append(signup)
+
+    ordered = randomize_holding_queue(entrants, seed=seed)
+    return [dict(signup, lottery_position=i + 1) for i, signup in enumerate(ordered)]
+
+def _signup_diff(user, new_list, new_seq):
+    """
+    Returns the minimal column diff for moving `user` to (new_list, new_seq),
+    or None if the row already has those values.
+    """
+    diff = {"id": user['id']}
+    if user.get('list_type') != new_list:
+        diff["list_type"] = new_list
+    if user.get('sequence_number') != new_seq:
+        diff["sequence_number"] = new_seq
+    return diff if len(diff) > 1 else None
+
 def promote_from_holding(queue, current_roster_count, max_signups, current_waitlist_count):
     """
     takes an ALREADY SORTED queue and assigns them to EVENT or WAITLIST.
     
-    Returns a list of dicts:
+    Only rows that actually change are returned, each with just the changed columns:
     [
-        {"id": user_id, "list_type": "EVENT", "sequence_number": 1},
+        {"id": signup_id, "list_type": "EVENT", "sequence_number": 1},
+        {"id": signup_id, "sequence_number": 4},  # already on the right list
         ...
     ]
     """
@@ -303,7 +390,6 @@ def promote_from_holding(queue, current_roster_count, max_signups, current_waitl
     local_waitlist_count = current_waitlist_count
     
     for user in queue:
-        signup_id = user['id']
         new_list = "EVENT"
         new_seq = 0
         
@@ -316,12 +402,9 @@ def promote_from_holding(queue, current_roster_count, max_signups, current_waitl
             local_waitlist_count += 1
             new_seq = local_waitlist_count
             
-        updates.append({
-            "id": signup_id,
-            "user_id": user.get('user_id'),
-            "list_type": new_list,
-            "sequence_number": new_seq
-        })
+        diff = _signup_diff(user, new_list, new_seq)
+        if diff:
+            updates.append(diff)
         
     return updates
 
@@ -331,30 +414,129 @@ def resequence_holding(queue):
     Takes a randomized queue of users and assigns them new sequence numbers
     keeping them in WAITLIST_HOLDING.
     
-    Returns a list of dicts:
+    Only rows that actually change are returned, each with just the changed columns:
     [
-        {"id": user_id, "list_type": "WAITLIST_HOLDING", "sequence_number": 1},
+        {"id": signup_id, "sequence_number": 1},
         ...
     ]
     """
     updates = []
     for i, user in enumerate(queue):
-        updates.append({
-            "id": user['id'],
-            "user_id": user.get('user_id'),
-            "list_type": "WAITLIST_HOLDING",
-            "sequence_number": i + 1
-        })
+        diff = _signup_diff(user, "WAITLIST_HOLDING", i + 1)
+        if diff:
+            updates.append(diff)
     return updates
 
-def generate_future_events(supabase_client, days_ahead_to_ensure=14):
+def summarize_list_changes(updates):
+    """
+    Compact summary of a diff list from promote_from_holding / resequence_holding:
+    how many rows moved into each list, and how many only changed position.
+
+    Returns:
+        dict: {"EVENT": int, "WAITLIST": int, "WAITLIST_HOLDING": int, "resequenced": int}
+    """
+    summary = {"EVENT": 0, "WAITLIST": 0, "WAITLIST_HOLDING": 0, "resequenced": 0}
+    for update in updates:
+        if "list_type" in update:
+            summary[update["list_type"]] = summary.get(update["list_type"], 0) + 1
+        else:
+            summary["resequenced"] += 1
+    return summary
+
+DEFAULT_TIME_ZONE = "America/Los_Angeles"
+
+@lru_cache(maxsize=None)
+def get_zone(tz_name):
+    """Cached ZoneInfo lookup; unknown zones fall back to DEFAULT_TIME_ZONE."""
+    try:
+        return ZoneInfo(tz_name or DEFAULT_TIME_ZONE)
+    except (ZoneInfoNotFoundError, ValueError):
+        print(f"Unknown time zone {tz_name!r}, falling back to {DEFAULT_TIME_ZONE}.")
+        return ZoneInfo(DEFAULT_TIME_ZONE)
+
+def localize_wall_time(day, hour, minute, zone):
+    """
+    Turns a local wall-clock time on `day` into an aware datetime in `zone`.
+    
+    - DST gap (e.g. 02:30 on spring-forward day): the time does not exist, so it
+      is moved forward by the gap length (02:30 PST -> 03:30 PDT).
+    - DST overlap (e.g. 01:30 on fall-back day): the earlier of the two instants
+      (still daylight time) is used.
+    """
+    naive = datetime(day.year, day.month, day.day, hour, minute)
+    # fold=0 maps a gap time with the pre-transition offset; normalizing through
+    # UTC yields the real wall time after the gap.
+    return naive.replace(tzinfo=zone).astimezone(timezone.utc).astimezone(zone)
+
+def expand_event_type(event_type, first_day, last_day, blackout_dates=frozenset()):
+    """
+    Materializes one event type's weekly slot for every local date in
+    [first_day, last_day], in the type's own `time_zone`.
+    Jumps straight from one matching weekday to the next.
+    
+    Returns:
+        list: [(aware local datetime, events insert payload), ...]
+    """
+    zone = get_zone(event_type.get("time_zone"))
+    db_dow = event_type["day_of_week"] # 0=Sun, 6=Sat
+    
+    # Parse time
+    time_parts = str(event_type["time_of_day"]).split(':')
+    h = int(time_parts[0])
+    m = int(time_parts[1]) if len(time_parts) > 1 else 0
+    
+    # Python weekday: Mon=0, Sun=6. DB: Sun=0, Sat=6
+    day = first_day + timedelta(days=(db_dow - (first_day.weekday() + 1)) % 7)
+    
+    slots = []
+    while day <= last_day:
+        dt_local = localize_wall_time(day, h, m, zone)
+        date_only_str = day.isoformat()
+        
+        # Check for Blackout
+        status = "NOT_YET_OPEN"
+        if date_only_str in blackout_dates:
+            print(f"Blackout date detected for {date_only_str}. Creating as CANCELLED.")
+            status = "CANCELLED"
+        
+        slots.append((dt_local, {
+            "event_type_id": event_type["id"],
+            "event_date": dt_local.isoformat(),
+            "status": status
+        }))
+        day += timedelta(days=7)
+    return slots
+
+def _utc_instant(value):
+    """Normalizes an ISO string / datetime to a UTC datetime so equal instants compare equal."""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return value.astimezone(timezone.utc)
+
+def _parse_date(value):
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        return datetime.fromisoformat(value[:10]).date()
+    return value
+
+def generate_future_events(supabase_client, days_ahead_to_ensure=14, now=None, blackout_dates=None):
     """
     Auto-generates future events based on existing event types.
     Ensures that events exist for the next `days_ahead_to_ensure` days.
-    Respects the cancelled_dates (blackout dates) table.
-    """
-    import pytz
+    Respects the cancelled_dates (blackout dates) table, or the in-memory
+    `blackout_dates` set when given (see CancelledDatesCache).
+    `now` defaults to the current UTC time.
     
+    Each event type keeps a `generated_through` watermark, so a run only
+    materializes the days past it, up to the type's `generation_horizon_days`
+    (falling back to `days_ahead_to_ensure`). Those days are computed in memory
+    against one fetch of the events already in the window, and missing events
+    are written with one conflict-ignoring bulk insert, so it is cheap enough to
+    run on every cron tick.
+    """
     # 1. Fetch Event Types
     try:
         res = supabase_client.table("event_types").select("*").execute()
@@ -366,68 +548,231 @@ def generate_future_events(supabase_client, days_ahead_to_ensure=14):
         print(f"Error fetching event types for auto-generation: {e}")
         return 0
 
-    # 2. Fetch Blackout Dates
-    try:
-        cancelled_res = supabase_client.table("cancelled_dates").select("date").execute()
-        blackout_dates = {str(row["date"]) for row in cancelled_res.data}
-    except Exception as e:
-        print(f"Error fetching cancelled dates: {e}")
-        blackout_dates = set()
+    # 2. Fetch Blackout Dates (unless the caller keeps them in memory)
+    if blackout_dates is None:
+        try:
+            cancelled_res = supabase_client.table("cancelled_dates").select("date").execute()
+            blackout_dates = {str(row["date"]) for row in cancelled_res.data}
+        except Exception as e:
+            print(f"Error fetching cancelled dates: {e}")
+            blackout_dates = set()
 
-    # 3. Generate Events
-    now = datetime.now(timezone.utc)
-    tz_name = "America/Los_Angeles"
-    local_tz = pytz.timezone(tz_name)
-    
-    new_events_count = 0
+    # 3. Compute the horizon past each type's watermark in memory
+    if now is None:
+        now = datetime.now(timezone.utc)
+    today = now.date()
     
-    # We want to check from tomorrow until (now + days_ahead_to_ensure)
-    # But event types are tied to specific Days of Week.
+    # We want to check from tomorrow until (now + horizon), skipping the days
+    # up to the type's `generated_through` watermark that earlier runs covered.
+    candidates = []
+    watermarks = {}
     
     for t in event_types:
         tid = t["id"]
-        db_dow = t["day_of_week"] # 0=Sun, 6=Sat
-        target_time_str = t["time_of_day"]
+        horizon = t.get("generation_horizon_days") or days_ahead_to_ensure
+        watermark = _parse_date(t.get("generated_through"))
         
-        # Parse time
-        time_parts = target_time_str.split(':')
-        h = int(time_parts[0])
-        m = int(time_parts[1]) if len(time_parts) > 1 else 0
+        horizon_end = today + timedelta(days=horizon)
+        if watermark is not None and watermark >= horizon_end:
+            continue
+        watermarks[tid] = horizon_end
         
-        # We check every day for the next N days
-        for day_offset in range(1, days_ahead_to_ensure + 1):
-            check_date = now + timedelta(days=day_offset)
-            # Python weekday: Mon=0, Sun=6. DB: Sun=0, Sat=6
-            current_dow = (check_date.weekday() + 1) % 7 
-            
-            if current_dow == db_dow:
-                # Match found! Localize it.
-                dt_local = local_tz.localize(datetime(
-                    check_date.year, check_date.month, check_date.day,
-                    h, m, 0
-                ))
-                iso_str = dt_local.isoformat()
-                date_only_str = dt_local.date().isoformat()
-                
-                # Check for Blackout
-                status = "NOT_YET_OPEN"
-                if date_only_str in blackout_dates:
-                    print(f"Blackout date detected for {date_only_str}. Creating as CANCELLED.")
-                    status = "CANCELLED"
-                
-                try:
-                    payload = {
-                        "event_type_id": tid,
-                        "event_date": iso_str,
-                        "status": status
-                    }
-                    # Check if it already exists
-                    existing = supabase_client.table("events").select("id").eq("event_type_id", tid).eq("event_date", iso_str).execute()
-                    if not existing.data:
-                        res = supabase_client.table("events").insert(payload).execute()
-                        if res.data:
-                            new_events_count += 1
-                except Exception as e:
-                    print(f"Error creating event auto-generation: {e}")
+        first_day = today + timedelta(days=1)
+        if watermark is not None and watermark >= first_day:
+            first_day = watermark + timedelta(days=1)
+        candidates.extend(expand_event_type(t, first_day, horizon_end, blackout_dates))
+
+    new_events_count = 0
+    if candidates:
+        # 4. One fetch of the events already in the window
+        window_start = min(dt for dt, _ in candidates)
+        window_end = max(dt for dt, _ in candidates)
+        try:
+            existing_res = supabase_client.table("events")\
+                .select("event_type_id, event_date")\
+                .gte("event_date", window_start.isoformat())\
+                .lte("event_date", window_end.isoformat())\
+                .execute()
+            existing = {
+                (str(row["event_type_id"]), _utc_instant(row["event_date"]))
+                for row in (existing_res.data or [])
+            }
+        except Exception as e:
+            print(f"Error fetching existing events for auto-generation: {e}")
+            return 0
+
+        missing = [payload for dt, payload in candidates if (str(payload["event_type_id"]), _utc_instant(dt)) not in existing]
+
+        # 5. Single bulk insert. The unique (event_type_id, event_date) constraint makes
+        # this idempotent: rows created concurrently by another run are skipped.
+        if missing:
+            try:
+                res = supabase_client.table("events")\
+                    .upsert(missing, on_conflict="event_type_id,event_date", ignore_duplicates=True)\
+                    .execute()
+                new_events_count = len(res.data or [])
+            except Exception as e:
+                # Leave the watermarks alone so the next run retries these days
+                print(f"Error creating events during auto-generation: {e}")
+                return 0
+
+    # 6. Advance the watermarks past the days just covered
+    for tid, generated_through in watermarks.items():
+        try:
+            supabase_client.table("event_types").update({"generated_through": generated_through.isoformat()}).eq("id", tid).execute()
+        except Exception as e:
+            print(f"Error advancing generation watermark for event type {tid}: {e}")
 
     return new_events_count
+
+def invalidate_generation_watermark(supabase_client, event_type_id, now=None):
+    """
+    Called when an event type's `day_of_week`, `time_of_day` or `time_zone` changes.
+
+    Future events that have not opened yet (and have no signups) still sit on the
+    old slot: they are deleted, and the watermark is rolled back to the day
+    before the first new-slot date up to the old watermark that has no kept
+    event, so the next generation run fills in every such day (days already
+    materialized are skipped by its conflict-ignoring insert). Events that
+    already opened are left to the admin.
+
+    Returns:
+        int: number of events deleted
+    """
+    if now is None:
+        now = datetime.now(timezone.utc)
+    type_res = supabase_client.table("event_types").select("*").eq("id", event_type_id).execute()
+    event_type = type_res.data[0] if type_res.data else {}
+    local_tz = get_zone(event_type.get("time_zone"))
+
+    future_res = supabase_client.table("events")\
+        .select("id, event_date, status, status_determinant")\
+        .eq("event_type_id", event_type_id)\
+        .gt("event_date", now.isoformat())\
+        .execute()
+    future = future_res.data or []
+
+    # Unopened auto-generated events (blackout-cancelled ones are recreated as CANCELLED)
+    stale_ids = [
+        e["id"] for e in future
+        if e.get("status") in ("NOT_YET_OPEN", "CANCELLED") and e.get("status_determinant", "AUTOMATIC") == "AUTOMATIC"
+    ]
+    if stale_ids:
+        signups_res = supabase_client.table("event_signups").select("event_id").in_("event_id", stale_ids).execute()
+        with_signups = {str(row["event_id"]) for row in (signups_res.data or [])}
+        stale_ids = [eid for eid in stale_ids if str(eid) not in with_signups]
+
+    if stale_ids:
+        supabase_client.table("events").delete().in_("id", stale_ids).execute()
+
+    # Roll back to just before the first new-slot day that the old watermark
+    # claimed as covered but that no kept event falls on. A kept event later
+    # in the window must not hold the watermark past that gap.
+    stale = set(stale_ids)
+    kept_dates = {_utc_instant(e["event_date"]).astimezone(local_tz).date() for e in future if e["id"] not in stale}
+    watermark = _parse_date(event_type.get("generated_through"))
+    if watermark is not None and event_type.get("day_of_week") is not None:
+        first_day = now.date() + timedelta(days=1)
+        gaps = [dt.date() for dt, _ in expand_event_type(event_type, first_day, watermark) if dt.date() not in kept_dates]
+        if gaps:
+            watermark = gaps[0] - timedelta(days=1)
+    watermark = watermark.isoformat() if watermark else None
+    supabase_client.table("event_types").update({"generated_through": watermark}).eq("id", event_type_id).execute()
+
+    print(f"Event type {event_type_id} schedule changed: removed {len(stale_ids)} unopened events, watermark reset to {watermark}.")
+    return len(stale_ids)
+
+def _future_events_on_local_date(supabase_client, date_str, now, event_types=None):
+    """
+    Future events whose local date (in their event type's time zone) is `date_str`.
+    One fetch of a UTC window wide enough for any zone, filtered in memory.
+    """
+    day = _parse_date(date_str)
+    window_start = max(now, datetime(day.year, day.month, day.day, tzinfo=timezone.utc) - timedelta(days=1))
+    window_end = datetime(day.year, day.month, day.day, tzinfo=timezone.utc) + timedelta(days=2)
+
+    res = supabase_client.table("events")\
+        .select("*" if event_types is not None else "*, event_types(*)")\
+        .gt("event_date", window_start.isoformat())\
+        .lt("event_date", window_end.isoformat())\
+        .execute()
+    rows = res.data or []
+    if event_types is not None:
+        event_types.attach(rows)
+
+    return [
+        row for row in rows
+        if _utc_instant(row["event_date"]).astimezone(get_zone((row.get("event_types") or {}).get("time_zone"))).date() == day
+    ]
+
+# Statuses a blackout date cancels: finished and already cancelled events are left alone
+BLACKOUT_CANCELLABLE = [status for status in STATUS_ORDER if status != "FINISHED"]
+
+def _set_status_on_date(supabase_client, date_str, now, event_types, from_statuses, to_status, outbox=None, messages_for=None):
+    """
+    Moves the future AUTOMATIC events on `date_str` whose status is one of
+    `from_statuses` to `to_status` in one update.
+
+    With an EmailOutbox, `messages_for(events)` renders their notifications
+    first, and the update and the messages are written in one transaction
+    (EmailOutbox.set_events_status). If another writer changed one of the
+    events in between, nothing is written and the events are read again.
+    """
+    for _ in range(3 if outbox is not None else 1):
+        events = [
+            row for row in _future_events_on_local_date(supabase_client, date_str, now, event_types)
+            if row.get("status") in from_statuses and row.get("status_determinant", "AUTOMATIC") == "AUTOMATIC"
+        ]
+        if not events:
+            return []
+        ids = [row["id"] for row in events]
+
+        if outbox is None:
+            res = supabase_client.table("events")\
+                .update({"status": to_status})\
+                .in_("id", ids)\
+                .in_("status", from_statuses)\
+                .eq("status_determinant", "AUTOMATIC")\
+                .execute()
+            return res.data or []
+
+        updated = outbox.set_events_status(ids, from_statuses, to_status, messages_for(events) if messages_for else [])
+        if updated:
+            return updated
+        print(f"Events on {date_str} changed while moving them to {to_status}. Retrying.")
+    return []
+
+def cancel_events_on_date(supabase_client, date_str, now=None, event_types=None, outbox=None, messages_for=None):
+    """
+    Called when `date_str` is added to cancelled_dates: cancels the future
+    events already generated on that date with one set-based update.
+    Events under a MANUAL status determinant are left to the admin.
+    With an `outbox`, the emails rendered by `messages_for(events)` are queued
+    in the same transaction (see _set_status_on_date).
+
+    Returns:
+        list: the events that were cancelled (as stored after the update)
+    """
+    if now is None:
+        now = datetime.now(timezone.utc)
+    cancelled = _set_status_on_date(supabase_client, date_str, now, event_types, BLACKOUT_CANCELLABLE, "CANCELLED", outbox, messages_for)
+    print(f"Blackout date {date_str}: cancelled {len(cancelled)} events.")
+    return cancelled
+
+def restore_events_on_date(supabase_client, date_str, now=None, event_types=None, outbox=None, messages_for=None):
+    """
+    Called when `date_str` is removed from cancelled_dates: the future events on
+    that date that were cancelled automatically (status_determinant AUTOMATIC)
+    go back to NOT_YET_OPEN in one update; the state machine then moves them
+    on to their time-based status. Manually cancelled events stay cancelled.
+    With an `outbox`, the emails rendered by `messages_for(events)` are queued
+    in the same transaction (see _set_status_on_date).
+
+    Returns:
+        list: the events that were restored
+    """
+    if now is None:
+        now = datetime.now(timezone.utc)
+    restored = _set_status_on_date(supabase_client, date_str, now, event_types, ["CANCELLED"], "NOT_YET_OPEN", outbox, messages_for)
+    print(f"Blackout date {date_str} removed: restored {len(restored)} events.")
+    return restored
@@ -1,26 +1,125 @@
 import os
-import random
-from datetime import datetime, timezone
-from typing import List, Optional
+from datetime import datetime
+from typing import List
 import pytz
 
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
-from pydantic import BaseModel
 
-from db import supabase
+from db import supabase, run_db, run_db_call
+import clock
 from models import (
     SignupRequest, ScheduleResponse, RegistrationRequest, RegistrationUpdate,
     GroupMemberAction, GroupMembersAction, UserGroupsUpdate, UserGroupMetadataUpdate,
     EventTypeCreate, EventTypeUpdate, EventStatusUpdate, CancelledDate, BulkUserCreate
 )
 from google_service import sync_to_google
-from logic import enrich_event, randomize_holding_queue, promote_from_holding, check_signup_eligibility, determine_event_status, resequence_holding, parse_interval_to_minutes, generate_future_events
+from logic import enrich_event, check_signup_eligibility, get_zone, generate_future_events, recompute_lottery, invalidate_generation_watermark, cancel_events_on_date, restore_events_on_date
 from email_service import email_service
+from scheduler import process_status_transitions
+from status_engine import enrich_events
+from transition_timer import TransitionTimer
+from event_type_cache import EventTypeCache
+from membership_cache import MembershipCache
+from cancelled_dates_cache import CancelledDatesCache
+from email_outbox import EmailOutbox, EMAIL_DIGEST_MINUTES
+from group_sync_job import GroupSyncJobs, GROUP_SYNC_CONCURRENCY
 
 app = FastAPI()
 
+# --- Event Type Cache ---
+# Event types only change through the admin endpoints below, which invalidate it.
+# Other instances are told via Postgres LISTEN/NOTIFY when DATABASE_URL is set.
+event_type_cache = EventTypeCache(supabase)
+
+@app.on_event("startup")
+async def start_event_type_listener():
+    if event_type_cache.start_listener():
+        print("Event type cache listener started.")
+
+@app.on_event("shutdown")
+async def stop_event_type_listener():
+    event_type_cache.stop_listener()
+
+# --- Membership Cache ---
+# Profile -> group ids index used by admin checks and signup eligibility.
+# Updated in place by the membership endpoints below.
+membership_cache = MembershipCache(supabase)
+
+@app.on_event("startup")
+async def load_membership_cache():
+    try:
+        await run_db_call(membership_cache.load)
+    except Exception as e:
+        # Loaded lazily on first use instead
+        print(f"Membership cache preload failed: {e}")
+
+# --- Cancelled Dates Cache ---
+# Blackout dates checked by every generation run. Updated in place by the
+# cancelled_dates endpoints; other instances re-read the table after its TTL.
+cancelled_dates_cache = CancelledDatesCache(supabase)
+
+# --- Email Delivery ---
+# Once started, every send_* call queues its messages on the event loop and
+# returns without waiting; delivery shares one pooled HTTP client.
+@app.on_event("startup")
+async def start_email_delivery():
+    email_service.start()
+
+# With ENABLE_EMAIL_OUTBOX=true, emails are written to the email_outbox table
+# instead (transition emails in the same transaction as the status change) and
+# a background dispatcher delivers them with retries.
+email_outbox = EmailOutbox(supabase, email_service, now_fn=lambda: get_now()) if os.environ.get("ENABLE_EMAIL_OUTBOX") == "true" else None
+
+@app.on_event("startup")
+async def start_email_outbox():
+    if email_outbox is None:
+        if EMAIL_DIGEST_MINUTES > 0:
+            print("EMAIL_DIGEST_MINUTES is set but ENABLE_EMAIL_OUTBOX is not: digests need the outbox, so every email is sent immediately.")
+        return
+    email_service.use_outbox(email_outbox)
+    email_outbox.start()
+    print("Email outbox dispatcher started.")
+
+@app.on_event("shutdown")
+async def stop_email_delivery():
+    if email_outbox is not None:
+        await email_outbox.stop()
+    await email_service.aclose()
+
+# --- Google Group Sync Jobs ---
+# Sync-all runs in the background; progress is read through the status endpoint.
+group_sync_jobs = GroupSyncJobs(supabase)
+
+@app.on_event("shutdown")
+async def stop_group_sync_jobs():
+    await group_sync_jobs.stop()
+
+# --- In-process Transition Timer (optional) ---
+# Fires status transitions at their exact timestamps. The Cloud Scheduler cron
+# hitting /api/schedule stays in place as a safety net.
+transition_timer = None
+
+@app.on_event("startup")
+async def start_transition_timer():
+    global transition_timer
+    if os.environ.get("ENABLE_TRANSITION_TIMER") != "true":
+        return
+    transition_timer = TransitionTimer(
+        supabase,
+        lambda now, event_ids: process_status_transitions(supabase, now, event_ids=event_ids, event_types=event_type_cache, outbox=email_outbox),
+        now_fn=get_now,
+        event_types=event_type_cache
+    )
+    transition_timer.start()
+    print("Transition timer started.")
+
+@app.on_event("shutdown")
+async def stop_transition_timer():
+    if transition_timer is not None:
+        await transition_timer.stop()
+
 # --- Security Dependency ---
 
 async def get_current_user(request: Request):
@@ -57,7 +156,7 @@ async def get_current_user(request: Request):
 
     try:
         # Use simple get_user() verification
-        user_res = supabase.auth.get_user(token)
+        user_res = await run_db_call(supabase.auth.get_user, token)
         if not user_res.user:
              raise HTTPException(status_code=401, detail="Invalid Token")
         
@@ -68,18 +167,19 @@ async def get_current_user(request: Request):
         # but it's unreliable for Google OAuth signups. This fallback ensures
         # the link is repaired on next login if the trigger failed.
         try:
-            profile_check = supabase.table("profiles").select("id, auth_user_id").eq("auth_user_id", user.id).maybe_single().execute()
+            profile_check = await run_db(supabase.table("profiles").select("id, auth_user_id").eq("auth_user_id", user.id).maybe_single())
             
             if not profile_check.data:
                 # No profile linked by auth_user_id — try to find one by email
-                email_check = supabase.table("profiles").select("id, auth_user_id").eq("email", user.email).maybe_single().execute()
+                email_check = await run_db(supabase.table("profiles").select("id, auth_user_id").eq("email", user.email).maybe_single())
                 
                 if email_check.data and not email_check.data.get("auth_user_id"):
                     # Found an unlinked profile with matching email — link it now
-                    supabase.table("profiles").update({
+                    await run_db(supabase.table("profiles").update({
                         "auth_user_id": user.id,
                         "auth_method": "google" if (getattr(user, 'app_metadata', {}) or {}).get("provider") == "google" else "email"
-                    }).eq("id", email_check.data["id"]).execute()
+                    }).eq("id", email_check.data["id"]))
+                    membership_cache.link_auth_user(user.id, email_check.data["id"])
                     print(f"AUTO-LINKED: Profile {email_check.data['id']} -> Auth User {user.id} ({user.email})")
         except Exception as link_err:
             # Non-fatal: don't block login if linking fails
@@ -108,22 +208,10 @@ async def get_current_admin(request: Request):
     if user.email == "mock.admin@test.com" or user.id == "793db7d3-7996-4669-8714-8340f784085c":
         return user
         
-    # Real Check: Fetch Profile -> Groups
+    # Real Check: Profile -> Groups, from the in-memory membership index
     # New Schema: profiles -> profile_groups -> user_groups
     try:
-        res = supabase.table("profiles").select("*, profile_groups(user_groups(name))").eq("auth_user_id", user.id).single().execute()
-        
-        is_admin = False
-        if res.data and res.data.get("profile_groups"):
-            # profile_groups is a list of objects: [{'user_groups': {'name': 'Admin'}}, ...]
-            for pg in res.data["profile_groups"]:
-                if pg.get("user_groups"):
-                    group_name = pg["user_groups"].get("name")
-                    if group_name in ["Super Admin", "SuperAdmin", "Admin"]:
-                        is_admin = True
-                        break
-        
-        if is_admin:
+        if await run_db_call(membership_cache.is_admin, user.id):
             return user
     except Exception as e:
         print(f"Admin Check DB Error: {e}")
@@ -135,19 +223,20 @@ async def get_current_admin(request: Request):
 # --- Helpers ---
 
 def get_now():
-    return datetime.now(timezone.utc)
+    # Injectable via clock.set_clock() (e.g. simulation.py)
+    return clock.get_now()
 
 
 
 # enrich_event moved to logic.py
 
 def fetch_event(event_id: str):
-    # Join with event_types
-    response = supabase.table("events").select("*, event_types(*)").eq("id", event_id).single().execute()
+    # Join with event_types (in memory, from the cache)
+    response = supabase.table("events").select("*").eq("id", event_id).single().execute()
     if not response.data:
         raise HTTPException(status_code=404, detail="Event not found")
     
-    return enrich_event(response.data)
+    return enrich_event(event_type_cache.attach(response.data))
 
 def fetch_counts(event_id: str):
     # This is a bit inefficient doing client-side counting, but fine for MVP
@@ -183,15 +272,15 @@ async def request_access(body: RegistrationRequest):
     try:
         # We use the Service Role Key (via 'supabase' client) so we can obtain write access 
         # even if RLS is strict (though we set RLS to allow public insert).
-        res = supabase.table("registration_requests").insert(payload).execute()
+        res = await run_db(supabase.table("registration_requests").insert(payload))
         
         # Send Emails
         request_data = res.data[0]
         # Run in background? For MVP, synchronous valid.
         try:
             from email_service import email_service
-            email_service.send_user_acknowledgement(request_data['email'], request_data['full_name'])
-            email_service.send_admin_notification(request_data)
+            await run_db_call(email_service.send_user_acknowledgement, request_data['email'], request_data['full_name'])
+            await run_db_call(email_service.send_admin_notification, request_data)
         except Exception as email_e:
             print(f"Failed to send email: {email_e}")
 
@@ -211,7 +300,7 @@ async def list_requests(request: Request):
     
     # Fetch all pending requests
     # Sort by created_at desc
-    res = supabase.table("registration_requests").select("*").order("created_at", desc=True).execute()
+    res = await run_db(supabase.table("registration_requests").select("*").order("created_at", desc=True))
     return {"status": "success", "data": res.data}
 
 @app.get("/api/admin/user_groups")
@@ -221,23 +310,19 @@ async def list_user_groups(request: Request):
     """
     await get_current_admin(request)
     
-    res = supabase.table("user_groups").select("*, profile_groups(count)").order("name").execute()
+    # Served from the membership cache (groups + member counts)
+    counts = await run_db_call(membership_cache.member_counts)
     
-    # Flatten counts
     data = []
-    for row in res.data:
-        count = 0
-        if row.get("profile_groups") and len(row["profile_groups"]) > 0:
-            count = row["profile_groups"][0].get("count", 0)
-        
+    for row in sorted(await run_db_call(membership_cache.groups), key=lambda g: g["name"]):
         data.append({
             "id": row["id"],
             "name": row["name"],
-            "description": row["description"],
+            "description": row.get("description"),
             "group_email": row.get("group_email"),
             "guest_limit": row.get("guest_limit", 0),
             "group_type": row.get("group_type", "OTHER"),
-            "user_count": count
+            "user_count": counts.get(str(row["id"]), 0)
         })
     return {"status": "success", "data": data}
 
@@ -259,40 +344,71 @@ async def update_user_group(group_id: str, body: UserGroupMetadataUpdate, reques
         return {"status": "success", "message": "No fields to update"}
 
     try:
-        res = supabase.table("user_groups")\
+        res = await run_db(supabase.table("user_groups")\
             .update(update_data)\
-            .eq("id", group_id)\
-            .execute()
+            .eq("id", group_id))
         
         if not res.data:
             raise HTTPException(status_code=404, detail="Group not found")
-            
+        
+        membership_cache.update_group(res.data[0])
         return {"status": "success", "data": res.data[0]}
     except Exception as e:
         print(f"Error updating user group: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/admin/groups/{group_id}/sync")
-async def trigger_group_sync(group_id: str, request: Request):
+async def trigger_group_sync(group_id: str, request: Request, full: bool = False):
     """
-    Trigger a sync of Supabase group members to Google Groups (Mocked).
+    Trigger a sync of Supabase group members to Google Groups.
+    Applies the membership changes since the last sync; `full=true` forces a full reconciliation.
     """
     await get_current_admin(request)
     
-    res = await sync_to_google(group_id)
+    res = await sync_to_google(group_id, full=full)
     if res.get("status") == "error":
         raise HTTPException(status_code=500, detail=res.get("message"))
         
     return res
 
+@app.post("/api/admin/group_sync_jobs")
+async def start_group_sync_job(request: Request, full: bool = False, concurrency: int = GROUP_SYNC_CONCURRENCY):
+    """
+    Sync every group with a Google Group email in the background, `concurrency` at a time.
+    Returns the job (or the one already running); poll GET /api/admin/group_sync_jobs/{job_id}.
+    """
+    await get_current_admin(request)
+    if concurrency < 1:
+        raise HTTPException(status_code=400, detail="concurrency must be at least 1")
+    job = group_sync_jobs.start(full=full, concurrency=concurrency)
+    return {"status": "success", "data": job.progress()}
+
+@app.get("/api/admin/group_sync_jobs/latest")
+async def get_latest_group_sync_job(request: Request):
+    await get_current_admin(request)
+    job = group_sync_jobs.latest()
+    if job is None:
+        raise HTTPException(status_code=404, detail="No group sync job has run")
+    return {"status": "success", "data": job.progress()}
+
+@app.get("/api/admin/group_sync_jobs/{job_id}")
+async def get_group_sync_job(job_id: str, request: Request):
+    """
+    Progress and per-group results of a sync-all job.
+    """
+    await get_current_admin(request)
+    job = group_sync_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Group sync job not found")
+    return {"status": "success", "data": job.progress()}
+
 @app.get("/api/admin/groups/{group_id}/members")
 async def list_group_members(group_id: str, request: Request):
     await get_current_admin(request)
     # Join profile_groups -> profiles
-    res = supabase.table("profile_groups")\
+    res = await run_db(supabase.table("profile_groups")\
         .select("profile_id, profiles(id, name, email)")\
-        .eq("group_id", group_id)\
-        .execute()
+        .eq("group_id", group_id))
     
     members = []
     for row in res.data:
@@ -307,7 +423,7 @@ async def add_group_member(group_id: str, body: GroupMemberAction, request: Requ
     
     # 1. Find profile by email
     # Case insensitive search might be better
-    profile_res = supabase.table("profiles").select("id").ilike("email", body.email).maybe_single().execute()
+    profile_res = await run_db(supabase.table("profiles").select("id").ilike("email", body.email).maybe_single())
     
     if not profile_res.data:
         raise HTTPException(status_code=404, detail=f"User with email {body.email} not found.")
@@ -316,44 +432,44 @@ async def add_group_member(group_id: str, body: GroupMemberAction, request: Requ
     
     # 2. Insert into profile_groups
     try:
-        supabase.table("profile_groups").insert({
+        await run_db(supabase.table("profile_groups").insert({
             "profile_id": profile_id,
             "group_id": group_id
-        }).execute()
+        }))
     except Exception as e:
         if "unique violation" in str(e).lower() or "duplicate key" in str(e).lower():
             return {"status": "success", "message": "User already in group"}
         raise HTTPException(status_code=400, detail=str(e))
-        
+    
+    membership_cache.add_members(group_id, [profile_id])
     return {"status": "success", "message": "Member added"}
 
 @app.delete("/api/admin/groups/{group_id}/members/{profile_id}")
 async def remove_group_member(group_id: str, profile_id: str, request: Request):
     await get_current_admin(request)
     
-    supabase.table("profile_groups")\
+    await run_db(supabase.table("profile_groups")\
         .delete()\
         .eq("group_id", group_id)\
-        .eq("profile_id", profile_id)\
-        .execute()
-        
+        .eq("profile_id", profile_id))
+    
+    membership_cache.remove_member(group_id, profile_id)
     return {"status": "success", "message": "Member removed"}
 
 @app.get("/api/admin/profiles")
 async def list_profiles(request: Request):
     await get_current_admin(request)
-    res = supabase.table("profiles").select("id, name, email, auth_method").order("name").execute()
+    res = await run_db(supabase.table("profiles").select("id, name, email, auth_method").order("name"))
     return {"status": "success", "data": res.data}
 
 @app.get("/api/admin/profiles/{profile_id}")
 async def get_profile(profile_id: str, request: Request):
     await get_current_admin(request)
     # Join with groups
-    res = supabase.table("profiles")\
+    res = await run_db(supabase.table("profiles")\
         .select("id, name, email, auth_method, profile_groups(group_id)")\
         .eq("id", profile_id)\
-        .maybe_single()\
-        .execute()
+        .maybe_single())
     
     if not res.data:
         raise HTTPException(status_code=404, detail="Profile not found")
@@ -373,16 +489,19 @@ async def update_profile_groups(profile_id: str, body: UserGroupsUpdate, request
     # Better to do in a transaction if possible, but this works for MVP
     try:
         # 1. Delete existing
-        supabase.table("profile_groups").delete().eq("profile_id", profile_id).execute()
+        await run_db(supabase.table("profile_groups").delete().eq("profile_id", profile_id))
         
         # 2. Insert new
         if body.group_ids:
             inserts = [{"profile_id": profile_id, "group_id": gid} for gid in body.group_ids]
-            supabase.table("profile_groups").insert(inserts).execute()
+            await run_db(supabase.table("profile_groups").insert(inserts))
             
     except Exception as e:
+        # Partially applied: reload from the database on next use
+        membership_cache.invalidate()
         raise HTTPException(status_code=400, detail=str(e))
-        
+    
+    membership_cache.set_groups(profile_id, body.group_ids or [])
     return {"status": "success", "message": "Groups updated successfully"}
 
 @app.post("/api/admin/users/bulk-pre-approve")
@@ -390,8 +509,7 @@ async def bulk_pre_approve_users(body: List[BulkUserCreate], request: Request):
     admin = await get_current_admin(request)
     
     # 1. Map all group names to IDs
-    all_groups_res = supabase.table("user_groups").select("id, name").execute()
-    group_map = {g['name']: g['id'] for g in all_groups_res.data}
+    group_map = {g['name']: g['id'] for g in await run_db_call(membership_cache.groups)}
     
     success_count = 0
     errors = []
@@ -403,7 +521,7 @@ async def bulk_pre_approve_users(body: List[BulkUserCreate], request: Request):
             user_email = user_data.email.strip().lower()
             
             # Check if profile already exists
-            profile_res = supabase.table("profiles").select("id").eq("email", user_email).execute()
+            profile_res = await run_db(supabase.table("profiles").select("id").eq("email", user_email))
             
             profile_id = None
             if profile_res.data:
@@ -415,7 +533,7 @@ async def bulk_pre_approve_users(body: List[BulkUserCreate], request: Request):
                     "name": user_data.full_name.strip() or 'User',
                     "auth_method": "email"
                 }
-                create_res = supabase.table("profiles").insert(new_profile).execute()
+                create_res = await run_db(supabase.table("profiles").insert(new_profile))
                 if create_res.data:
                     profile_id = create_res.data[0]['id']
             
@@ -433,8 +551,9 @@ async def bulk_pre_approve_users(body: List[BulkUserCreate], request: Request):
                     
                     if group_inserts:
                         # Clear and re-add groups to be safe without duplicating
-                        supabase.table("profile_groups").delete().eq("profile_id", profile_id).execute()
-                        supabase.table("profile_groups").insert(group_inserts).execute()
+                        await run_db(supabase.table("profile_groups").delete().eq("profile_id", profile_id))
+                        await run_db(supabase.table("profile_groups").insert(group_inserts))
+                        membership_cache.set_groups(profile_id, [g["group_id"] for g in group_inserts])
                         
                 # Create a Registration Request record for history purposes
                 req_payload = {
@@ -444,11 +563,11 @@ async def bulk_pre_approve_users(body: List[BulkUserCreate], request: Request):
                     "status": "APPROVED",
                     "admin_notes": "Added via CSV Bulk Import"
                 }
-                supabase.table("registration_requests").insert(req_payload).execute()
+                await run_db(supabase.table("registration_requests").insert(req_payload))
 
                 # Send Email
                 try:
-                    email_service.send_access_granted(user_email, user_data.full_name.strip() or 'User')
+                    await run_db_call(email_service.send_access_granted, user_email, user_data.full_name.strip() or 'User')
                 except Exception as e:
                     print(f"Failed to send email to {user_email}: {e}")
                     
@@ -472,14 +591,17 @@ async def add_group_members_batch(group_id: str, body: GroupMembersAction, reque
         # We use a trick to avoid duplicates if possible, or just catch it.
         # Supabase doesn't easily support UPSERT via the client with specific ON CONFLICT for join tables without a unique constraint name.
         # But we'll just try and see.
-        supabase.table("profile_groups").insert(inserts).execute()
+        await run_db(supabase.table("profile_groups").insert(inserts))
     except Exception as e:
         if "unique violation" in str(e).lower() or "duplicate key" in str(e).lower():
             # If some were already there, we might still want to know.
             # But usually it's fine.
+            # Which rows landed is unknown: reload from the database on next use
+            membership_cache.invalidate()
             return {"status": "success", "message": "Members added (some might have been already present)"}
         raise HTTPException(status_code=400, detail=str(e))
-        
+    
+    membership_cache.add_members(group_id, body.profile_ids)
     return {"status": "success", "message": f"{len(inserts)} members added"}
 
 @app.post("/api/admin/requests/update")
@@ -500,7 +622,7 @@ async def update_request(body: RegistrationUpdate, request: Request):
     
     try:
         # Fetch original request to get email and current status
-        original = supabase.table("registration_requests").select("*").eq("id", body.request_id).single().execute()
+        original = await run_db(supabase.table("registration_requests").select("*").eq("id", body.request_id).single())
         if not original.data:
              raise HTTPException(status_code=404, detail="Request not found")
         
@@ -513,13 +635,13 @@ async def update_request(body: RegistrationUpdate, request: Request):
             auth_ids_to_delete = set()
             
             # Check Profile
-            profile_res = supabase.table("profiles").select("auth_user_id").eq("email", user_email).maybe_single().execute()
+            profile_res = await run_db(supabase.table("profiles").select("auth_user_id").eq("email", user_email).maybe_single())
             if profile_res.data and profile_res.data.get('auth_user_id'):
                 auth_ids_to_delete.add(profile_res.data['auth_user_id'])
             
             # Check Auth system directly by email (Source of Truth)
             try:
-                all_users = supabase.auth.admin.list_users()
+                all_users = await run_db_call(supabase.auth.admin.list_users)
                 for u in all_users:
                     if u.email.lower() == user_email.lower():
                         auth_ids_to_delete.add(u.id)
@@ -527,18 +649,19 @@ async def update_request(body: RegistrationUpdate, request: Request):
                 print(f"Warning: Failed to search Auth users by email {user_email}: {list_e}")
 
             # 2. Delete Profile
-            supabase.table("profiles").delete().eq("email", user_email).execute()
+            await run_db(supabase.table("profiles").delete().eq("email", user_email))
+            membership_cache.invalidate()
 
             # 3. Cleanup Auth Users
             for auth_id in auth_ids_to_delete:
                 try:
-                    supabase.auth.admin.delete_user(auth_id)
+                    await run_db_call(supabase.auth.admin.delete_user, auth_id)
                     print(f"Successfully deleted auth user {auth_id} for {user_email}")
                 except Exception as e:
                     # We expect this might fail if one method found a stale ID
                     print(f"Note: Cleanup of auth user {auth_id} for {user_email}: {e}")
 
-        res = supabase.table("registration_requests").update(update_payload).eq("id", body.request_id).execute()
+        res = await run_db(supabase.table("registration_requests").update(update_payload).eq("id", body.request_id))
         
         # 2. Handle Actions & Emails
         from email_service import email_service
@@ -546,7 +669,7 @@ async def update_request(body: RegistrationUpdate, request: Request):
         if body.action == 'APPROVED':
             # Create Profile immediately (Pre-provision)
             # Check if profiles table has this email
-            profile_res = supabase.table("profiles").select("id").eq("email", user_email).execute()
+            profile_res = await run_db(supabase.table("profiles").select("id").eq("email", user_email))
             
             profile_id = None
             if profile_res.data:
@@ -559,7 +682,7 @@ async def update_request(body: RegistrationUpdate, request: Request):
                     "auth_method": "email"
                 }
                 # Auth ID is null initially
-                create_res = supabase.table("profiles").insert(new_profile).execute()
+                create_res = await run_db(supabase.table("profiles").insert(new_profile))
                 if create_res.data:
                     profile_id = create_res.data[0]['id']
             
@@ -568,9 +691,7 @@ async def update_request(body: RegistrationUpdate, request: Request):
                 # body.groups is expected to be a list of strings
                 if body.groups:
                     # Resolve group names to IDs
-                    # Optimization: fetch all groups once map them (or cache them)
-                    all_groups = supabase.table("user_groups").select("id, name").execute()
-                    group_map = {g['name']: g['id'] for g in all_groups.data}
+                    group_map = {g['name']: g['id'] for g in await run_db_call(membership_cache.groups)}
                     
                     group_inserts = []
                     for g_name in body.groups:
@@ -582,19 +703,20 @@ async def update_request(body: RegistrationUpdate, request: Request):
                     
                     if group_inserts:
                         # Clear existing for this profile to handle updates (Set behavior)
-                        supabase.table("profile_groups").delete().eq("profile_id", profile_id).execute()
-                        supabase.table("profile_groups").insert(group_inserts).execute()
+                        await run_db(supabase.table("profile_groups").delete().eq("profile_id", profile_id))
+                        await run_db(supabase.table("profile_groups").insert(group_inserts))
+                        membership_cache.set_groups(profile_id, [g["group_id"] for g in group_inserts])
 
             # Send Access Granted Email
-            email_service.send_access_granted(user_email, original.data.get('full_name', 'User'))
+            await run_db_call(email_service.send_access_granted, user_email, original.data.get('full_name', 'User'))
             
         elif body.action == 'DECLINED_MESSAGE':
             if body.message:
-                email_service.send_rejection_reason(user_email, body.message)
+                await run_db_call(email_service.send_rejection_reason, user_email, body.message)
                 
         elif body.action == 'INFO_NEEDED':
             if body.message:
-                email_service.send_more_info_request(user_email, body.message)
+                await run_db_call(email_service.send_more_info_request, user_email, body.message)
         
         return {"status": "success", "message": f"Request marked as {db_status}", "data": res.data}
         
@@ -609,37 +731,8 @@ async def list_event_types(request: Request):
     """
     await get_current_admin(request)
     
-    # Join with user_groups for all three group references
-    res = supabase.table("event_types").select("""
-        *,
-        roster_user_group:user_groups!event_types_roster_user_group_fkey(id, name),
-        reserve_first_priority_user_group:user_groups!event_types_reserve_first_priority_user_group_fkey(id, name),
-        reserve_second_priority_user_group:user_groups!event_types_reserve_second_priority_user_group_fkey(id, name)
-    """).order("name").execute()
-    
-    # Flatten the joined data for easier frontend consumption
-    data = []
-    for row in res.data:
-        event_type = {
-            "id": row["id"],
-            "name": row["name"],
-            "day_of_week": row["day_of_week"],
-            "time_of_day": row["time_of_day"],
-            "time_zone": row["time_zone"],
-            "max_signups": row["max_signups"],
-            "roster_sign_up_open_minutes": row["roster_sign_up_open_minutes"],
-            "reserve_sign_up_open_minutes": row["reserve_sign_up_open_minutes"],
-            "initial_reserve_scheduling_minutes": row["initial_reserve_scheduling_minutes"],
-            "final_reserve_scheduling_minutes": row["final_reserve_scheduling_minutes"],
-            "roster_user_group_id": row.get("roster_user_group", {}).get("id") if row.get("roster_user_group") else None,
-            "roster_user_group_name": row.get("roster_user_group", {}).get("name") if row.get("roster_user_group") else None,
-            "reserve_first_priority_user_group_id": row.get("reserve_first_priority_user_group", {}).get("id") if row.get("reserve_first_priority_user_group") else None,
-            "reserve_first_priority_user_group_name": row.get("reserve_first_priority_user_group", {}).get("name") if row.get("reserve_first_priority_user_group") else None,
-            "reserve_second_priority_user_group_id": row.get("reserve_second_priority_user_group", {}).get("id") if row.get("reserve_second_priority_user_group") else None,
-            "reserve_second_priority_user_group_name": row.get("reserve_second_priority_user_group", {}).get("name") if row.get("reserve_second_priority_user_group") else None,
-            "duration_minutes": parse_interval_to_minutes(row.get("duration"))
-        }
-        data.append(event_type)
+    # Served from the cache, with the user group names already resolved
+    data = await run_db_call(event_type_cache.admin_view)
     
     return {"status": "success", "data": data}
 
@@ -657,16 +750,27 @@ async def create_event_type(body: EventTypeCreate, request: Request):
             payload["duration"] = f"{payload['duration_minutes']} minutes"
             del payload["duration_minutes"]
             
-        res = supabase.table("event_types").insert(payload).execute()
+        res = await run_db(supabase.table("event_types").insert(payload))
         
         if not res.data:
             raise HTTPException(status_code=500, detail="Failed to create event type")
         
+        event_type_cache.invalidate()
+        
         return {"status": "success", "message": "Event type created", "data": res.data[0]}
     except Exception as e:
         print(f"Error creating event type: {e}")
         raise HTTPException(status_code=400, detail=f"Failed to create event type: {str(e)}")
 
+# Fields that decide the instant each generated event is materialized at
+SLOT_FIELDS = ("day_of_week", "time_of_day", "time_zone")
+
+def _schedule_changed(previous, updated):
+    # time_of_day may come back as "18:00:00" or "18:00"; a missing zone means the default one
+    def slot(row):
+        return (row.get("day_of_week"), str(row.get("time_of_day") or "")[:5], get_zone(row.get("time_zone")).key)
+    return slot(previous) != slot(updated)
+
 @app.put("/api/admin/event_types/{event_type_id}")
 async def update_event_type(event_type_id: str, body: EventTypeUpdate, request: Request):
     """
@@ -686,11 +790,21 @@ async def update_event_type(event_type_id: str, body: EventTypeUpdate, request:
              payload["duration"] = f"{payload['duration_minutes']} minutes"
              del payload["duration_minutes"]
         
-        res = supabase.table("event_types").update(payload).eq("id", event_type_id).execute()
+        # A new weekly slot invalidates the generated-events watermark
+        previous = None
+        if any(field in payload for field in SLOT_FIELDS):
+            previous_res = await run_db(supabase.table("event_types").select(", ".join(SLOT_FIELDS)).eq("id", event_type_id))
+            previous = previous_res.data[0] if previous_res.data else None
+        
+        res = await run_db(supabase.table("event_types").update(payload).eq("id", event_type_id))
         
         if not res.data:
             raise HTTPException(status_code=404, detail="Event type not found")
         
+        event_type_cache.invalidate()
+        if previous and _schedule_changed(previous, res.data[0]):
+            await run_db_call(invalidate_generation_watermark, supabase, event_type_id, now=get_now())
+        
         return {"status": "success", "message": "Event type updated", "data": res.data[0]}
     except HTTPException:
         raise
@@ -706,12 +820,14 @@ async def delete_event_type(event_type_id: str, request: Request):
     await get_current_admin(request)
     
     try:
-        res = supabase.table("event_types").delete().eq("id", event_type_id).execute()
+        res = await run_db(supabase.table("event_types").delete().eq("id", event_type_id))
         
         # Supabase delete doesn't error if nothing was deleted, so check data
         if not res.data:
             raise HTTPException(status_code=404, detail="Event type not found")
         
+        event_type_cache.invalidate()
+        
         return {"status": "success", "message": "Event type deleted"}
     except HTTPException:
         raise
@@ -729,7 +845,7 @@ async def list_admin_events(request: Request, filter: str = "future"):
     await get_current_admin(request)
     
     try:
-        query = supabase.table("events").select("*, event_types(name)")
+        query = supabase.table("events").select("*")
         now = get_now()
         
         if filter == "future":
@@ -741,17 +857,16 @@ async def list_admin_events(request: Request, filter: str = "future"):
         else:
             query = query.order("event_date", desc=False)
             
-        res = query.limit(200).execute()
+        res = await run_db(query.limit(200))
         
         # Fetch counts (Item 5)
         event_ids = [row["id"] for row in res.data]
         counts_map = {eid: {"roster": 0, "waitlist_holding": 0} for eid in event_ids}
         
         if event_ids:
-            signups_res = supabase.table("event_signups")\
+            signups_res = await run_db(supabase.table("event_signups")\
                 .select("event_id, list_type")\
-                .in_("event_id", event_ids)\
-                .execute()
+                .in_("event_id", event_ids))
                 
             for s in signups_res.data:
                 eid = s['event_id']
@@ -762,12 +877,13 @@ async def list_admin_events(request: Request, filter: str = "future"):
                     elif ltype in ["WAITLIST", "WAITLIST_HOLDING"]:
                         counts_map[eid]["waitlist_holding"] += 1
         
+        await run_db_call(event_type_cache.attach, res.data)
         data = []
         for row in res.data:
             event = {
                 "id": row["id"],
                 "event_type_id": row["event_type_id"],
-                "event_type_name": row.get("event_types", {}).get("name") if row.get("event_types") else "Unknown",
+                "event_type_name": (row.get("event_types") or {}).get("name", "Unknown"),
                 "event_date": row["event_date"],
                 "status": row["status"],
                 "status_determinant": row.get("status_determinant", "AUTOMATIC"),
@@ -796,7 +912,7 @@ async def update_event_status(event_id: str, body: EventStatusUpdate, request: R
             "status_determinant": body.status_determinant
         }
         
-        res = supabase.table("events").update(payload).eq("id", event_id).execute()
+        res = await run_db(supabase.table("events").update(payload).eq("id", event_id))
         
         if not res.data:
             raise HTTPException(status_code=404, detail="Event not found")
@@ -806,6 +922,52 @@ async def update_event_status(event_id: str, body: EventStatusUpdate, request: R
         print(f"Error updating event status: {e}")
         raise HTTPException(status_code=400, detail=f"Failed to update status: {e}")
 
+@app.get("/api/admin/events/{event_id}/lottery")
+async def get_event_lottery(event_id: str, request: Request):
+    """
+    Recompute an event's Tier 2/3 lottery from its stored seed (audits / disputes).
+    Each entrant is returned with its lottery position next to its current placement.
+    """
+    await get_current_admin(request)
+
+    try:
+        event_res = await run_db(supabase.table("events").select("id, status, lottery_seed, lottery_drawn_at").eq("id", event_id))
+        if not event_res.data:
+            raise HTTPException(status_code=404, detail="Event not found")
+        event = event_res.data[0]
+
+        if event.get("lottery_seed") is None:
+            return {"status": "success", "data": {"event_id": event_id, "drawn": False, "entrants": []}}
+
+        signups_res = await run_db(supabase.table("event_signups")\
+            .select("id, user_id, tier, list_type, sequence_number, created_at, profiles(name)")\
+            .eq("event_id", event_id))
+
+        entrants = []
+        for signup in recompute_lottery(signups_res.data or [], event["lottery_seed"], event.get("lottery_drawn_at")):
+            entrants.append({
+                "lottery_position": signup["lottery_position"],
+                "signup_id": signup["id"],
+                "user_id": signup["user_id"],
+                "name": signup.get("profiles", {}).get("name") if signup.get("profiles") else None,
+                "tier": signup["tier"],
+                "list_type": signup["list_type"],
+                "sequence_number": signup.get("sequence_number")
+            })
+
+        return {"status": "success", "data": {
+            "event_id": event_id,
+            "drawn": True,
+            "lottery_seed": event["lottery_seed"],
+            "lottery_drawn_at": event.get("lottery_drawn_at"),
+            "entrants": entrants
+        }}
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error recomputing lottery: {e}")
+        raise HTTPException(status_code=400, detail=f"Failed to recompute lottery: {e}")
+
 @app.get("/api/admin/cancelled_dates")
 async def list_cancelled_dates(request: Request):
     """
@@ -818,7 +980,7 @@ async def list_cancelled_dates(request: Request):
         # Use localized today to avoid skipping dates that are today in LA but tomorrow in UTC
         now_la = datetime.now(pytz.timezone("America/Los_Angeles"))
         today = now_la.strftime("%Y-%m-%d")
-        res = supabase.table("cancelled_dates").select("*").gte("date", today).order("date").execute()
+        res = await run_db(supabase.table("cancelled_dates").select("*").gte("date", today).order("date"))
         return {"status": "success", "data": res.data}
     except Exception as e:
         print(f"Error fetching cancelled dates: {e}")
@@ -839,12 +1001,25 @@ async def add_cancelled_date(body: CancelledDate, request: Request):
             "date": body.date,
             "reason": body.reason
         }
-        res = supabase.table("cancelled_dates").insert(payload).execute()
-        return {"status": "success", "data": res.data[0]}
+        res = await run_db(supabase.table("cancelled_dates").insert(payload))
+        cancelled_dates_cache.add(body.date)
     except Exception as e:
         print(f"Error adding cancelled date: {e}")
         raise HTTPException(status_code=400, detail=f"Failed to add date: {e}")
 
+    # Events already generated on that date are cancelled in one update
+    cancelled_events = []
+    try:
+        cancelled_events = await run_db_call(
+            cancel_events_on_date, supabase, body.date, now=get_now(), event_types=event_type_cache,
+            outbox=email_outbox, messages_for=date_change_messages(body.date, cancelled=True, reason=body.reason),
+        )
+        if email_outbox is None:
+            await run_db_call(notify_date_change, body.date, cancelled_events, cancelled=True, reason=body.reason)
+    except Exception as e:
+        print(f"Error cancelling events on {body.date}: {e}")
+    return {"status": "success", "data": res.data[0], "cancelled_events": len(cancelled_events)}
+
 @app.delete("/api/admin/cancelled_dates/{date_str}")
 async def remove_cancelled_date(date_str: str, request: Request):
     """
@@ -853,14 +1028,97 @@ async def remove_cancelled_date(date_str: str, request: Request):
     await get_current_admin(request)
     
     try:
-        res = supabase.table("cancelled_dates").delete().eq("date", date_str).execute()
+        res = await run_db(supabase.table("cancelled_dates").delete().eq("date", date_str))
         if not res.data:
             raise HTTPException(status_code=404, detail="Date not found in blocklist")
-        return {"status": "success", "message": "Date removed"}
+        cancelled_dates_cache.discard(date_str)
+    except HTTPException:
+        raise
     except Exception as e:
          print(f"Error removing cancelled date: {e}")
          raise HTTPException(status_code=400, detail=f"Failed to remove date: {e}")
 
+    # Bring back the events the blackout cancelled (not manually cancelled ones)
+    restored_events = []
+    try:
+        now = get_now()
+        restored_events = await run_db_call(
+            restore_events_on_date, supabase, date_str, now=now, event_types=event_type_cache,
+            outbox=email_outbox, messages_for=date_change_messages(date_str, cancelled=False),
+        )
+        if restored_events:
+            # Move them straight on to their time-based status
+            await run_db_call(process_status_transitions, supabase, now, event_ids=[e["id"] for e in restored_events], event_types=event_type_cache, outbox=email_outbox)
+        if email_outbox is None:
+            await run_db_call(notify_date_change, date_str, restored_events, cancelled=False)
+    except Exception as e:
+        print(f"Error restoring events on {date_str}: {e}")
+    return {"status": "success", "message": "Date removed", "restored_events": len(restored_events)}
+
+def notify_date_change(date_str, events, cancelled, reason=None, notifier=None):
+    """
+    Emails everyone signed up for any of `events`, with one signup query for
+    all of them and one notification per recipient listing their own events.
+    `notifier` defaults to email_service (an OutboxCollector renders instead).
+    """
+    if not events:
+        return
+    events_by_id = {str(e["id"]): e for e in event_type_cache.attach(events)}
+    res = supabase.table("event_signups").select("event_id, profiles!inner(email)").in_("event_id", list(events_by_id)).execute()
+    events_by_email = {}
+    for row in (res.data or []):
+        email = (row.get("profiles") or {}).get("email")
+        event = events_by_id.get(str(row["event_id"]))
+        if email and event is not None:
+            recipient_events = events_by_email.setdefault(email, [])
+            if event not in recipient_events:
+                recipient_events.append(event)
+    (notifier or email_service).send_date_change_notification(date_str, events_by_email, cancelled=cancelled, reason=reason)
+
+def date_change_messages(date_str, cancelled, reason=None):
+    """
+    With the outbox enabled, a `messages_for` for cancel/restore_events_on_date:
+    renders notify_date_change's emails so they are queued in the same
+    transaction as the status update. None without the outbox.
+    """
+    if email_outbox is None:
+        return None
+    def render(events):
+        collector = email_outbox.collector()
+        notify_date_change(date_str, events, cancelled, reason=reason, notifier=collector)
+        return collector.messages
+    return render
+
+@app.get("/api/admin/email_outbox")
+async def list_email_outbox(request: Request, status: str = "DEAD", limit: int = 100):
+    """
+    List outbox messages by status (dead letters by default), newest first.
+    """
+    await get_current_admin(request)
+    try:
+        res = await run_db(supabase.table("email_outbox")\
+            .select("id, event_id, to_email, subject, status, attempts, last_error, next_attempt_at, created_at, sent_at")\
+            .eq("status", status.upper())\
+            .order("created_at", desc=True)\
+            .limit(limit))
+        return {"status": "success", "data": res.data}
+    except Exception as e:
+        print(f"Error listing email outbox: {e}")
+        raise HTTPException(status_code=400, detail=f"Failed to list email outbox: {e}")
+
+@app.post("/api/admin/email_outbox/{outbox_id}/retry")
+async def retry_email_outbox(outbox_id: str, request: Request):
+    """
+    Re-queue a dead-lettered message.
+    """
+    await get_current_admin(request)
+    if email_outbox is None:
+        raise HTTPException(status_code=400, detail="Email outbox is not enabled")
+    row = await run_db_call(email_outbox.retry, outbox_id)
+    if not row:
+        raise HTTPException(status_code=404, detail="Dead-lettered message not found")
+    return {"status": "success", "data": row}
+
 from models import AdminEventUserAdd, AdminEventUserReorderRequest, AdminEventUserMove
 
 @app.get("/api/admin/events/{event_id}/users")
@@ -870,7 +1128,7 @@ async def list_admin_event_users(event_id: str, request: Request):
     """
     await get_current_admin(request)
     try:
-        res = supabase.table("event_signups").select("*, profiles(name, email)").eq("event_id", event_id).order("sequence_number").execute()
+        res = await run_db(supabase.table("event_signups").select("*, profiles(name, email)").eq("event_id", event_id).order("sequence_number"))
         return {"status": "success", "data": res.data}
     except Exception as e:
         print(f"Error fetching event users: {e}")
@@ -884,7 +1142,7 @@ async def add_admin_event_user(event_id: str, body: AdminEventUserAdd, request:
     await get_current_admin(request)
     try:
         # Get current max sequence for the target list
-        seq_res = supabase.table("event_signups").select("id", count="exact").eq("event_id", event_id).eq("list_type", body.target_list).execute()
+        seq_res = await run_db(supabase.table("event_signups").select("id", count="exact").eq("event_id", event_id).eq("list_type", body.target_list))
         sequence = (seq_res.count or 0) + 1
         
         payload = {
@@ -897,7 +1155,7 @@ async def add_admin_event_user(event_id: str, body: AdminEventUserAdd, request:
         if body.profile_id:
             payload["user_id"] = body.profile_id
             
-        res = supabase.table("event_signups").insert(payload).execute()
+        res = await run_db(supabase.table("event_signups").insert(payload))
         return {"status": "success", "data": res.data[0]}
     except Exception as e:
         print(f"Error adding event user: {e}")
@@ -911,7 +1169,7 @@ async def remove_admin_event_user(event_id: str, signup_id: str, request: Reques
     await get_current_admin(request)
     try:
         # Fetch current to get list_type and sequence
-        current_res = supabase.table("event_signups").select("*").eq("id", signup_id).maybe_single().execute()
+        current_res = await run_db(supabase.table("event_signups").select("*").eq("id", signup_id).maybe_single())
         if not current_res.data:
             raise HTTPException(status_code=404, detail="Signup not found")
             
@@ -919,12 +1177,12 @@ async def remove_admin_event_user(event_id: str, signup_id: str, request: Reques
         
         signups_to_remove_ids = [current_data["id"]]
         if not current_data.get("is_guest"):
-            guests_res = supabase.table("event_signups").select("id").eq("event_id", event_id).eq("user_id", current_data["user_id"]).eq("is_guest", True).execute()
+            guests_res = await run_db(supabase.table("event_signups").select("id").eq("event_id", event_id).eq("user_id", current_data["user_id"]).eq("is_guest", True))
             if guests_res.data:
                 signups_to_remove_ids.extend([g["id"] for g in guests_res.data])
 
         for s_id in signups_to_remove_ids:
-            fresh_res = supabase.table("event_signups").select("*").eq("id", s_id).maybe_single().execute()
+            fresh_res = await run_db(supabase.table("event_signups").select("*").eq("id", s_id).maybe_single())
             if not fresh_res.data:
                 continue
 
@@ -933,12 +1191,12 @@ async def remove_admin_event_user(event_id: str, signup_id: str, request: Reques
             current_seq = fresh_data["sequence_number"]
             
             # Delete
-            supabase.table("event_signups").delete().eq("id", s_id).execute()
+            await run_db(supabase.table("event_signups").delete().eq("id", s_id))
             
             # Update sequences
-            to_update = supabase.table("event_signups").select("id, sequence_number").eq("event_id", event_id).eq("list_type", current_list).gt("sequence_number", current_seq).execute()
+            to_update = await run_db(supabase.table("event_signups").select("id, sequence_number").eq("event_id", event_id).eq("list_type", current_list).gt("sequence_number", current_seq))
             for row in to_update.data:
-                supabase.table("event_signups").update({"sequence_number": row["sequence_number"] - 1}).eq("id", row["id"]).execute()
+                await run_db(supabase.table("event_signups").update({"sequence_number": row["sequence_number"] - 1}).eq("id", row["id"]))
             
         return {"status": "success", "message": "User removed from event"}
     except HTTPException:
@@ -956,7 +1214,7 @@ async def reorder_admin_event_users(event_id: str, body: AdminEventUserReorderRe
     try:
         # Let's do individual updates for safety
         for item in body.items:
-            supabase.table("event_signups").update({"sequence_number": item.sequence_number}).eq("id", item.signup_id).execute()
+            await run_db(supabase.table("event_signups").update({"sequence_number": item.sequence_number}).eq("id", item.signup_id))
             
         return {"status": "success", "message": "Users reordered"}
     except Exception as e:
@@ -971,7 +1229,7 @@ async def move_admin_event_user(event_id: str, signup_id: str, body: AdminEventU
     await get_current_admin(request)
     try:
         # Fetch current
-        current_res = supabase.table("event_signups").select("*").eq("id", signup_id).maybe_single().execute()
+        current_res = await run_db(supabase.table("event_signups").select("*").eq("id", signup_id).maybe_single())
         if not current_res.data:
             raise HTTPException(status_code=404, detail="Signup not found")
             
@@ -984,19 +1242,19 @@ async def move_admin_event_user(event_id: str, signup_id: str, body: AdminEventU
             return {"status": "success", "message": "User already in target list"}
             
         # Get max seq for new list
-        seq_res = supabase.table("event_signups").select("id", count="exact").eq("event_id", event_id).eq("list_type", new_list).execute()
+        seq_res = await run_db(supabase.table("event_signups").select("id", count="exact").eq("event_id", event_id).eq("list_type", new_list))
         new_seq = (seq_res.count or 0) + 1
         
         # Update user to new list and new seq
-        supabase.table("event_signups").update({
+        await run_db(supabase.table("event_signups").update({
             "list_type": new_list,
             "sequence_number": new_seq
-        }).eq("id", signup_id).execute()
+        }).eq("id", signup_id))
         
         # Decrement old list sequences
-        to_update = supabase.table("event_signups").select("id, sequence_number").eq("event_id", event_id).eq("list_type", old_list).gt("sequence_number", old_seq).execute()
+        to_update = await run_db(supabase.table("event_signups").select("id, sequence_number").eq("event_id", event_id).eq("list_type", old_list).gt("sequence_number", old_seq))
         for row in to_update.data:
-            supabase.table("event_signups").update({"sequence_number": row["sequence_number"] - 1}).eq("id", row["id"]).execute()
+            await run_db(supabase.table("event_signups").update({"sequence_number": row["sequence_number"] - 1}).eq("id", row["id"]))
             
         return {"status": "success", "message": f"User moved to {new_list}"}
     except Exception as e:
@@ -1019,7 +1277,7 @@ async def signup(body: SignupRequest, request: Request):
 
     print(f"Signup Request: user={user_id} event={body.event_id}")
     try:
-        event = fetch_event(body.event_id)
+        event = await run_db_call(fetch_event, body.event_id)
     except Exception as e:
         print(f"Error fetching event: {e}")
         raise HTTPException(status_code=404, detail="Event not found")
@@ -1030,11 +1288,16 @@ async def signup(body: SignupRequest, request: Request):
     #     raise HTTPException(status_code=400, detail="User already signed up")
     
     try:
-        # Fetch profile with groups (via join table)
-        profile_res = supabase.table("profiles").select("*, profile_groups(user_groups(id, name, guest_limit))").eq("auth_user_id", user_id).execute()
+        # Profile and groups come from the membership cache; only unknown users hit the DB
+        cached_profile_id = await run_db_call(membership_cache.profile_id_for_auth_user, user_id)
+        profile_res = None
+        if not cached_profile_id:
+            profile_res = await run_db(supabase.table("profiles").select("*").eq("auth_user_id", user_id))
         
         profile = None
-        if not profile_res.data:
+        if cached_profile_id:
+            profile = {"id": cached_profile_id}
+        elif not profile_res.data:
             # Attempt to create profile if missing (Self-healing)
             print(f"Profile not found for {user_id}. Attempting to create with Service Role...")
             try:
@@ -1050,10 +1313,8 @@ async def signup(body: SignupRequest, request: Request):
                 if "full_name" in meta:
                     new_profile["name"] = meta["full_name"]
                 
-                create_res = supabase.table("profiles").insert(new_profile).execute()
+                create_res = await run_db(supabase.table("profiles").insert(new_profile))
                 profile = create_res.data[0]
-                # Refetch with groups (will be empty)
-                profile["profile_groups"] = []
                 print(f"Successfully auto-created profile for {user_id}")
             except Exception as create_e:
                 print(f"Failed to auto-create profile: {create_e}")
@@ -1064,6 +1325,9 @@ async def signup(body: SignupRequest, request: Request):
                 raise HTTPException(status_code=400, detail="User profile not found and could not be created. Please contact support.")
         else:
             profile = profile_res.data[0]
+        
+        if not cached_profile_id:
+            membership_cache.link_auth_user(user_id, profile["id"])
             
     except Exception as e:
         print(f"Error fetching/creating profile: {e}")
@@ -1072,28 +1336,16 @@ async def signup(body: SignupRequest, request: Request):
 
     # Check if already signed up (using Profile ID)
     if not body.is_guest:
-        existing = supabase.table("event_signups").select("*").eq("event_id", body.event_id).eq("user_id", profile["id"]).eq("is_guest", False).execute()
+        existing = await run_db(supabase.table("event_signups").select("*").eq("event_id", body.event_id).eq("user_id", profile["id"]).eq("is_guest", False))
         if existing.data:
             raise HTTPException(status_code=400, detail="User already signed up")
 
-    # Flatten groups
-    user_groups = []
-    user_group_ids = []
-    max_guest_limit = 0
-    if profile.get("profile_groups"):
-        for pg in profile["profile_groups"]:
-            if pg.get("user_groups"):
-                group_data = pg["user_groups"]
-                if group_data.get("name"):
-                    user_groups.append(group_data["name"])
-                if group_data.get("id"):
-                    user_group_ids.append(group_data["id"])
-                gl = group_data.get("guest_limit")
-                if gl and gl > max_guest_limit:
-                    max_guest_limit = gl
+    # Groups (frozenset of ids) and guest allowance from the membership cache
+    user_group_ids = await run_db_call(membership_cache.group_ids, profile["id"])
+    max_guest_limit = await run_db_call(membership_cache.max_guest_limit, profile["id"])
 
     # Determine Access
-    is_member = len(user_groups) > 0 or len(user_group_ids) > 0
+    is_member = len(user_group_ids) > 0
     
     if not is_member:
         # If user has NO groups, they cannot sign up.
@@ -1113,7 +1365,7 @@ async def signup(body: SignupRequest, request: Request):
             if max_guest_limit <= 0:
                 raise HTTPException(status_code=403, detail="You do not have permission to add guests.")
             
-            guest_count_res = supabase.table("event_signups").select("id", count="exact").eq("event_id", body.event_id).eq("user_id", profile["id"]).eq("is_guest", True).execute()
+            guest_count_res = await run_db(supabase.table("event_signups").select("id", count="exact").eq("event_id", body.event_id).eq("user_id", profile["id"]).eq("is_guest", True))
             current_guests = guest_count_res.count or 0
             if current_guests >= max_guest_limit:
                 raise HTTPException(status_code=400, detail=f"You have reached your guest limit of {max_guest_limit} for this event.")
@@ -1133,24 +1385,24 @@ async def signup(body: SignupRequest, request: Request):
                 # Guest goes to WAITLIST_HOLDING specifically, not EVENT/WAITLIST.
                 # Use tier 4 (lowest priority) so they are processed after all members in FINAL_ORDERING.
                 final_list_type = "WAITLIST_HOLDING"
-                wl_res = supabase.table("event_signups").select("id", count="exact").eq("event_id", body.event_id).eq("list_type", "WAITLIST_HOLDING").execute()
+                wl_res = await run_db(supabase.table("event_signups").select("id", count="exact").eq("event_id", body.event_id).eq("list_type", "WAITLIST_HOLDING"))
                 sequence = (wl_res.count or 0) + 1
                 eligibility["tier"] = 4 
             elif event_status == "FINAL_ORDERING":
                 # Regular FCFS flow
-                roster_count = fetch_counts(body.event_id)
+                roster_count = await run_db_call(fetch_counts, body.event_id)
                 max_signups = event['max_signups']
                 if roster_count < max_signups:
                     final_list_type = "EVENT"
                     sequence = roster_count + 1
                 else:
                     final_list_type = "WAITLIST"
-                    wl_res = supabase.table("event_signups").select("id", count="exact").eq("event_id", body.event_id).eq("list_type", "WAITLIST").execute()
+                    wl_res = await run_db(supabase.table("event_signups").select("id", count="exact").eq("event_id", body.event_id).eq("list_type", "WAITLIST"))
                     sequence = (wl_res.count or 0) + 1
             else:
                 # Fallback, just force to waitlist
                 final_list_type = "WAITLIST"
-                wl_res = supabase.table("event_signups").select("id", count="exact").eq("event_id", body.event_id).eq("list_type", "WAITLIST").execute()
+                wl_res = await run_db(supabase.table("event_signups").select("id", count="exact").eq("event_id", body.event_id).eq("list_type", "WAITLIST"))
                 sequence = (wl_res.count or 0) + 1
             
             # eligibility["tier"] = 4 is already set in the blocks above as needed.
@@ -1160,18 +1412,18 @@ async def signup(body: SignupRequest, request: Request):
         else:
             # Regular user processing
             if target_list == "EVENT":
-                roster_count = fetch_counts(body.event_id)
+                roster_count = await run_db_call(fetch_counts, body.event_id)
                 max_signups = event['max_signups']
                 if roster_count < max_signups:
                     final_list_type = "EVENT"
                     sequence = roster_count + 1
                 else:
                     final_list_type = "WAITLIST"
-                    wl_res = supabase.table("event_signups").select("id", count="exact").eq("event_id", body.event_id).eq("list_type", "WAITLIST").execute()
+                    wl_res = await run_db(supabase.table("event_signups").select("id", count="exact").eq("event_id", body.event_id).eq("list_type", "WAITLIST"))
                     sequence = (wl_res.count or 0) + 1
             elif target_list == "WAITLIST_HOLDING":
                 final_list_type = "WAITLIST_HOLDING"
-                seq_res = supabase.table("event_signups").select("id", count="exact").eq("event_id", body.event_id).eq("list_type", "WAITLIST_HOLDING").execute()
+                seq_res = await run_db(supabase.table("event_signups").select("id", count="exact").eq("event_id", body.event_id).eq("list_type", "WAITLIST_HOLDING"))
                 sequence = (seq_res.count or 0) + 1
 
         # 3. Execute Insert
@@ -1186,7 +1438,7 @@ async def signup(body: SignupRequest, request: Request):
         }
         
         print(f"DEBUG: Payload for insert: {payload}")
-        res = supabase.table("event_signups").insert(payload).execute()
+        res = await run_db(supabase.table("event_signups").insert(payload))
         
         if not res.data:
             print(f"DEBUG: Insert returned no data. res={res}")
@@ -1208,7 +1460,7 @@ async def remove_signup(body: SignupRequest, request: Request):
     
     try:
         # Get profile ID first
-        profile_res = supabase.table("profiles").select("id").eq("auth_user_id", auth_user.id).single().execute()
+        profile_res = await run_db(supabase.table("profiles").select("id").eq("auth_user_id", auth_user.id).single())
         if not profile_res.data:
              raise HTTPException(status_code=404, detail="Profile not found")
         
@@ -1216,20 +1468,18 @@ async def remove_signup(body: SignupRequest, request: Request):
 
         # 1. Fetch current signup status BEFORE deleting
         if body.signup_id:
-            current_signup_res = supabase.table("event_signups")\
+            current_signup_res = await run_db(supabase.table("event_signups")\
                 .select("*")\
                 .eq("id", body.signup_id)\
                 .eq("user_id", target_profile_id)\
-                .maybe_single()\
-                .execute()
+                .maybe_single())
         else:
-            current_signup_res = supabase.table("event_signups")\
+            current_signup_res = await run_db(supabase.table("event_signups")\
                 .select("*")\
                 .eq("event_id", body.event_id)\
                 .eq("user_id", target_profile_id)\
                 .eq("is_guest", False)\
-                .maybe_single()\
-                .execute()
+                .maybe_single())
             
         if not current_signup_res.data:
             return {"status": "success", "message": "Signup not found (already removed?)"}
@@ -1239,13 +1489,13 @@ async def remove_signup(body: SignupRequest, request: Request):
         # 2. Determine signups to remove
         signups_to_remove_ids = [current_data["id"]]
         if not current_data.get("is_guest"):
-            guests_res = supabase.table("event_signups").select("id").eq("event_id", body.event_id).eq("user_id", target_profile_id).eq("is_guest", True).execute()
+            guests_res = await run_db(supabase.table("event_signups").select("id").eq("event_id", body.event_id).eq("user_id", target_profile_id).eq("is_guest", True))
             if guests_res.data:
                 signups_to_remove_ids.extend([g["id"] for g in guests_res.data])
 
         # 3. Process each removal carefully to preserve list continuous sequences
         for s_id in signups_to_remove_ids:
-            fresh_res = supabase.table("event_signups").select("*").eq("id", s_id).maybe_single().execute()
+            fresh_res = await run_db(supabase.table("event_signups").select("*").eq("id", s_id).maybe_single())
             if not fresh_res.data:
                 continue
 
@@ -1254,35 +1504,33 @@ async def remove_signup(body: SignupRequest, request: Request):
             current_seq = fresh_data["sequence_number"]
             
             # Delete the signup
-            supabase.table("event_signups").delete().eq("id", fresh_data["id"]).execute()
+            await run_db(supabase.table("event_signups").delete().eq("id", fresh_data["id"]))
             
             # Decrement sequences for the same list
-            to_update_res = supabase.table("event_signups")\
+            to_update_res = await run_db(supabase.table("event_signups")\
                 .select("id, sequence_number")\
                 .eq("event_id", body.event_id)\
                 .eq("list_type", current_list_type)\
-                .gt("sequence_number", current_seq)\
-                .execute()
+                .gt("sequence_number", current_seq))
                 
             for row in to_update_res.data:
                 new_seq = row['sequence_number'] - 1
-                supabase.table("event_signups").update({"sequence_number": new_seq}).eq("id", row['id']).execute()
+                await run_db(supabase.table("event_signups").update({"sequence_number": new_seq}).eq("id", row['id']))
                 
             # 4. Auto-Promote if needed (Steady State)
             if current_list_type == "EVENT":
-                event = fetch_event(body.event_id)
-                current_roster_count = fetch_counts(body.event_id)
+                event = await run_db_call(fetch_event, body.event_id)
+                current_roster_count = await run_db_call(fetch_counts, body.event_id)
                 
                 if current_roster_count < event['max_signups']:
                     print(f"Space opened in Roster ({current_roster_count} < {event['max_signups']}). Checking Waitlist...")
                     
-                    next_up_res = supabase.table("event_signups")\
+                    next_up_res = await run_db(supabase.table("event_signups")\
                         .select("*")\
                         .eq("event_id", body.event_id)\
                         .eq("list_type", "WAITLIST")\
                         .order("sequence_number", desc=False)\
-                        .limit(1)\
-                        .execute()
+                        .limit(1))
                         
                     if next_up_res.data:
                         next_person = next_up_res.data[0]
@@ -1290,36 +1538,50 @@ async def remove_signup(body: SignupRequest, request: Request):
                         
                         new_roster_seq = current_roster_count + 1
                         
-                        supabase.table("event_signups").update({
-                            "list_type": "EVENT",
-                            "sequence_number": new_roster_seq
-                        }).eq("id", next_person["id"]).execute()
-                        
+                        # Once the schedule is final, everyone on the lists hears about the change
+                        late_stage = None
                         if event.get("status") == "FINAL_ORDERING":
                             try:
-                                dropout_profile = supabase.table("profiles").select("full_name").eq("id", fresh_data["user_id"]).single().execute()
+                                dropout_profile = await run_db(supabase.table("profiles").select("full_name").eq("id", fresh_data["user_id"]).single())
                                 dropout_name = dropout_profile.data.get("full_name") if dropout_profile.data else "A player"
                                 
-                                promoted_profile = supabase.table("profiles").select("full_name").eq("id", next_person["user_id"]).single().execute()
+                                promoted_profile = await run_db(supabase.table("profiles").select("full_name").eq("id", next_person["user_id"]).single())
                                 promoted_name = promoted_profile.data.get("full_name") if promoted_profile.data else "A waitlist player"
                                 
-                                res_emails = supabase.table("event_signups").select("profiles!inner(email)").eq("event_id", body.event_id).in_("list_type", ["EVENT", "WAITLIST"]).execute()
+                                res_emails = await run_db(supabase.table("event_signups").select("profiles!inner(email)").eq("event_id", body.event_id).in_("list_type", ["EVENT", "WAITLIST"]))
                                 all_emails = [row["profiles"]["email"] for row in res_emails.data if row.get("profiles") and row["profiles"].get("email")]
-                                
-                                email_service.send_late_stage_change_notification(event, dropout_name, promoted_name, all_emails)
+                                late_stage = (event, dropout_name, promoted_name, all_emails)
                             except Exception as email_err:
-                                print(f"Error sending late-stage promotion email: {email_err}")
-
-                        wl_update_res = supabase.table("event_signups")\
+                                print(f"Error preparing late-stage promotion email: {email_err}")
+                        
+                        if email_outbox is not None:
+                            # The email is queued in the same transaction as the promotion
+                            collector = email_outbox.collector()
+                            if late_stage:
+                                collector.send_late_stage_change_notification(*late_stage)
+                            if not await run_db_call(email_outbox.move_signup, next_person["id"], "WAITLIST", "EVENT", new_roster_seq, collector.messages):
+                                print(f"Signup {next_person['id']} already left the waitlist. Skipping promotion.")
+                                continue
+                        else:
+                            await run_db(supabase.table("event_signups").update({
+                                "list_type": "EVENT",
+                                "sequence_number": new_roster_seq
+                            }).eq("id", next_person["id"]))
+                            if late_stage:
+                                try:
+                                    await run_db_call(email_service.send_late_stage_change_notification, *late_stage)
+                                except Exception as email_err:
+                                    print(f"Error sending late-stage promotion email: {email_err}")
+
+                        wl_update_res = await run_db(supabase.table("event_signups")\
                             .select("id, sequence_number")\
                             .eq("event_id", body.event_id)\
                             .eq("list_type", "WAITLIST")\
-                            .gt("sequence_number", 1)\
-                            .execute()
+                            .gt("sequence_number", 1))
                             
                         for row in wl_update_res.data:
                             new_seq = row['sequence_number'] - 1
-                            supabase.table("event_signups").update({"sequence_number": new_seq}).eq("id", row['id']).execute()
+                            await run_db(supabase.table("event_signups").update({"sequence_number": new_seq}).eq("id", row['id']))
 
         return {"status": "success", "message": "Signup removed"}
     except Exception as e:
@@ -1334,7 +1596,7 @@ async def get_events(request: Request, filter: str = "future"):
     await get_current_user(request)
     
     now = get_now()
-    query = supabase.table("events").select("*, event_types(*)")
+    query = supabase.table("events").select("*")
     
     if filter == "future":
         query = query.gte("event_date", now.isoformat())
@@ -1342,9 +1604,9 @@ async def get_events(request: Request, filter: str = "future"):
         query = query.lt("event_date", now.isoformat())
         
     # User requested chronological order
-    events_res = query.order("event_date").execute()
+    events_res = await run_db(query.order("event_date"))
         
-    enriched_events = [enrich_event(e) for e in events_res.data]
+    enriched_events = enrich_events(await run_db_call(event_type_cache.attach, events_res.data), now)
     
     # 2. Fetch counts
     event_ids = [e['id'] for e in enriched_events]
@@ -1353,10 +1615,9 @@ async def get_events(request: Request, filter: str = "future"):
          return enriched_events
          
     # Fetch all signups for these events
-    signups_res = supabase.table("event_signups")\
+    signups_res = await run_db(supabase.table("event_signups")\
         .select("event_id, list_type")\
-        .in_("event_id", event_ids)\
-        .execute()
+        .in_("event_id", event_ids))
         
     # Aggregate
     counts_map = {eid: {"roster": 0, "waitlist": 0, "holding": 0} for eid in event_ids}
@@ -1407,259 +1668,25 @@ async def trigger_schedule(request: Request):
     now = get_now()
     
     # --- STATUS UPDATE ROUTINE ---
-    # Fetch all events that are NOT Finished or Cancelled
-    
-    active_events_res = supabase.table("events")\
-        .select("*, event_types(*)")\
-        .neq("status", "FINISHED")\
-        .neq("status", "CANCELLED")\
-        .execute()
-        
-    enriched_active = [enrich_event(e) for e in active_events_res.data]
-    
-    from logic import determine_event_status
-    
-    processed_count = 0
-    promoted_count = 0
-    
-    for event in enriched_active:
-        current_status = event["status"]
-        
-        # Calculate what status SHOULD be based on time
-        # enrich_event no longer auto-sets this for us (except for legacy SCHEDULED)
-        # So we must calculate it here explicitly to drive the state machine.
-        target_status = determine_event_status(event, now)
-        
-        # Check for Manual Override
-        # If status_determinant is MANUAL, we do NOT auto-update the status based on time.
-        # We only respect the current status (which is what we started with).
-        if event.get("status_determinant") == "MANUAL":
-            # However, we MIGHT still need to process Holding Queue if it was manually set to FINAL_ORDERING?
-            # actually logic says: if target == FINAL and current != FINAL -> process.
-            # But if manual, target IS current (effectively).
-            # So if it IS ALREADY FINAL_ORDERING, we might need to process holding? 
-            # The Cron job is "state change" driven mostly.
-            # But if admin manually sets to FINAL_ORDERING, the cron might pick it up?
-            # If admin sets it, they hopefully trigger the RPC or we rely on this script to see "Oh it is FINAL_ORDERING"
-            # But wait, if it IS FINAL_ORDERING, does it need processing?
-            # The transition logic handles "entering" the state.
-            # If manual, we don't "transition" automatically.
-            # So we force target to be current, so no transition happens.
-            target_status = current_status
-        
-        if target_status == current_status:
-            continue
-            
-        print(f"Event {event['id']}: Transitioning {current_status} -> {target_status}")
-        
-        # TRANSACTIONAL SAFETY LOGIC:
-        # If we are transitioning to FINAL_ORDERING, we must process the Holding Queue FIRST.
-        # This ensures that if the process fails mid-way, the status remains in the old state (e.g. PRELIMINARY_ORDERING).
-        # The next Cron run will see the old state + current time and try again.
-        
-        # Helper to fetch group email
-        def get_group_email(group_id):
-            if not group_id: return None
-            res = supabase.table("user_groups").select("group_email").eq("id", group_id).single().execute()
-            return res.data.get("group_email") if res.data else None
-
-        # Helper to fetch user emails by signup list type
-        def get_signup_emails(event_id, list_types):
-            res = supabase.table("event_signups").select("profiles!inner(email)").eq("event_id", event_id).in_("list_type", list_types).execute()
-            if not res.data: return []
-            return [row["profiles"]["email"] for row in res.data if row.get("profiles") and row["profiles"].get("email")]
-
-        if target_status == "PRELIMINARY_ORDERING" and current_status != "PRELIMINARY_ORDERING":
-            # 1. Enter Preliminary Ordering: Randomize Holding Queue & Assign Sequence
-            print(f"Entering Preliminary Ordering for Event {event['id']}: Randomizing Holding Queue...")
-            
-            holding_res = supabase.table("event_signups")\
-                .select("*")\
-                .eq("event_id", event["id"])\
-                .eq("list_type", "WAITLIST_HOLDING")\
-                .execute()
-                
-            holding_users = holding_res.data
-            
-            if holding_users:
-                # A. Randomize (Tier 2/3 logic)
-                queue = randomize_holding_queue(holding_users)
-                
-                # B. Assign Sequence Numbers (But keep in WAITLIST_HOLDING)
-                updates = resequence_holding(queue)
-                
-                 # C. Execute Moves (Atomic Batch via RPC)
-                update_list = []
-                for update in updates:
-                    update_list.append({
-                        "id": str(update["id"]),
-                        "event_id": str(event["id"]),
-                        "user_id": str(update["user_id"]),
-                        "list_type": update["list_type"],
-                        "sequence_number": update["sequence_number"]
-                    })
-                
-                print(f"Executing RPC for Preliminary Randomization ({len(update_list)} updates)...")
-                
-                try:
-                    # Direct Update: Upsert list changes then update status
-                    if update_list:
-                        print(f"Executing Batch Upsert for {len(update_list)} records...")
-                        supabase.table("event_signups").upsert(update_list).execute()
-                    
-                    print(f"Updating Event Status to {target_status}...")
-                    supabase.table("events").update({"status": target_status}).eq("id", event["id"]).execute()
-                    
-                    try:
-                        # Email Trigger Phase 4: Initial Schedule Notification
-                        roster_group_email = get_group_email(event.get("roster_user_group"))
-                        # Anyone in EVENT, WAITLIST, or WAITLIST_HOLDING gets the email
-                        reserve_emails = get_signup_emails(event["id"], ["EVENT", "WAITLIST", "WAITLIST_HOLDING"])
-                        email_service.send_initial_schedule_notification(event, roster_group_email, reserve_emails)
-                    except Exception as e:
-                        print(f"Email error (Initial Schedule): {e}")
-
-                    processed_count += 1
-                    
-                except Exception as db_e:
-                    print(f"CRITICAL: DB Update Failed for Event {event['id']}: {db_e}")
-                    continue
-            else:
-                 # No one in holding? Just update status.
-                 try:
-                    supabase.table("events").update({"status": target_status}).eq("id", event["id"]).execute()
-                    
-                    try:
-                        roster_group_email = get_group_email(event.get("roster_user_group"))
-                        reserve_emails = get_signup_emails(event["id"], ["EVENT", "WAITLIST", "WAITLIST_HOLDING"])
-                        email_service.send_initial_schedule_notification(event, roster_group_email, reserve_emails)
-                    except Exception as e:
-                        print(f"Email error (Initial Schedule): {e}")
-                        
-                    processed_count += 1
-                 except Exception as e:
-                    print(f"Error updating status to PRELIMINARY for {event['id']}: {e}")
-
-        elif target_status == "FINAL_ORDERING" and current_status != "FINAL_ORDERING":
-            # 2. Enter Final Ordering: Lock in placements
-            # FETCH ORDERED BY SEQUENCE (Respecting the Preliminary Randomization)
-            print(f"Entering Final Ordering for Event {event['id']}: Promoting from Holding...")
-            
-            holding_res = supabase.table("event_signups")\
-                .select("*")\
-                .eq("event_id", event["id"])\
-                .eq("list_type", "WAITLIST_HOLDING")\
-                .order("sequence_number", desc=False)\
-                .execute()
-                
-            holding_users = holding_res.data
-            
-            if holding_users:
-                # Do NOT randomize again. Used established order.
-                queue = holding_users
-                
-                # B. Get current counts
-                roster_res = supabase.table("event_signups").select("id", count="exact").eq("event_id", event["id"]).eq("list_type", "EVENT").execute()
-                current_roster_count = roster_res.count or 0
-                
-                waitlist_res = supabase.table("event_signups").select("id", count="exact").eq("event_id", event["id"]).eq("list_type", "WAITLIST").execute()
-                current_waitlist_count = waitlist_res.count or 0
-                
-                # C. Calculate Moves
-                updates = promote_from_holding(queue, current_roster_count, event["max_signups"], current_waitlist_count)
-                
-                # D. Execute Moves (Atomic Batch via RPC)
-                update_list = []
-                for update in updates:
-                    update_list.append({
-                        "id": str(update["id"]),
-                        "event_id": str(event["id"]),
-                        "user_id": str(update["user_id"]),
-                        "list_type": update["list_type"],
-                        "sequence_number": update["sequence_number"]
-                    })
-                
-                print(f"Executing RPC for Final Promotion ({len(update_list)} updates)...")
-                
-                try:
-                    # Direct Update: Upsert list changes then update status
-                    if update_list:
-                        print(f"Executing Batch Upsert for {len(update_list)} records...")
-                        supabase.table("event_signups").upsert(update_list).execute()
-                        
-                    print(f"Updating Event Status to {target_status}...")
-                    supabase.table("events").update({"status": target_status}).eq("id", event["id"]).execute()
-                    
-                    try:
-                        # Email Trigger Phase 4: Final Schedule Notification
-                        roster_group_email = get_group_email(event.get("roster_user_group"))
-                        lineup_emails = get_signup_emails(event["id"], ["EVENT", "WAITLIST"])
-                        email_service.send_final_schedule_notification(event, roster_group_email, lineup_emails)
-                    except Exception as e:
-                        print(f"Email error (Final Schedule): {e}")
-
-                    processed_count += 1
-                    promoted_count += len(update_list)
-                    
-                except Exception as db_e:
-                     print(f"CRITICAL: DB Update Failed for Event {event['id']}: {db_e}")
-                     continue
-            else:
-                 # No one in holding? Just update status.
-                 try:
-                    supabase.table("events").update({"status": target_status}).eq("id", event["id"]).execute()
-                    
-                    try:
-                        roster_group_email = get_group_email(event.get("roster_user_group"))
-                        lineup_emails = get_signup_emails(event["id"], ["EVENT", "WAITLIST"])
-                        email_service.send_final_schedule_notification(event, roster_group_email, lineup_emails)
-                    except Exception as e:
-                        print(f"Email error (Final Schedule): {e}")
-
-                    processed_count += 1
-                 except Exception as e:
-                    print(f"Error updating status to FINAL for {event['id']}: {e}")
-
-        else:
-            # 3. Simple Transition (e.g. NOT_YET_OPEN -> OPEN_FOR_ROSTER)
-            # Use RPC ensuring it is transactional even if just one update
-            print(f"Executing Direct Update (Status Only update)...")
-            try:
-                supabase.table("events").update({"status": target_status}).eq("id", event["id"]).execute()
-                
-                try:
-                    # Email Trigger Phase 4: Signup Opens
-                    if target_status == "OPEN_FOR_ROSTER" and current_status != "OPEN_FOR_ROSTER":
-                        roster_group_email = get_group_email(event.get("roster_user_group"))
-                        email_service.send_roster_open_notification(event, roster_group_email)
-                    elif target_status == "OPEN_FOR_RESERVES" and current_status != "OPEN_FOR_RESERVES":
-                        # Both T1 and T2 reserves get the email (send twice or combine)
-                        t1_email = get_group_email(event.get("reserve_first_priority_user_group"))
-                        t2_email = get_group_email(event.get("reserve_second_priority_user_group"))
-                        if t1_email: email_service.send_reserve_open_notification(event, t1_email)
-                        if t2_email and t2_email != t1_email: email_service.send_reserve_open_notification(event, t2_email)
-                except Exception as e:
-                    print(f"Email error (Window Open): {e}")
-
-                processed_count += 1
-            except Exception as e:
-                print(f"Error updating status for {event['id']}: {e}")
+    # Shared with the in-process TransitionTimer (see scheduler.py)
+    transition_result = await run_db_call(process_status_transitions, supabase, now, event_types=event_type_cache, outbox=email_outbox)
+    processed_count = transition_result["processed_events"]
+    promoted_count = transition_result["users_promoted"]
 
     # --- FUTURE EVENT GENERATION ROUTINE ---
-    # To prevent spamming DB inserts every 5 minutes, we only run generation 
-    # roughly once a day. If it runs every 5 minutes, checking during the 00-05 minute mark
-    # of a specific hour will make it run exactly once per day.
-    # We choose 8:00 AM UTC (Midnight PT during PST, 1 AM during PDT).
-    # We choose 8:00 AM UTC (Midnight PT during PST, 1 AM during PDT).
+    # Generation is one read of the horizon plus at most one bulk insert
+    # (conflict-ignoring on the unique (event_type_id, event_date) constraint),
+    # so it runs on every tick. `force_generation` is kept for manual triggers.
     generated_count = 0
-    if force_generation or (now.hour == 8 and now.minute < 5):
-        reason = "Manual force" if force_generation else "Daily trigger"
-        print(f"{reason} reached. Generating future events...")
-        try:
-            generated_count = generate_future_events(supabase, days_ahead_to_ensure=14)
+    if force_generation:
+        print("Manual force reached. Generating future events...")
+    try:
+        blackout_dates = await run_db_call(cancelled_dates_cache.dates)
+        generated_count = await run_db_call(generate_future_events, supabase, days_ahead_to_ensure=14, now=now, blackout_dates=blackout_dates)
+        if generated_count:
             print(f"Generated {generated_count} new events.")
-        except Exception as e:
-            print(f"Error during scheduled event generation: {e}")
+    except Exception as e:
+        print(f"Error during scheduled event generation: {e}")
 
     return {
         "status": "completed", 
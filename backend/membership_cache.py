@@ -0,0 +1,167 @@
+import threading
+import time
+
+ADMIN_GROUP_NAMES = {"Super Admin", "SuperAdmin", "Admin"}
+
+# Rows per request when bulk loading (PostgREST caps responses at 1000 by default)
+PAGE_SIZE = 1000
+
+
+class MembershipCache:
+    """
+    In-memory index of user groups and group memberships.
+
+    Each profile maps to a frozenset of group ids, and auth user ids map to
+    profile ids, so signup eligibility and admin checks need no database access.
+    Everything is bulk loaded on first use. The membership endpoints update the
+    index in place; other instances notice changes through the `memberships`
+    row of `cache_versions` (bumped by triggers on profile_groups, user_groups
+    and profiles), which is polled at most every `version_check_seconds`.
+    """
+
+    def __init__(self, supabase_client, version_check_seconds=10):
+        self.supabase = supabase_client
+        self.version_check_seconds = version_check_seconds
+        self.version = None
+        self._groups = None
+        self._profile_groups = {}
+        self._auth_profiles = {}
+        self._checked_at = 0.0
+        self._lock = threading.RLock()
+
+    # --- Loading ---
+
+    def _fetch_all(self, table, columns, order_by):
+        # A unique ordering keeps the pages stable
+        rows, start = [], 0
+        while True:
+            query = self.supabase.table(table).select(columns)
+            for col in order_by:
+                query = query.order(col)
+            res = query.range(start, start + PAGE_SIZE - 1).execute()
+            page = res.data or []
+            rows.extend(page)
+            if len(page) < PAGE_SIZE:
+                return rows
+            start += PAGE_SIZE
+
+    def _fetch_version(self):
+        try:
+            res = self.supabase.table("cache_versions").select("version").eq("name", "memberships").execute()
+            return res.data[0]["version"] if res.data else None
+        except Exception as e:
+            print(f"Membership cache version check failed: {e}")
+            return None
+
+    def load(self):
+        """Bulk loads groups, memberships and auth links (a handful of paged queries)."""
+        with self._lock:
+            version = self._fetch_version()
+            groups = {str(g["id"]): g for g in self._fetch_all("user_groups", "*", ["id"])}
+
+            members = {}
+            for row in self._fetch_all("profile_groups", "profile_id, group_id", ["profile_id", "group_id"]):
+                members.setdefault(str(row["profile_id"]), set()).add(str(row["group_id"]))
+
+            auth_profiles = {}
+            for row in self._fetch_all("profiles", "id, auth_user_id", ["id"]):
+                if row.get("auth_user_id"):
+                    auth_profiles[str(row["auth_user_id"])] = str(row["id"])
+
+            self._groups = groups
+            self._profile_groups = {pid: frozenset(gids) for pid, gids in members.items()}
+            self._auth_profiles = auth_profiles
+            self.version = version
+            self._checked_at = time.monotonic()
+            print(f"Membership cache loaded: {len(groups)} groups, {len(self._profile_groups)} members.")
+
+    def _ensure_loaded(self):
+        with self._lock:
+            if self._groups is None:
+                self.load()
+            elif time.monotonic() - self._checked_at >= self.version_check_seconds:
+                self._checked_at = time.monotonic()
+                version = self._fetch_version()
+                if version != self.version:
+                    self.load()
+
+    def invalidate(self):
+        with self._lock:
+            self._groups = None
+
+    # --- Reads ---
+
+    def group_ids(self, profile_id):
+        self._ensure_loaded()
+        return self._profile_groups.get(str(profile_id), frozenset())
+
+    def profile_id_for_auth_user(self, auth_user_id):
+        self._ensure_loaded()
+        return self._auth_profiles.get(str(auth_user_id))
+
+    def group(self, group_id):
+        self._ensure_loaded()
+        return self._groups.get(str(group_id))
+
+    def groups(self):
+        self._ensure_loaded()
+        return list(self._groups.values())
+
+    def _member_groups(self, profile_id):
+        gids = self.group_ids(profile_id)
+        groups = self._groups or {}
+        return [groups[gid] for gid in gids if gid in groups]
+
+    def group_names(self, profile_id):
+        return {g["name"] for g in self._member_groups(profile_id)}
+
+    def max_guest_limit(self, profile_id):
+        return max([g.get("guest_limit") or 0 for g in self._member_groups(profile_id)], default=0)
+
+    def is_admin(self, auth_user_id):
+        profile_id = self.profile_id_for_auth_user(auth_user_id)
+        return bool(profile_id) and bool(self.group_names(profile_id) & ADMIN_GROUP_NAMES)
+
+    def member_counts(self):
+        """group_id -> number of members."""
+        self._ensure_loaded()
+        counts = {}
+        for gids in self._profile_groups.values():
+            for gid in gids:
+                counts[gid] = counts.get(gid, 0) + 1
+        return counts
+
+    # --- Local updates (mirroring writes made by this instance) ---
+
+    def add_members(self, group_id, profile_ids):
+        with self._lock:
+            if self._groups is None:
+                return
+            for pid in profile_ids:
+                pid = str(pid)
+                self._profile_groups[pid] = self._profile_groups.get(pid, frozenset()) | {str(group_id)}
+
+    def remove_member(self, group_id, profile_id):
+        with self._lock:
+            if self._groups is None:
+                return
+            pid = str(profile_id)
+            self._profile_groups[pid] = self._profile_groups.get(pid, frozenset()) - {str(group_id)}
+
+    def set_groups(self, profile_id, group_ids):
+        with self._lock:
+            if self._groups is None:
+                return
+            self._profile_groups[str(profile_id)] = frozenset(str(g) for g in group_ids)
+
+    def link_auth_user(self, auth_user_id, profile_id):
+        with self._lock:
+            if self._groups is None:
+                return
+            self._auth_profiles[str(auth_user_id)] = str(profile_id)
+
+    def update_group(self, group):
+        with self._lock:
+            if self._groups is None:
+                return
+            self._groups[str(group["id"])] = group
@@ -1,79 +1,197 @@
-from typing import List, Dict, Any
-from db import supabase
+"""
+Local fake of the Admin SDK Directory API (groups and members), for running
+and benchmarking Google Group syncs offline. Set GOOGLE_DIRECTORY=fake and
+`google_service.get_google_service()` returns the process-wide fake instead of
+the real client.
 
-def get_mock_google_members(google_group_id: str) -> List[str]:
-    """
-    Returns a mock list of emails currently in a Google Group.
-    Used for simulation purposes.
-    """
-    # Simulate some existing members in Google Groups
-    # We'll use some emails that might or might not exist in Supabase
-    return [
-        "already_exists@gmail.com",
-        "to_be_removed@gmail.com",
-    ]
-
-async def sync_to_google(group_id: str) -> Dict[str, Any]:
+Only what google_service.py calls is implemented: members().list/insert/delete
+and new_batch_http_request. Errors are real `HttpError`s with the status codes
+the API uses (404 unknown group or member, 409 duplicate member), and each
+HTTP round trip (a single call or a whole batch) can be given a latency.
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Dict, List
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+# Members per page of members().list (the API's default and maximum is 200)
+LIST_PAGE_SIZE = 200
+
+
+def http_error(status: int, reason: str, message: str = "") -> HttpError:
+    content = {"error": {"code": status, "message": message or reason, "errors": [{"reason": reason, "message": message or reason}]}}
+    return HttpError(httplib2.Response({"status": status}), json.dumps(content).encode())
+
+
+class FakeRequest:
+    def __init__(self, directory, method, call):
+        self.directory = directory
+        self.method = method
+        self._call = call
+
+    def execute(self, http=None, num_retries=0):
+        self.directory._round_trip(1)
+        return self.directory._run(self)
+
+
+class FakeBatchRequest:
+    def __init__(self, directory, callback=None):
+        self.directory = directory
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, callback=None, request_id=None):
+        self.requests.append((str(request_id if request_id is not None else len(self.requests)), request, callback))
+
+    def execute(self, http=None):
+        self.directory._round_trip(len(self.requests))
+        for request_id, request, callback in self.requests:
+            try:
+                response, exception = self.directory._run(request), None
+            except HttpError as e:
+                response, exception = None, e
+            for cb in (callback, self.callback):
+                if cb is not None:
+                    cb(request_id, response, exception)
+
+
+class FakeMembers:
+    def __init__(self, directory):
+        self.directory = directory
+
+    def list(self, groupKey, pageToken=None, maxResults=LIST_PAGE_SIZE):
+        return FakeRequest(self.directory, "list", lambda: self.directory._list(groupKey, pageToken, maxResults))
+
+    def insert(self, groupKey, body):
+        return FakeRequest(self.directory, ("add", body["email"]), lambda: self.directory._insert(groupKey, body))
+
+    def delete(self, groupKey, memberKey):
+        return FakeRequest(self.directory, ("remove", memberKey), lambda: self.directory._delete(groupKey, memberKey))
+
+
+class FakeDirectoryService:
     """
-    Simulates syncing a Supabase group to a Google Group.
-    1. Fetch ground truth from Supabase.
-    2. Fetch mock current state from Google.
-    3. Calculate delta.
-    4. Log the "actions".
+    In-memory Directory service. `groups` maps group emails to member emails;
+    `latency_seconds` is slept per HTTP round trip. With `auto_create_groups`,
+    unknown groups start out empty instead of returning 404. Safe to share
+    between threads.
+
+    Counters (`round_trips`, `calls`, `batch_sizes`, `list_calls` and
+    `max_in_flight` concurrent round trips) let tests and benchmarks check how
+    the API was used.
     """
-    try:
-        # 1. Fetch group details
-        group_res = supabase.table("user_groups").select("*").eq("id", group_id).execute()
-        if not group_res.data:
-            return {"status": "error", "message": "Group not found"}
-        
-        group = group_res.data[0]
-        group_name = group.get("name")
-        google_group_id = group.get("google_group_id") or f"mock-{group_name.lower().replace(' ', '-')}"
-
-        # 2. Fetch Supabase members (Ground Truth)
-        # We need their emails from the profiles table
-        members_res = supabase.table("profile_groups")\
-            .select("profiles(email)")\
-            .eq("group_id", group_id)\
-            .execute()
-        
-        supabase_emails = set()
-        if members_res.data:
-            for m in members_res.data:
-                if m.get("profiles") and m["profiles"].get("email"):
-                    supabase_emails.add(m["profiles"]["email"])
-
-        # 3. Fetch Mock Google Members
-        google_emails = set(get_mock_google_members(google_group_id))
-
-        # 4. Calculate Delta
-        to_add = list(supabase_emails - google_emails)
-        to_remove = list(google_emails - supabase_emails)
-
-        # 5. Log the simulation report
-        print("\n" + "="*50)
-        print(f"MOCK SYNC REPORT FOR GROUP: {group_name}")
-        print(f"Google Group ID: {google_group_id}")
-        print(f"Ground Truth (Supabase): {len(supabase_emails)} users")
-        print(f"Current State (Mock Google): {len(google_emails)} users")
-        print("-" * 50)
-        print(f"ACTIONS TO BE TAKEN:")
-        for email in to_add:
-            print(f"  [+] ADD to Google: {email}")
-        for email in to_remove:
-            print(f"  [-] REMOVE from Google: {email}")
-        if not to_add and not to_remove:
-            print("  [=] NO CHANGES NEEDED - ALREADY IN SYNC")
-        print("="*50 + "\n")
-
-        return {
-            "status": "success",
-            "group_name": group_name,
-            "added": to_add,
-            "removed": to_remove,
-            "summary": f"Mock Sync Complete: Added {len(to_add)}, Removed {len(to_remove)}"
-        }
-    except Exception as e:
-        print(f"Error in mock sync: {e}")
-        return {"status": "error", "message": str(e)}
+
+    def __init__(self, groups: Dict[str, List[str]] = None, latency_seconds: float = 0.0, auto_create_groups: bool = False):
+        self.groups = {key.lower(): {e.lower() for e in members} for key, members in (groups or {}).items()}
+        self.latency_seconds = latency_seconds
+        self.auto_create_groups = auto_create_groups
+        self.errors = {}
+        self.round_trips = 0
+        self.calls = 0
+        self.list_calls = 0
+        self.batch_sizes = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    # --- Client surface ---
+
+    def members(self):
+        return FakeMembers(self)
+
+    def new_batch_http_request(self, callback=None):
+        return FakeBatchRequest(self, callback)
+
+    # --- Test helpers ---
+
+    def create_group(self, group_email: str, members=()):
+        with self._lock:
+            self.groups[group_email.lower()] = {e.lower() for e in members}
+
+    def group_members(self, group_email: str) -> set:
+        with self._lock:
+            return set(self.groups.get(group_email.lower(), ()))
+
+    def fail(self, action: str, email: str, *errors: HttpError):
+        """Makes the next calls for (action, email) fail with `errors`, in order."""
+        with self._lock:
+            self.errors.setdefault((action, email.lower()), []).extend(errors)
+
+    # --- Internals ---
+
+    def _round_trip(self, size):
+        with self._lock:
+            self.round_trips += 1
+            self.batch_sizes.append(size)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.latency_seconds:
+                time.sleep(self.latency_seconds)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def _run(self, request):
+        with self._lock:
+            self.calls += 1
+            if request.method != "list":
+                action, email = request.method
+                queued = self.errors.get((action, email.lower()))
+                if queued:
+                    raise queued.pop(0)
+            return request._call()
+
+    def _group(self, group_key):
+        members = self.groups.get(group_key.lower())
+        if members is None and self.auto_create_groups:
+            members = self.groups[group_key.lower()] = set()
+        if members is None:
+            raise http_error(404, "notFound", f"Resource Not Found: {group_key}")
+        return members
+
+    def _list(self, group_key, page_token, max_results):
+        self.list_calls += 1
+        members = sorted(self._group(group_key))
+        start = int(page_token or 0)
+        page = members[start:start + max_results]
+        result = {"kind": "admin#directory#members", "members": [{"email": e, "role": "MEMBER", "type": "USER"} for e in page]}
+        if start + max_results < len(members):
+            result["nextPageToken"] = str(start + max_results)
+        return result
+
+    def _insert(self, group_key, body):
+        members = self._group(group_key)
+        email = body["email"].lower()
+        if email in members:
+            raise http_error(409, "duplicate", "Member already exists.")
+        members.add(email)
+        return {"kind": "admin#directory#member", "email": email, "role": body.get("role", "MEMBER")}
+
+    def _delete(self, group_key, member_key):
+        members = self._group(group_key)
+        if member_key.lower() not in members:
+            raise http_error(404, "notFound", "Resource Not Found: memberKey")
+        members.discard(member_key.lower())
+        return ""
+
+
+_fake_directory = None
+_fake_lock = threading.Lock()
+
+
+def get_fake_directory() -> FakeDirectoryService:
+    """The process-wide fake used when GOOGLE_DIRECTORY=fake. Groups are created on first use."""
+    global _fake_directory
+    with _fake_lock:
+        if _fake_directory is None:
+            _fake_directory = FakeDirectoryService(
+                latency_seconds=float(os.environ.get("GOOGLE_FAKE_LATENCY_SECONDS", "0")),
+                auto_create_groups=True,
+            )
+        return _fake_directory
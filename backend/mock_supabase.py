@@ -0,0 +1,553 @@
+"""
+In-memory stand-in for the Supabase client, used by simulation.py and tests.
+
+Supports the subset of the PostgREST query builder this app uses:
+select (with `*`, column lists, `count="exact"` and embedded resources such as
+`event_types(*)`, `profiles!inner(email)` or `profile_groups(count)`), insert,
+update, upsert, delete, the eq/neq/in_/gt/gte/lt/lte/is_/ilike filters,
+order, limit, range, single and maybe_single; and `rpc` for the Postgres
+functions in RPC_FUNCTIONS.
+"""
+
+import copy
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List
+
+
+# (table, embedded table) -> (column on the parent row, column on the embedded row, "one" | "many")
+RELATIONSHIPS = {
+    ("events", "event_types"): ("event_type_id", "id", "one"),
+    ("event_signups", "events"): ("event_id", "id", "one"),
+    ("event_signups", "profiles"): ("user_id", "id", "one"),
+    ("profile_groups", "profiles"): ("profile_id", "id", "one"),
+    ("profile_groups", "user_groups"): ("group_id", "id", "one"),
+    ("profiles", "profile_groups"): ("id", "profile_id", "many"),
+    ("user_groups", "profile_groups"): ("id", "group_id", "many"),
+    ("event_types", "events"): ("id", "event_type_id", "many"),
+    ("events", "event_signups"): ("id", "event_id", "many"),
+}
+
+# Columns with a hash index, so simulations with thousands of rows stay fast
+INDEXED_COLUMNS = {
+    "events": ["event_type_id"],
+    "event_signups": ["event_id", "user_id"],
+    "profile_groups": ["profile_id", "group_id"],
+    "profiles": ["auth_user_id", "email"],
+}
+
+# Natural keys used by upsert when no explicit on_conflict is given
+PRIMARY_KEYS = {
+    "profile_groups": ["profile_id", "group_id"],
+    "cancelled_dates": ["date"],
+    "cache_versions": ["name"],
+}
+
+# Enforced on inserted and upserted rows (an upsert's proposed row is checked
+# before the conflict is resolved, as in Postgres)
+NOT_NULL = {
+    "event_signups": ["event_id", "user_id", "list_type"],
+}
+
+DEFAULTS = {
+    "events": {"status": "NOT_YET_OPEN", "status_determinant": "AUTOMATIC"},
+    "event_signups": {"is_guest": False, "guest_name": None, "tier": None},
+    "user_groups": {"guest_limit": 0, "group_type": "OTHER", "group_email": None, "description": None},
+    "email_outbox": {"status": "PENDING", "attempts": 0, "dedup_key": None, "digest": False, "event_id": None, "last_error": None, "sent_at": None},
+}
+
+
+class MockAPIError(Exception):
+    pass
+
+
+class MockResponse:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+def _split_top_level(text):
+    parts, depth, current = [], 0, ""
+    for ch in text:
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        if ch == "," and depth == 0:
+            parts.append(current.strip())
+            current = ""
+        else:
+            current += ch
+    if current.strip():
+        parts.append(current.strip())
+    return parts
+
+
+def _coerce(value):
+    if isinstance(value, str) and len(value) >= 10 and value[4:5] == "-" and value[7:8] == "-":
+        try:
+            return datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return value
+    return value
+
+
+def _compare(a, b):
+    a, b = _coerce(a), _coerce(b)
+    if isinstance(a, datetime) and isinstance(b, datetime):
+        if (a.tzinfo is None) != (b.tzinfo is None):
+            a, b = a.replace(tzinfo=None), b.replace(tzinfo=None)
+        return (a > b) - (a < b)
+    if isinstance(a, datetime) or isinstance(b, datetime):
+        a, b = str(a), str(b)
+    return (a > b) - (a < b)
+
+
+def _equal(a, b):
+    if a is None or b is None:
+        return a is b
+    return str(a) == str(b) or _compare(a, b) == 0
+
+
+class MockTable:
+    def __init__(self, name):
+        self.name = name
+        self.rows: Dict[str, Dict[str, Any]] = {}
+        self.indexes: Dict[str, Dict[str, set]] = {col: {} for col in INDEXED_COLUMNS.get(name, [])}
+
+    def _key(self, row):
+        pk = PRIMARY_KEYS.get(self.name)
+        if pk and "id" not in row:
+            return "|".join(str(row.get(c)) for c in pk)
+        return str(row["id"])
+
+    def _index_add(self, key, row):
+        for col, index in self.indexes.items():
+            index.setdefault(str(row.get(col)), set()).add(key)
+
+    def _index_remove(self, key, row):
+        for col, index in self.indexes.items():
+            index.get(str(row.get(col)), set()).discard(key)
+
+    def put(self, row):
+        if "id" not in row and not PRIMARY_KEYS.get(self.name):
+            row["id"] = str(uuid.uuid4())
+        key = self._key(row)
+        if key in self.rows:
+            self._index_remove(key, self.rows[key])
+        self.rows[key] = row
+        self._index_add(key, row)
+        return row
+
+    def remove(self, key):
+        row = self.rows.pop(key)
+        self._index_remove(key, row)
+        return row
+
+    def candidates(self, filters):
+        """Narrows the scan using the primary key or a hash index when an eq/in filter allows it."""
+        for op, col, value in filters:
+            if col == "id" and not PRIMARY_KEYS.get(self.name):
+                if op == "eq":
+                    return [k for k in [str(value)] if k in self.rows]
+                if op == "in":
+                    return [str(v) for v in value if str(v) in self.rows]
+            if col in self.indexes:
+                if op == "eq":
+                    return list(self.indexes[col].get(str(value), ()))
+                if op == "in":
+                    keys = set()
+                    for v in value:
+                        keys |= self.indexes[col].get(str(v), set())
+                    return list(keys)
+        return list(self.rows.keys())
+
+
+class MockQuery:
+    def __init__(self, db, table):
+        self.db = db
+        self.table_name = table
+        self.action = None
+        self.columns = "*"
+        self.count = None
+        self.payload = None
+        self.on_conflict = None
+        self.ignore_duplicates = False
+        self.filters = []
+        self.orders = []
+        self.limit_count = None
+        self.offset = 0
+        self.single_mode = None
+
+    # --- Actions ---
+
+    def select(self, columns="*", count=None):
+        self.action = "select"
+        self.columns = columns
+        self.count = count
+        return self
+
+    def insert(self, payload):
+        self.action = "insert"
+        self.payload = payload
+        return self
+
+    def upsert(self, payload, on_conflict=None, ignore_duplicates=False, **kwargs):
+        self.action = "upsert"
+        self.payload = payload
+        self.on_conflict = on_conflict
+        self.ignore_duplicates = ignore_duplicates
+        return self
+
+    def update(self, payload):
+        self.action = "update"
+        self.payload = payload
+        return self
+
+    def delete(self):
+        self.action = "delete"
+        return self
+
+    # --- Filters ---
+
+    def eq(self, col, value):
+        self.filters.append(("eq", col, value))
+        return self
+
+    def neq(self, col, value):
+        self.filters.append(("neq", col, value))
+        return self
+
+    def in_(self, col, values):
+        self.filters.append(("in", col, list(values)))
+        return self
+
+    def gt(self, col, value):
+        self.filters.append(("gt", col, value))
+        return self
+
+    def gte(self, col, value):
+        self.filters.append(("gte", col, value))
+        return self
+
+    def lt(self, col, value):
+        self.filters.append(("lt", col, value))
+        return self
+
+    def lte(self, col, value):
+        self.filters.append(("lte", col, value))
+        return self
+
+    def is_(self, col, value):
+        self.filters.append(("is", col, None if value in (None, "null") else value))
+        return self
+
+    def ilike(self, col, value):
+        self.filters.append(("ilike", col, value))
+        return self
+
+    def order(self, col, desc=False):
+        self.orders.append((col, desc))
+        return self
+
+    def limit(self, n):
+        self.limit_count = n
+        return self
+
+    def range(self, start, end):
+        # Inclusive on both ends, like PostgREST
+        self.offset = start
+        self.limit_count = end - start + 1
+        return self
+
+    def single(self):
+        self.single_mode = "single"
+        return self
+
+    def maybe_single(self):
+        self.single_mode = "maybe_single"
+        return self
+
+    # --- Execution ---
+
+    def _matches(self, row):
+        for op, col, value in self.filters:
+            current = row.get(col)
+            if op == "eq" and not _equal(current, value): return False
+            if op == "neq" and _equal(current, value): return False
+            if op == "in" and not any(_equal(current, v) for v in value): return False
+            if op == "is" and current is not value and current != value: return False
+            if op == "ilike":
+                pattern = str(value).lower()
+                text = str(current or "").lower()
+                if "%" in pattern:
+                    parts = [p for p in pattern.split("%")]
+                    if not (text.startswith(parts[0]) and text.endswith(parts[-1]) and all(p in text for p in parts)):
+                        return False
+                elif text != pattern:
+                    return False
+            if op in ("gt", "gte", "lt", "lte"):
+                if current is None: return False
+                cmp = _compare(current, value)
+                if op == "gt" and not cmp > 0: return False
+                if op == "gte" and not cmp >= 0: return False
+                if op == "lt" and not cmp < 0: return False
+                if op == "lte" and not cmp <= 0: return False
+        return True
+
+    def _matching_keys(self):
+        table = self.db._table(self.table_name)
+        return [k for k in table.candidates(self.filters) if self._matches(table.rows[k])]
+
+    def _project(self, table_name, row, columns):
+        items = _split_top_level(columns)
+        result = {}
+        for item in items:
+            if item == "*":
+                result.update(copy.deepcopy(row))
+                continue
+            if "(" not in item:
+                result[item] = copy.deepcopy(row.get(item))
+                continue
+
+            head, inner = item.split("(", 1)
+            inner = inner[:-1]
+            alias = None
+            if ":" in head:
+                alias, head = head.split(":", 1)
+            inner_join = "!inner" in head
+            hint = None
+            if "!" in head:
+                head, hint = head.split("!", 1)
+                if hint == "inner":
+                    hint = None
+            target = head.strip()
+
+            if hint and hint.endswith("_fkey"):
+                # e.g. user_groups!event_types_roster_user_group_fkey -> event_types.roster_user_group
+                local_col = hint[len(table_name) + 1:-len("_fkey")]
+                relation = (local_col, "id", "one")
+            else:
+                relation = RELATIONSHIPS.get((table_name, target))
+            if not relation:
+                raise MockAPIError(f"No relationship between {table_name} and {target}")
+
+            local_col, remote_col, cardinality = relation
+            target_table = self.db._table(target)
+            local_value = row.get(local_col)
+            if remote_col == "id":
+                linked = [target_table.rows[str(local_value)]] if str(local_value) in target_table.rows else []
+            else:
+                probe = MockQuery(self.db, target).eq(remote_col, local_value)
+                linked = [target_table.rows[k] for k in probe._matching_keys()]
+
+            if inner.strip() == "count":
+                value = [{"count": len(linked)}]
+            elif cardinality == "one":
+                value = self._project(target, linked[0], inner) if linked else None
+            else:
+                value = [self._project(target, r, inner) for r in linked]
+
+            if inner_join and not value:
+                return None
+            result[alias or target] = value
+        return result
+
+    def _sorted(self, rows):
+        for col, desc in reversed(self.orders):
+            present = [r for r in rows if r.get(col) is not None]
+            missing = [r for r in rows if r.get(col) is None]
+            present.sort(key=lambda r: _coerce(r.get(col)), reverse=desc)
+            rows = present + missing
+        return rows
+
+    def _finish(self, data, count=None):
+        if self.single_mode:
+            if not data:
+                if self.single_mode == "single":
+                    raise MockAPIError("JSON object requested, multiple (or no) rows returned")
+                return MockResponse(None, count)
+            if len(data) > 1:
+                raise MockAPIError("JSON object requested, multiple (or no) rows returned")
+            return MockResponse(data[0], count)
+        return MockResponse(data, count)
+
+    def _check_not_null(self, row):
+        for col in NOT_NULL.get(self.table_name, []):
+            if row.get(col) is None:
+                raise MockAPIError(f"null value in column \"{col}\" of relation \"{self.table_name}\" violates not-null constraint")
+
+    def execute(self):
+        table = self.db._table(self.table_name)
+        self.db.query_count += 1
+
+        if self.action == "select":
+            rows = self._sorted([table.rows[k] for k in self._matching_keys()])
+            data = []
+            for row in rows:
+                projected = self._project(self.table_name, row, self.columns)
+                if projected is not None:
+                    data.append(projected)
+            total = len(data)
+            if self.offset:
+                data = data[self.offset:]
+            if self.limit_count is not None:
+                data = data[:self.limit_count]
+            return self._finish(data, total if self.count else None)
+
+        if self.action == "insert":
+            payload = self.payload if isinstance(self.payload, list) else [self.payload]
+            inserted = []
+            for item in payload:
+                row = dict(DEFAULTS.get(self.table_name, {}))
+                row.update(copy.deepcopy(item))
+                self._check_not_null(row)
+                if "id" in row and str(row["id"]) in table.rows:
+                    raise MockAPIError(f"duplicate key value violates unique constraint \"{self.table_name}_pkey\"")
+                pk = PRIMARY_KEYS.get(self.table_name)
+                if pk and "id" not in row and table._key(row) in table.rows:
+                    raise MockAPIError(f"duplicate key value violates unique constraint \"{self.table_name}_pkey\"")
+                inserted.append(copy.deepcopy(table.put(row)))
+            return self._finish(inserted)
+
+        if self.action == "upsert":
+            payload = self.payload if isinstance(self.payload, list) else [self.payload]
+            conflict_cols = [c.strip() for c in self.on_conflict.split(",")] if self.on_conflict else None
+            written = []
+            for item in payload:
+                self._check_not_null(dict(DEFAULTS.get(self.table_name, {}), **item))
+                existing_key = None
+                if conflict_cols:
+                    probe = MockQuery(self.db, self.table_name)
+                    for col in conflict_cols:
+                        probe.eq(col, item.get(col))
+                    keys = probe._matching_keys()
+                    existing_key = keys[0] if keys else None
+                elif "id" in item and str(item["id"]) in table.rows:
+                    existing_key = str(item["id"])
+                elif PRIMARY_KEYS.get(self.table_name) and table._key(item) in table.rows:
+                    existing_key = table._key(item)
+
+                if existing_key is not None:
+                    if self.ignore_duplicates:
+                        continue
+                    row = dict(table.rows[existing_key])
+                    row.update(copy.deepcopy(item))
+                    table.remove(existing_key)
+                else:
+                    row = dict(DEFAULTS.get(self.table_name, {}))
+                    row.update(copy.deepcopy(item))
+                written.append(copy.deepcopy(table.put(row)))
+            return self._finish(written)
+
+        if self.action == "update":
+            updated = []
+            for key in self._matching_keys():
+                row = table.remove(key)
+                row.update(copy.deepcopy(self.payload))
+                updated.append(copy.deepcopy(table.put(row)))
+            return self._finish(updated)
+
+        if self.action == "delete":
+            deleted = [table.remove(k) for k in self._matching_keys()]
+            return self._finish(deleted)
+
+        raise MockAPIError(f"Unsupported query on {self.table_name}")
+
+
+def _insert_outbox_messages(db, messages):
+    keyed = [m for m in messages if m.get("dedup_key")]
+    if keyed:
+        db.table("email_outbox").upsert(keyed, on_conflict="dedup_key", ignore_duplicates=True).execute()
+    unkeyed = [m for m in messages if not m.get("dedup_key")]
+    if unkeyed:
+        db.table("email_outbox").insert(unkeyed).execute()
+
+
+def _transition_event_with_outbox(db, params):
+    # database/migrations/20261019_email_outbox.sql
+    res = db.table("events").update({"status": params["p_to"]})\
+        .eq("id", params["p_event_id"]).eq("status", params["p_from"]).execute()
+    if not res.data:
+        return []
+    _insert_outbox_messages(db, [dict(m, event_id=params["p_event_id"]) for m in (params.get("p_messages") or [])])
+    return res.data
+
+
+def _set_events_status_with_outbox(db, params):
+    # database/migrations/20261019_email_outbox_state_changes.sql
+    ids = params["p_event_ids"]
+    current = db.table("events").select("id").in_("id", ids)\
+        .in_("status", params["p_from"]).eq("status_determinant", "AUTOMATIC").execute()
+    if len(current.data) != len(ids):
+        return []
+    res = db.table("events").update({"status": params["p_to"]}).in_("id", ids).execute()
+    _insert_outbox_messages(db, list(params.get("p_messages") or []))
+    return res.data
+
+
+def _move_signup_with_outbox(db, params):
+    # database/migrations/20261019_email_outbox_state_changes.sql
+    res = db.table("event_signups").update({"list_type": params["p_to"], "sequence_number": params["p_sequence_number"]})\
+        .eq("id", params["p_signup_id"]).eq("list_type", params["p_from"]).execute()
+    if not res.data:
+        return []
+    _insert_outbox_messages(db, [dict(m, event_id=res.data[0]["event_id"]) for m in (params.get("p_messages") or [])])
+    return res.data
+
+
+# Python stand-ins for the Postgres functions called through `rpc`
+RPC_FUNCTIONS = {
+    "transition_event_with_outbox": _transition_event_with_outbox,
+    "set_events_status_with_outbox": _set_events_status_with_outbox,
+    "move_signup_with_outbox": _move_signup_with_outbox,
+}
+
+
+class MockRPC:
+    def __init__(self, db, name, params):
+        self.db = db
+        self.name = name
+        self.params = params or {}
+
+    def execute(self):
+        if self.name not in RPC_FUNCTIONS:
+            raise MockAPIError(f"Could not find the function public.{self.name}")
+        return MockResponse(copy.deepcopy(RPC_FUNCTIONS[self.name](self.db, self.params)))
+
+
+class MockSupabase:
+    """
+    Drop-in replacement for `db.supabase` backed by Python dicts.
+
+    >>> db = MockSupabase()
+    >>> db.seed("user_groups", [{"id": "g1", "name": "Roster"}])
+    >>> db.table("user_groups").select("name").eq("id", "g1").single().execute().data
+    {'name': 'Roster'}
+    """
+
+    def __init__(self):
+        self.tables: Dict[str, MockTable] = {}
+        self.query_count = 0
+
+    def _table(self, name) -> MockTable:
+        if name not in self.tables:
+            self.tables[name] = MockTable(name)
+        return self.tables[name]
+
+    def table(self, name):
+        return MockQuery(self, name)
+
+    def rpc(self, name, params=None):
+        return MockRPC(self, name, params)
+
+    def seed(self, name, rows: List[Dict[str, Any]]):
+        table = self._table(name)
+        for row in rows:
+            full = dict(DEFAULTS.get(name, {}))
+            full.update(row)
+            table.put(full)
+
+    def rows(self, name) -> List[Dict[str, Any]]:
+        return list(self._table(name).rows.values())
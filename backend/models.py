@@ -115,6 +115,7 @@ class EventTypeCreate(BaseModel):
     reserve_first_priority_user_group: Optional[str] = None  # UUID
     reserve_second_priority_user_group: Optional[str] = None  # UUID
     duration_minutes: int = 120
+    generation_horizon_days: Optional[int] = None  # None = default 14-day window
 
 class EventTypeUpdate(BaseModel):
     name: Optional[str] = None
@@ -130,6 +131,7 @@ class EventTypeUpdate(BaseModel):
     reserve_first_priority_user_group: Optional[str] = None
     reserve_second_priority_user_group: Optional[str] = None
     duration_minutes: Optional[int] = None
+    generation_horizon_days: Optional[int] = None
 
 class CancelledDate(BaseModel):
     date: str # YYYY-MM-DD
@@ -0,0 +1,281 @@
+from logic import enrich_event, phases_between, randomize_holding_queue, new_lottery_seed, promote_from_holding, resequence_holding, summarize_list_changes
+from email_service import email_service
+from status_engine import target_statuses
+from group_directory import GroupDirectory
+
+# A phase's notification is only sent while the event's new status is one of these.
+# When several phases are crossed at once, superseded messages are dropped
+# (e.g. no "Initial Schedule" email once the final schedule is already locked).
+NOTIFY_WHILE = {
+    "OPEN_FOR_ROSTER": {"OPEN_FOR_ROSTER", "OPEN_FOR_RESERVES", "PRELIMINARY_ORDERING", "FINAL_ORDERING"},
+    "OPEN_FOR_RESERVES": {"OPEN_FOR_RESERVES", "PRELIMINARY_ORDERING"},
+    "PRELIMINARY_ORDERING": {"PRELIMINARY_ORDERING"},
+    "FINAL_ORDERING": {"FINAL_ORDERING"},
+}
+
+
+def upsert_signup_diffs(supabase_client, event_id, queue, updates):
+    """
+    Writes the minimal diffs from promote_from_holding / resequence_holding.
+
+    Only the changed rows are sent, in one bulk upsert. Each row carries its
+    full NOT NULL set (event_id, user_id, list_type) plus sequence_number, taken
+    from the queue where the diff doesn't change them: Postgres checks NOT NULL
+    on the proposed row before resolving ON CONFLICT, so a sequence-only diff
+    without list_type would fail. Returns the number of changed rows.
+    """
+    if not updates:
+        return 0
+
+    users_by_id = {str(u["id"]): u for u in queue}
+    rows = []
+    for update in updates:
+        user = users_by_id[str(update["id"])]
+        rows.append({
+            "id": str(update["id"]),
+            "event_id": str(event_id),
+            "user_id": str(user["user_id"]),
+            "list_type": update.get("list_type", user.get("list_type")),
+            "sequence_number": update.get("sequence_number", user.get("sequence_number")),
+        })
+
+    print(f"Executing Batch Upsert for {len(rows)} records...")
+    supabase_client.table("event_signups").upsert(rows).execute()
+    return len(updates)
+
+
+def process_status_transitions(supabase_client, now, event_ids=None, notifier=None, event_types=None, groups=None, outbox=None):
+    """
+    Runs the status state machine for all active events (or only `event_ids`).
+    Shared by the `/api/schedule` cron endpoint and the in-process TransitionTimer.
+
+    Every status write is a compare-and-set on the status we read, so several
+    instances (or the cron and the timer) can run this concurrently: only the
+    instance whose update lands sends the notifications for that transition.
+
+    `notifier` defaults to the shared email_service. With an EventTypeCache as
+    `event_types`, only `events` columns are selected and the type is joined in memory.
+    Group emails come from `groups` (a GroupDirectory); by default one is loaded
+    for the groups of the events that are due, in a single query.
+
+    With an EmailOutbox as `outbox`, notifications are rendered before the status
+    write and queued in the same transaction as it (transition_event_with_outbox)
+    instead of being sent through `notifier`.
+
+    Returns:
+        dict: {
+            "processed_events": int,
+            "users_promoted": int,
+            "transitions": [{"event_id", "from", "to", "skipped", "randomized", "promoted"}, ...]
+        }
+    """
+    if notifier is None:
+        notifier = email_service
+
+    # Fetch all events that are NOT Finished or Cancelled
+    query = supabase_client.table("events")\
+        .select("*" if event_types is not None else "*, event_types(*)")\
+        .neq("status", "FINISHED")\
+        .neq("status", "CANCELLED")
+    if event_ids is not None:
+        if not event_ids:
+            return {"processed_events": 0, "users_promoted": 0, "transitions": []}
+        query = query.in_("id", list(event_ids))
+
+    active_events_res = query.execute()
+    rows = active_events_res.data or []
+    if event_types is not None:
+        event_types.attach(rows)
+    # Time-based status for the whole batch in one pass (vectorized for large batches)
+    time_statuses = target_statuses(rows, now)
+
+    processed_count = 0
+    promoted_count = 0
+    transitions = []
+
+    def record_transition(event, current_status, target_status, randomized=0, promoted=0, crossed=None):
+        transitions.append({
+            "event_id": event["id"],
+            "from": current_status,
+            "to": target_status,
+            "skipped": (crossed or [])[:-1],
+            "randomized": randomized,
+            "promoted": promoted
+        })
+
+    # Helper to fetch user emails by signup list type. Members of `covered_by`
+    # are skipped when that group's alias is mailed anyway.
+    def get_signup_emails(event_id, list_types, covered_by=None):
+        res = supabase_client.table("event_signups").select("user_id, profiles!inner(email)").eq("event_id", event_id).in_("list_type", list_types).execute()
+        if not res.data: return []
+        recipients = [(row["user_id"], row["profiles"]["email"]) for row in res.data if row.get("profiles") and row["profiles"].get("email")]
+        if covered_by and groups is not None:
+            return groups.not_covered_by(covered_by, recipients)
+        return [email for _, email in recipients]
+
+    # Helper to send, in phase order, every crossed phase's message that still applies
+    def notify(event, crossed, target_status, notifier):
+        for phase in crossed:
+            if target_status not in NOTIFY_WHILE.get(phase, ()):
+                continue
+            try:
+                if phase == "OPEN_FOR_ROSTER":
+                    # Email Trigger Phase 4: Signup Opens
+                    roster_group_email = get_group_email(event.get("roster_user_group"))
+                    notifier.send_roster_open_notification(event, roster_group_email)
+                elif phase == "OPEN_FOR_RESERVES":
+                    # Both T1 and T2 reserves get the email (send twice or combine)
+                    t1_email = get_group_email(event.get("reserve_first_priority_user_group"))
+                    t2_email = get_group_email(event.get("reserve_second_priority_user_group"))
+                    if t1_email: notifier.send_reserve_open_notification(event, t1_email)
+                    if t2_email and t2_email != t1_email: notifier.send_reserve_open_notification(event, t2_email)
+                elif phase == "PRELIMINARY_ORDERING":
+                    # Email Trigger Phase 4: Initial Schedule Notification
+                    roster_group_email = get_group_email(event.get("roster_user_group"))
+                    # Anyone in EVENT, WAITLIST, or WAITLIST_HOLDING gets the email
+                    reserve_emails = get_signup_emails(event["id"], ["EVENT", "WAITLIST", "WAITLIST_HOLDING"], covered_by=event.get("roster_user_group"))
+                    notifier.send_initial_schedule_notification(event, roster_group_email, reserve_emails)
+                elif phase == "FINAL_ORDERING":
+                    # Email Trigger Phase 4: Final Schedule Notification
+                    roster_group_email = get_group_email(event.get("roster_user_group"))
+                    lineup_emails = get_signup_emails(event["id"], ["EVENT", "WAITLIST"], covered_by=event.get("roster_user_group"))
+                    notifier.send_final_schedule_notification(event, roster_group_email, lineup_emails)
+            except Exception as e:
+                print(f"Email error ({phase}): {e}")
+
+    # Helper to move the event to its new status only if nobody else did first
+    def claim_transition(event, current_status, target_status):
+        print(f"Updating Event Status to {target_status}...")
+        res = supabase_client.table("events")\
+            .update({"status": target_status})\
+            .eq("id", event["id"])\
+            .eq("status", current_status)\
+            .execute()
+        if not res.data:
+            print(f"Event {event['id']}: {current_status} -> {target_status} already applied by another run. Skipping notifications.")
+            return False
+        return True
+
+    # Helper to record the event's lottery seed exactly once. Reruns after a crash,
+    # and instances racing on the same transition, all converge on the first
+    # stored seed, so the holding order they write is identical.
+    def claim_lottery_seed(event):
+        if event.get("lottery_seed") is not None:
+            return event["lottery_seed"]
+        res = supabase_client.table("events")\
+            .update({"lottery_seed": new_lottery_seed(), "lottery_drawn_at": now.isoformat()})\
+            .eq("id", event["id"])\
+            .is_("lottery_seed", "null")\
+            .execute()
+        if res.data:
+            return res.data[0]["lottery_seed"]
+        res = supabase_client.table("events").select("lottery_seed").eq("id", event["id"]).single().execute()
+        return res.data["lottery_seed"]
+
+    # Calculate what status SHOULD be based on time
+    # enrich_event no longer auto-sets this for us (except for legacy SCHEDULED)
+    # So we must calculate it here explicitly to drive the state machine.
+    # Only events that actually need a transition are enriched.
+    due = [(row, target_status) for row, target_status in zip(rows, time_statuses) if target_status != row["status"]]
+
+    # Resolve every group the due events may email in one query
+    if groups is None and due:
+        groups = GroupDirectory.for_events(supabase_client, [row for row, _ in due])
+    get_group_email = groups.email if groups is not None else (lambda group_id: None)
+
+    for row, target_status in due:
+        event = enrich_event(row, now)
+        current_status = event["status"]
+
+        # Check for Manual Override
+        # If status_determinant is MANUAL, we do NOT auto-update the status based on time.
+        # The transition logic handles "entering" a state, so forcing target to be
+        # current means no transition happens.
+        if event.get("status_determinant") == "MANUAL":
+            target_status = current_status
+
+        if target_status == current_status:
+            continue
+
+        # CATCH-UP: If the cron missed a window we may jump several phases at once
+        # (e.g. OPEN_FOR_RESERVES -> FINAL_ORDERING). Every skipped phase's side
+        # effects are replayed in this single pass: randomize, then promote, then notify.
+        crossed = phases_between(current_status, target_status)
+        if len(crossed) > 1:
+            print(f"Event {event['id']}: Catching up {current_status} -> {target_status} (crossing {', '.join(crossed)})")
+        else:
+            print(f"Event {event['id']}: Transitioning {current_status} -> {target_status}")
+
+        # TRANSACTIONAL SAFETY LOGIC:
+        # Holding Queue changes are written FIRST and the status LAST.
+        # This ensures that if the process fails mid-way, the status remains in the old state (e.g. PRELIMINARY_ORDERING).
+        # The next run will see the old state + current time and try again.
+        # Once the event is over (FINISHED) there is nothing left to order.
+        randomize = "PRELIMINARY_ORDERING" in crossed and target_status != "FINISHED"
+        promote = "FINAL_ORDERING" in crossed and target_status != "FINISHED"
+
+        try:
+            updates = []
+            randomized_count = 0
+            promoted_users = 0
+
+            if randomize or promote:
+                # FETCH ORDERED BY SEQUENCE (Respecting any Preliminary Randomization)
+                holding_res = supabase_client.table("event_signups")\
+                    .select("*")\
+                    .eq("event_id", event["id"])\
+                    .eq("list_type", "WAITLIST_HOLDING")\
+                    .order("sequence_number", desc=False)\
+                    .execute()
+
+                queue = holding_res.data or []
+
+                if queue and randomize:
+                    # 1. Enter Preliminary Ordering: Randomize Holding Queue (Tier 2/3 logic)
+                    print(f"Entering Preliminary Ordering for Event {event['id']}: Randomizing Holding Queue...")
+                    queue = randomize_holding_queue(queue, seed=claim_lottery_seed(event))
+                    randomized_count = len(queue)
+
+                if queue and promote:
+                    # 2. Enter Final Ordering: Lock in placements
+                    # Do NOT randomize again unless the preliminary phase was skipped. Use established order.
+                    print(f"Entering Final Ordering for Event {event['id']}: Promoting from Holding...")
+                    roster_res = supabase_client.table("event_signups").select("id", count="exact").eq("event_id", event["id"]).eq("list_type", "EVENT").execute()
+                    current_roster_count = roster_res.count or 0
+
+                    waitlist_res = supabase_client.table("event_signups").select("id", count="exact").eq("event_id", event["id"]).eq("list_type", "WAITLIST").execute()
+                    current_waitlist_count = waitlist_res.count or 0
+
+                    updates = promote_from_holding(queue, current_roster_count, event["max_signups"], current_waitlist_count)
+                    moved = summarize_list_changes(updates)
+                    promoted_users = moved["EVENT"] + moved["WAITLIST"]
+                elif queue:
+                    # Assign Sequence Numbers (But keep in WAITLIST_HOLDING)
+                    updates = resequence_holding(queue)
+
+                # Direct Update: Upsert only the changed rows, then update status
+                upsert_signup_diffs(supabase_client, event["id"], queue, updates)
+
+            if outbox is not None:
+                # Render now; the messages are written together with the status
+                collector = outbox.collector(scope=f"{event['id']}:{target_status}")
+                notify(event, crossed, target_status, collector)
+                if not outbox.claim_transition(event["id"], current_status, target_status, collector.messages):
+                    print(f"Event {event['id']}: {current_status} -> {target_status} already applied by another run. Skipping notifications.")
+                    continue
+            elif not claim_transition(event, current_status, target_status):
+                continue
+
+        except Exception as db_e:
+            print(f"CRITICAL: DB Update Failed for Event {event['id']}: {db_e}")
+            continue
+
+        # 3. Notify, in phase order, for every crossed phase whose message still applies
+        if outbox is None:
+            notify(event, crossed, target_status, notifier)
+
+        processed_count += 1
+        promoted_count += promoted_users
+        record_transition(event, current_status, target_status, randomized=randomized_count, promoted=promoted_users, crossed=crossed)
+
+    return {"processed_events": processed_count, "users_promoted": promoted_count, "transitions": transitions}
@@ -0,0 +1,214 @@
+"""
+Accelerated-clock simulation of the scheduler state machine.
+
+Replays the `/api/schedule` routine (status transitions and, optionally, the daily
+event generation) against an in-memory MockSupabase over a virtual time range.
+Instead of ticking every 5 minutes, the clock jumps straight to the next
+transition timestamp, so a week of transitions for thousands of events runs in
+seconds. Every transition, randomization, promotion and email is reported.
+
+Usage:
+    python simulation.py --events 2000 --days 7
+"""
+
+import argparse
+import os
+import random
+import time
+from contextlib import nullcontext, redirect_stdout
+from datetime import datetime, timedelta, timezone
+
+import clock
+from clock import SimulatedClock
+from email_service import EmailService
+from logic import generate_future_events
+from mock_supabase import MockSupabase
+from scheduler import process_status_transitions
+from transition_timer import TransitionTimer
+
+# Mirrors the EventTypeCreate defaults
+DEFAULT_EVENT_TYPE = {
+    "time_zone": "America/Los_Angeles",
+    "max_signups": 15,
+    "roster_sign_up_open_minutes": 4320,
+    "reserve_sign_up_open_minutes": 720,
+    "initial_reserve_scheduling_minutes": 420,
+    "final_reserve_scheduling_minutes": 180,
+    "duration": "02:00:00",
+}
+
+
+class RecordingEmailService(EmailService):
+    """EmailService that records every message instead of delivering it."""
+
+    def __init__(self, sim_clock):
+        self.clock = sim_clock
+        self.sent = []
+
+    def _send(self, to_email: str, subject: str, html_content: str, digest: bool = False):
+        self.sent.append({"at": self.clock.now().isoformat(), "to": to_email, "subject": subject})
+        return {"id": f"sim-email-{len(self.sent)}"}
+
+    def _send_batch(self, to_emails: list, subject: str, html_content: str, digest: bool = False):
+        return [{"to": to, "id": self._send(to, subject, html_content)["id"]} for to in dict.fromkeys(e for e in to_emails if e)]
+
+
+def build_synthetic_dataset(start, num_events=1000, num_event_types=10, roster_size=12, reserve_size=10, seed=0):
+    """
+    Seeds a MockSupabase with event types, groups, profiles, events spread over the
+    week after `start`, and signups: roster members on the EVENT list and tier 2/3
+    reserves in WAITLIST_HOLDING in arrival order.
+    """
+    rng = random.Random(seed)
+    db = MockSupabase()
+
+    groups, profiles, memberships, event_types = [], [], [], []
+    for t in range(num_event_types):
+        type_groups = {}
+        for role in ("roster", "reserve1", "reserve2"):
+            gid = f"g-{t}-{role}"
+            groups.append({"id": gid, "name": f"Type{t}-{role}", "group_email": f"type{t}-{role}@example.com", "group_type": "EVENT_ELIGIBILITY"})
+            type_groups[role] = gid
+        event_types.append(dict(
+            DEFAULT_EVENT_TYPE,
+            id=f"t-{t}",
+            name=f"Synthetic Type {t}",
+            day_of_week=t % 7,
+            time_of_day="18:00:00",
+            roster_user_group=type_groups["roster"],
+            reserve_first_priority_user_group=type_groups["reserve1"],
+            reserve_second_priority_user_group=type_groups["reserve2"],
+        ))
+        for i in range(roster_size + reserve_size):
+            pid = f"p-{t}-{i}"
+            profiles.append({"id": pid, "email": f"player{t}-{i}@example.com", "name": f"Player {t}-{i}"})
+            if i < roster_size:
+                role = "roster"
+            else:
+                role = "reserve1" if i % 2 == 0 else "reserve2"
+            memberships.append({"profile_id": pid, "group_id": type_groups[role]})
+
+    db.seed("user_groups", groups)
+    db.seed("profiles", profiles)
+    db.seed("profile_groups", memberships)
+    db.seed("event_types", event_types)
+
+    events, signups = [], []
+    for n in range(num_events):
+        t = n % num_event_types
+        # Spread event starts over the week after the roster window, so every phase is crossed
+        event_date = start + timedelta(days=3, minutes=rng.randrange(0, 7 * 24 * 60, 5))
+        eid = f"e-{n}"
+        events.append({"id": eid, "event_type_id": f"t-{t}", "event_date": event_date.isoformat(), "status": "NOT_YET_OPEN"})
+
+        players = list(range(roster_size + reserve_size))
+        rng.shuffle(players)
+        roster_seq, holding_seq = 0, 0
+        for i in players[:rng.randint(roster_size // 2, roster_size + reserve_size)]:
+            if i < roster_size:
+                roster_seq += 1
+                signups.append({"id": f"s-{n}-{i}", "event_id": eid, "user_id": f"p-{t}-{i}", "list_type": "EVENT", "sequence_number": roster_seq, "tier": 1})
+            else:
+                holding_seq += 1
+                tier = 2 if i % 2 == 0 else 3
+                signups.append({"id": f"s-{n}-{i}", "event_id": eid, "user_id": f"p-{t}-{i}", "list_type": "WAITLIST_HOLDING", "sequence_number": holding_seq, "tier": tier})
+
+    db.seed("events", events)
+    db.seed("event_signups", signups)
+    return db
+
+
+def run_simulation(db, start, end, generate=False, days_ahead_to_ensure=14, retry_delay_seconds=300, quiet=True):
+    """
+    Drives `db` from `start` to `end` on a SimulatedClock.
+
+    The clock jumps to each transition timestamp (exactly like the TransitionTimer)
+    and, when `generate` is set, to 08:00 UTC each day for the cron's event
+    generation. Events whose transition does not land are retried after
+    `retry_delay_seconds`, like the cron safety net.
+
+    Returns:
+        dict: {"transitions": [...], "emails": [...], "summary": {...}}
+    """
+    sim_clock = SimulatedClock(start)
+    previous_clock = clock.set_clock(sim_clock)
+    recorder = RecordingEmailService(sim_clock)
+    timer = TransitionTimer(db, None, now_fn=sim_clock.now, retry_delay_seconds=retry_delay_seconds)
+    retry_delay = timedelta(seconds=retry_delay_seconds)
+
+    transitions = []
+    generated = 0
+    started = time.perf_counter()
+    queries_before = db.query_count
+
+    next_generation = None
+    if generate:
+        next_generation = start.replace(hour=8, minute=0, second=0, microsecond=0)
+        if next_generation < start:
+            next_generation += timedelta(days=1)
+
+    devnull = open(os.devnull, "w") if quiet else None
+    try:
+        with redirect_stdout(devnull) if quiet else nullcontext():
+            timer.load(start)
+            while True:
+                candidates = [t for t in (timer.next_fire_at(), next_generation) if t is not None]
+                if not candidates or min(candidates) > end:
+                    break
+                now = max(min(candidates), sim_clock.now())
+                sim_clock.set(now)
+
+                if next_generation is not None and now >= next_generation:
+                    generated += generate_future_events(db, days_ahead_to_ensure=days_ahead_to_ensure, now=now)
+                    timer.load(now, retry_delay)
+                    next_generation += timedelta(days=1)
+
+                due = timer.pop_due(now)
+                if not due:
+                    continue
+
+                result = process_status_transitions(db, now, event_ids=sorted(due), notifier=recorder)
+                for t in result["transitions"]:
+                    transitions.append(dict(t, at=now.isoformat()))
+                timer.refresh(now, due, retry_delay)
+    finally:
+        clock.set_clock(previous_clock)
+        if devnull:
+            devnull.close()
+
+    summary = {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "transitions": len(transitions),
+        "by_target_status": {},
+        "randomizations": sum(1 for t in transitions if t["randomized"]),
+        "users_randomized": sum(t["randomized"] for t in transitions),
+        "promotions": sum(1 for t in transitions if t["promoted"]),
+        "users_promoted": sum(t["promoted"] for t in transitions),
+        "emails": len(recorder.sent),
+        "events_generated": generated,
+        "queries": db.query_count - queries_before,
+        "elapsed_seconds": round(time.perf_counter() - started, 3),
+    }
+    for t in transitions:
+        summary["by_target_status"][t["to"]] = summary["by_target_status"].get(t["to"], 0) + 1
+
+    return {"transitions": transitions, "emails": recorder.sent, "summary": summary}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the scheduler against an in-memory database on an accelerated clock.")
+    parser.add_argument("--events", type=int, default=1000)
+    parser.add_argument("--event-types", type=int, default=10)
+    parser.add_argument("--days", type=int, default=14)
+    parser.add_argument("--generate", action="store_true", help="Also run the daily event generation")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    sim_start = datetime.now(timezone.utc).replace(second=0, microsecond=0)
+    dataset = build_synthetic_dataset(sim_start, num_events=args.events, num_event_types=args.event_types, seed=args.seed)
+    report = run_simulation(dataset, sim_start, sim_start + timedelta(days=args.days), generate=args.generate, quiet=not args.verbose)
+
+    for key, value in report["summary"].items():
+        print(f"{key}: {value}")
@@ -0,0 +1,237 @@
+"""
+Vectorized status engine for large batches of events.
+
+`determine_event_status` and the next-status logic in `enrich_event` work on one
+event at a time and parse ISO strings on every call. For thousands of events
+(scheduler runs, timer reloads, list endpoints) this module computes the
+time-based status, the next status and the next transition time for all events
+in one NumPy pass over `datetime64` columns. Results match the per-row functions
+in logic.py (timestamps are reported in UTC); `tests/test_status_engine.py` checks this.
+
+Usage:
+    python status_engine.py --events 100000   # benchmark against the per-row functions
+"""
+
+import argparse
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from logic import STATUS_ORDER, enrich_event, determine_event_status, parse_interval_to_minutes
+
+# Below this many events the per-row functions are just as fast
+BULK_THRESHOLD = 500
+
+NO_STATUS = -1
+STATUS_CODES = {status: i for i, status in enumerate(STATUS_ORDER)}
+SCHEDULED_CODE = len(STATUS_ORDER)
+NAT = np.datetime64("NaT", "us")
+
+# Offsets before event_date, in STATUS_ORDER order (each one opens the next status)
+WINDOW_COLUMNS = [
+    "roster_sign_up_open_minutes",
+    "reserve_sign_up_open_minutes",
+    "initial_reserve_scheduling_minutes",
+    "final_reserve_scheduling_minutes",
+]
+
+
+def to_datetime64(values):
+    """
+    Converts ISO strings / datetimes to a naive-UTC datetime64[us] array.
+    Supabase returns '+00:00' timestamps, which take a fast path with no per-row parsing.
+    """
+    if len(values) and all(isinstance(v, str) and v.endswith("+00:00") for v in values):
+        return np.array([v[:-6] for v in values], dtype="datetime64[us]")
+
+    converted = []
+    for v in values:
+        if isinstance(v, str):
+            v = datetime.fromisoformat(v.replace('Z', '+00:00'))
+        if v.tzinfo is not None:
+            v = v.astimezone(timezone.utc).replace(tzinfo=None)
+        converted.append(v)
+    return np.array(converted, dtype="datetime64[us]")
+
+
+def now64(now):
+    if now.tzinfo is not None:
+        now = now.astimezone(timezone.utc).replace(tzinfo=None)
+    return np.datetime64(now, "us")
+
+
+def event_columns(rows):
+    """
+    Builds the column arrays for `rows` (events joined with `event_types(*)`).
+    Event type settings are resolved once per type rather than once per event.
+
+    Returns:
+        dict: {"event_date", "windows" (4 x N, timestamps), "event_end", "status"}
+    """
+    type_offsets = {}
+    offsets = np.empty((len(rows), len(WINDOW_COLUMNS) + 1), dtype="int64")
+    status = np.empty(len(rows), dtype="int8")
+    for i, row in enumerate(rows):
+        event_type = row.get("event_types") or row.get("event_classes")
+        key = event_type.get("id") or id(event_type)
+        if key not in type_offsets:
+            type_offsets[key] = [event_type[col] for col in WINDOW_COLUMNS] + [parse_interval_to_minutes(event_type.get("duration"))]
+        offsets[i] = type_offsets[key]
+        s = row.get("status")
+        status[i] = SCHEDULED_CODE if s == "SCHEDULED" else STATUS_CODES.get(s, NO_STATUS)
+
+    event_date = to_datetime64([row["event_date"] for row in rows])
+    minutes = offsets.astype("timedelta64[m]")
+    return {
+        "event_date": event_date,
+        "windows": event_date[None, :] - minutes[:, :len(WINDOW_COLUMNS)].T,
+        "event_end": event_date + minutes[:, len(WINDOW_COLUMNS)],
+        "status": status,
+    }
+
+
+def compute_statuses(columns, now):
+    """
+    One vectorized pass over `columns` (see event_columns).
+
+    Returns:
+        dict of arrays:
+            "target_status": time-based status code (determine_event_status)
+            "next_status": next status code, or NO_STATUS (enrich_event)
+            "next_status_at": datetime64 of the next transition, or NaT
+    """
+    now = now64(now)
+    windows = columns["windows"]
+    event_end = columns["event_end"]
+
+    # Number of thresholds already passed == index into STATUS_ORDER
+    target = (windows <= now).sum(axis=0) + (event_end <= now)
+    target = target.astype("int8")
+
+    # Legacy SCHEDULED rows are resolved to their time-based status first
+    current = np.where(columns["status"] == SCHEDULED_CODE, target, columns["status"])
+
+    next_status = np.full(len(current), NO_STATUS, dtype="int8")
+    next_status_at = np.full(len(current), NAT)
+
+    in_windows = (current >= 0) & (current < len(WINDOW_COLUMNS))
+    idx = np.nonzero(in_windows)[0]
+    next_status[idx] = current[idx] + 1
+    next_status_at[idx] = windows[current[idx], idx]
+
+    finishing = (current == STATUS_CODES["FINAL_ORDERING"]) & (now < event_end)
+    next_status[finishing] = STATUS_CODES["FINISHED"]
+    next_status_at[finishing] = event_end[finishing]
+
+    return {"target_status": target, "current_status": current, "next_status": next_status, "next_status_at": next_status_at}
+
+
+def status_name(code):
+    return STATUS_ORDER[code] if code != NO_STATUS else None
+
+
+def to_utc_datetimes(values):
+    """datetime64 array -> list of tz-aware datetimes (None for NaT)."""
+    return [v.replace(tzinfo=timezone.utc) if v is not None else None for v in values.astype("datetime64[us]").astype(object)]
+
+
+def target_statuses(rows, now):
+    """Time-based status for every row (determine_event_status), as a list of names."""
+    if len(rows) < BULK_THRESHOLD:
+        return [determine_event_status(enrich_event(dict(row), now), now) for row in rows]
+    result = compute_statuses(event_columns(rows), now)
+    return [STATUS_ORDER[code] for code in result["target_status"].tolist()]
+
+
+def next_transitions(rows, now):
+    """
+    `next_status_at` for every row as tz-aware datetimes (None when nothing is
+    scheduled), matching enrich_event.
+    """
+    if len(rows) < BULK_THRESHOLD:
+        return [
+            datetime.fromisoformat(e["next_status_at"]) if e.get("next_status_at") else None
+            for e in (enrich_event(dict(row), now) for row in rows)
+        ]
+    return to_utc_datetimes(compute_statuses(event_columns(rows), now)["next_status_at"])
+
+
+def enrich_events(rows, now):
+    """
+    Bulk equivalent of `[enrich_event(row, now) for row in rows]`, except that
+    computed timestamps are always in UTC (enrich_event keeps event_date's offset).
+    Small batches (and rows without an event type) go through enrich_event.
+    """
+    if len(rows) < BULK_THRESHOLD or not all(row.get("event_types") or row.get("event_classes") for row in rows):
+        return [enrich_event(row, now) for row in rows]
+
+    columns = event_columns(rows)
+    result = compute_statuses(columns, now)
+    windows = [to_utc_datetimes(w) for w in columns["windows"]]
+    next_at = to_utc_datetimes(result["next_status_at"])
+    current = result["current_status"].tolist()
+    next_status = result["next_status"].tolist()
+
+    for i, row in enumerate(rows):
+        event_type = row.get("event_types") or row.get("event_classes")
+        row["name"] = event_type["name"]
+        row["max_signups"] = event_type["max_signups"]
+        row["roster_user_group"] = event_type.get("roster_user_group")
+        row["reserve_first_priority_user_group"] = event_type.get("reserve_first_priority_user_group")
+        row["reserve_second_priority_user_group"] = event_type.get("reserve_second_priority_user_group")
+        row["roster_sign_up_open"] = windows[0][i]
+        row["duration"] = event_type.get("duration")
+        row["reserve_sign_up_open"] = windows[1][i]
+        row["initial_reserve_scheduling"] = windows[2][i]
+        row["final_reserve_scheduling"] = windows[3][i]
+        row["waitlist_sign_up_open"] = windows[0][i]
+        if row.get("status") == "SCHEDULED":
+            row["status"] = STATUS_ORDER[current[i]]
+        row["next_status"] = status_name(next_status[i])
+        row["next_status_at"] = next_at[i].isoformat() if next_at[i] else None
+    return rows
+
+
+def benchmark(num_events=100_000, seed=0):
+    """Times the per-row functions against the vectorized pass on synthetic events."""
+    import random
+    rng = random.Random(seed)
+    now = datetime(2026, 3, 1, tzinfo=timezone.utc)
+    event_types = [{
+        "id": f"t-{t}", "name": f"Type {t}", "max_signups": 15, "duration": "02:00:00",
+        "roster_sign_up_open_minutes": 4320, "reserve_sign_up_open_minutes": 720,
+        "initial_reserve_scheduling_minutes": 420, "final_reserve_scheduling_minutes": 180,
+    } for t in range(20)]
+    rows = [{
+        "id": f"e-{n}",
+        "event_date": (now + timedelta(minutes=rng.randrange(-3 * 24 * 60, 10 * 24 * 60, 5))).isoformat(),
+        "status": rng.choice(STATUS_ORDER),
+        "event_types": event_types[n % len(event_types)],
+    } for n in range(num_events)]
+
+    started = time.perf_counter()
+    per_row = [determine_event_status(enrich_event(dict(row), now), now) for row in rows]
+    per_row_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    result = compute_statuses(event_columns(rows), now)
+    vectorized = [STATUS_ORDER[code] for code in result["target_status"].tolist()]
+    vectorized_seconds = time.perf_counter() - started
+
+    assert per_row == vectorized
+    return {
+        "events": num_events,
+        "per_row_seconds": round(per_row_seconds, 3),
+        "vectorized_seconds": round(vectorized_seconds, 3),
+        "speedup": round(per_row_seconds / vectorized_seconds, 1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the vectorized status engine against the per-row functions.")
+    parser.add_argument("--events", type=int, default=100_000)
+    args = parser.parse_args()
+
+    for key, value in benchmark(args.events).items():
+        print(f"{key}: {value}")
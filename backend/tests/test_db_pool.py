@@ -0,0 +1,84 @@
+import asyncio
+import time
+import pytest
+from unittest.mock import MagicMock, patch, AsyncMock
+import sys
+import os
+
+import httpx
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Via main: some test modules replace the `db` module in sys.modules
+from main import app, run_db, run_db_call
+
+QUERY_SECONDS = 0.2
+
+
+def slow_result(*args, **kwargs):
+    time.sleep(QUERY_SECONDS) # a blocking PostgREST round trip
+    res = MagicMock()
+    res.data = [{"id": "signup_1", "user_id": "user_1", "list_type": "EVENT", "sequence_number": 1}]
+    return res
+
+
+def test_run_db_executes_the_query_off_the_event_loop():
+    query = MagicMock()
+    query.execute.side_effect = slow_result
+
+    async def scenario():
+        ticks = 0
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+        task = asyncio.create_task(ticker())
+        res = await run_db(query)
+        task.cancel()
+        assert await run_db_call(len, [1, 2, 3]) == 3
+        return res, ticks
+
+    res, ticks = asyncio.run(scenario())
+    assert res.data[0]["id"] == "signup_1"
+    # The loop kept running while the query blocked its worker thread
+    assert ticks >= 5
+
+@patch("main.get_current_admin", new_callable=AsyncMock)
+@patch("main.supabase")
+def test_requests_are_served_concurrently(mock_supabase, mock_admin):
+    mock_supabase.table.return_value.select.return_value.eq.return_value.order.return_value.execute.side_effect = slow_result
+
+    async def scenario(in_flight):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            start = time.monotonic()
+            responses = await asyncio.gather(*(client.get("/api/admin/events/evt_1/users") for _ in range(in_flight)))
+            elapsed = time.monotonic() - start
+        assert all(r.status_code == 200 for r in responses)
+        return in_flight / elapsed
+
+    one = asyncio.run(scenario(1))
+    eight = asyncio.run(scenario(8))
+    # Serialized on the loop, 8 requests would take 8x as long (same throughput)
+    assert eight > 3 * one
+
+def slow_groups():
+    time.sleep(QUERY_SECONDS) # a membership cache reload
+    return [{"id": "g1", "name": "Roster"}]
+
+@patch("main.get_current_admin", new_callable=AsyncMock)
+@patch("main.membership_cache")
+def test_cache_reloads_do_not_block_the_event_loop(mock_cache, mock_admin):
+    mock_cache.member_counts.return_value = {"g1": 3}
+    mock_cache.groups.side_effect = slow_groups
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            start = time.monotonic()
+            responses = await asyncio.gather(*(client.get("/api/admin/user_groups") for _ in range(8)))
+            elapsed = time.monotonic() - start
+        assert all(r.status_code == 200 for r in responses)
+        return elapsed
+
+    # Eight reloads on the loop would take 8 x QUERY_SECONDS
+    assert asyncio.run(scenario()) < 4 * QUERY_SECONDS
@@ -0,0 +1,267 @@
+import asyncio
+import pytest
+import sys
+import os
+from datetime import datetime, timedelta, timezone
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from email_outbox import EmailOutbox
+from email_service import EmailService
+from scheduler import process_status_transitions
+from tests.test_scheduler import make_db, EVENT_DATE
+
+NOW = EVENT_DATE - timedelta(minutes=60)  # past final_reserve_scheduling
+
+
+class FlakyProvider:
+    """Stands in for EmailService's async batch delivery; `failing` recipients error out."""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.calls = []
+
+    async def _send_batch_async(self, to_emails, subject, html_content):
+        self.calls.append((subject, list(to_emails)))
+        return [
+            {"to": to, "id": None, "error": "503 Service Unavailable"} if to in self.failing else {"to": to, "id": f"re-{to}"}
+            for to in to_emails
+        ]
+
+
+class Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def make_outbox(db, provider, clock, **kwargs):
+    return EmailOutbox(db, provider, rate_per_second=0, now_fn=clock, **kwargs)
+
+
+def test_transition_emails_are_queued_with_the_status_change():
+    db = make_db("PRELIMINARY_ORDERING", [2, 3])
+    outbox = make_outbox(db, FlakyProvider(), Clock(NOW))
+
+    result = process_status_transitions(db, NOW, outbox=outbox)
+
+    assert result["transitions"][0]["to"] == "FINAL_ORDERING"
+    assert db.rows("events")[0]["status"] == "FINAL_ORDERING"
+    queued = db.rows("email_outbox")
+    # Roster alias + 13 roster members + 2 promoted reserves, nothing sent inline
+    assert len(queued) == 16
+    assert {row["status"] for row in queued} == {"PENDING"}
+    assert {row["subject"] for row in queued} == {"Final Schedule Locked: Tuesday Basketball"}
+    assert all(row["dedup_key"] and row["event_id"] == "e1" for row in queued)
+
+def test_no_emails_are_queued_when_another_run_claimed_the_transition():
+    db = make_db("PRELIMINARY_ORDERING", [])
+    outbox = make_outbox(db, FlakyProvider(), Clock(NOW))
+
+    # Another instance moves the event between our read and our write
+    rpc = db.rpc
+    def racing_rpc(name, params=None):
+        db.table("events").update({"status": "FINAL_ORDERING"}).eq("id", "e1").execute()
+        return rpc(name, params)
+    db.rpc = racing_rpc
+
+    result = process_status_transitions(db, NOW, outbox=outbox)
+
+    assert result["processed_events"] == 0
+    assert db.rows("email_outbox") == []
+
+def test_dispatcher_delivers_in_batches_and_retries_with_backoff():
+    db = make_db("PRELIMINARY_ORDERING", [])
+    clock = Clock(NOW)
+    provider = FlakyProvider(failing={"r3@example.com"})
+    outbox = make_outbox(db, provider, clock, max_attempts=3, base_delay_seconds=30)
+    process_status_transitions(db, NOW, outbox=outbox)
+
+    assert asyncio.run(outbox.dispatch_once()) == 14
+    # One provider call for the whole fan-out
+    assert len(provider.calls) == 1
+    rows = {row["to_email"]: row for row in db.rows("email_outbox")}
+    assert {row["status"] for to, row in rows.items() if to != "r3@example.com"} == {"SENT"}
+    failed = rows["r3@example.com"]
+    assert (failed["status"], failed["attempts"], failed["last_error"]) == ("PENDING", 1, "503 Service Unavailable")
+
+    # Not retried before its backoff has elapsed
+    assert asyncio.run(outbox.dispatch_once()) == 0
+    clock.now = NOW + timedelta(seconds=40)
+    assert asyncio.run(outbox.dispatch_once()) == 1
+
+    # Dead-lettered after max_attempts, and can be re-queued
+    clock.now = NOW + timedelta(hours=1)
+    asyncio.run(outbox.dispatch_once())
+    failed = next(row for row in db.rows("email_outbox") if row["to_email"] == "r3@example.com")
+    assert (failed["status"], failed["attempts"]) == ("DEAD", 3)
+    assert asyncio.run(outbox.dispatch_once()) == 0
+
+    provider.failing.clear()
+    assert outbox.retry(failed["id"])["status"] == "PENDING"
+    asyncio.run(outbox.dispatch_once())
+    assert {row["status"] for row in db.rows("email_outbox")} == {"SENT"}
+
+def test_claims_are_leased_to_one_dispatcher():
+    db = make_db("PRELIMINARY_ORDERING", [])
+    outbox = make_outbox(db, FlakyProvider(), Clock(NOW), lease_seconds=300)
+    process_status_transitions(db, NOW, outbox=outbox)
+
+    assert len(outbox.claim(NOW)) == 14
+    # A second dispatcher finds nothing until the lease runs out (e.g. after a crash)
+    assert outbox.claim(NOW + timedelta(seconds=10)) == []
+    assert len(outbox.claim(NOW + timedelta(seconds=301))) == 14
+
+def test_enqueue_skips_duplicate_keys():
+    db = make_db("NOT_YET_OPEN", [])
+    outbox = make_outbox(db, FlakyProvider(), Clock(NOW))
+    message = {"to_email": "a@example.com", "subject": "Hi", "html": "<p>Hi</p>", "dedup_key": "k1"}
+
+    assert outbox.enqueue([message])[0]["id"] is not None
+    assert outbox.enqueue([message]) == [{"to": "a@example.com", "id": None}]
+    # Unkeyed messages are always queued
+    outbox.enqueue([dict(message, dedup_key=None)] * 2)
+    assert len(db.rows("email_outbox")) == 3
+
+def test_email_service_routes_sends_through_the_outbox():
+    db = make_db("NOT_YET_OPEN", [])
+    service = EmailService()
+    service.use_outbox(make_outbox(db, FlakyProvider(), Clock(NOW)))
+
+    service.send_roster_open_notification({"name": "Tuesday Basketball"}, "roster@example.com")
+    service.send_late_stage_change_notification({"name": "Tuesday Basketball"}, "A", "B", ["a@example.com", "b@example.com"])
+
+    assert sorted(row["to_email"] for row in db.rows("email_outbox")) == ["a@example.com", "b@example.com", "roster@example.com"]
+
+def test_digest_messages_are_combined_per_recipient():
+    db = make_db("NOT_YET_OPEN", [])
+    clock = Clock(datetime(2026, 10, 19, 9, 7, tzinfo=timezone.utc))
+    provider = FlakyProvider()
+    outbox = make_outbox(db, provider, clock, digest_minutes=15)
+    service = EmailService()
+    service.use_outbox(outbox)
+
+    service.send_roster_open_notification({"name": "Tuesday Basketball"}, "roster@example.com")
+    service.send_roster_open_notification({"name": "Thursday Basketball"}, "roster@example.com")
+    service.send_initial_schedule_notification({"name": "Tuesday Basketball"}, None, ["a@example.com"])
+    service.send_late_stage_change_notification({"name": "Tuesday Basketball"}, "A", "B", ["a@example.com"])
+
+    # Only the urgent message goes out before the window closes
+    assert asyncio.run(outbox.dispatch_once()) == 1
+    assert provider.calls == [("Late Roster Change: Tuesday Basketball", ["a@example.com"])]
+
+    clock.now = datetime(2026, 10, 19, 9, 15, tzinfo=timezone.utc)
+    assert asyncio.run(outbox.dispatch_once()) == 3
+    sent = dict((to[0], subject) for subject, to in provider.calls[1:])
+    assert sent == {"roster@example.com": "Skeddle Updates (2)", "a@example.com": "Initial Schedule Released: Tuesday Basketball"}
+    assert {row["status"] for row in db.rows("email_outbox")} == {"SENT"}
+
+def test_digest_is_not_split_across_claims():
+    db = make_db("NOT_YET_OPEN", [])
+    clock = Clock(datetime(2026, 10, 19, 9, 7, tzinfo=timezone.utc))
+    provider = FlakyProvider()
+    outbox = make_outbox(db, provider, clock, digest_minutes=15)
+    service = EmailService()
+    service.use_outbox(outbox)
+
+    for day in ("Monday", "Tuesday", "Wednesday"):
+        service.send_roster_open_notification({"name": f"{day} Basketball"}, "roster@example.com")
+
+    # A claim page smaller than the recipient's digest still takes all of it
+    clock.now = datetime(2026, 10, 19, 9, 15, tzinfo=timezone.utc)
+    assert len(outbox.claim(clock.now, limit=1)) == 3
+    assert outbox.claim(clock.now, limit=1) == []
+
+    # Once the lease runs out the whole digest is sent as one email
+    clock.now += outbox.lease
+    assert asyncio.run(outbox.dispatch_once()) == 3
+    assert provider.calls == [("Skeddle Updates (3)", ["roster@example.com"])]
+
+def crash(*args, **kwargs):
+    raise RuntimeError("worker killed")
+
+def patch_app(db, outbox):
+    """Points main at `db` with the outbox enabled; any separate enqueue crashes."""
+    from unittest.mock import AsyncMock, MagicMock, patch
+    from contextlib import ExitStack
+    from event_type_cache import EventTypeCache
+
+    service = EmailService()
+    service.use_outbox(outbox)
+    user = MagicMock()
+    user.id = "auth-r0"
+    stack = ExitStack()
+    for target, value in [
+        ("main.supabase", db), ("main.email_outbox", outbox), ("main.email_service", service),
+        ("main.event_type_cache", EventTypeCache(db)), ("main.get_now", MagicMock(return_value=NOW)),
+    ]:
+        stack.enter_context(patch(target, value))
+    stack.enter_context(patch("main.get_current_admin", new_callable=AsyncMock))
+    stack.enter_context(patch("main.get_current_user", new_callable=AsyncMock, return_value=user))
+    # The process dies after the state change, before a separate enqueue
+    stack.enter_context(patch.object(EmailOutbox, "enqueue", crash))
+    return stack
+
+def test_blackout_date_emails_are_queued_with_the_cancellation():
+    from fastapi.testclient import TestClient
+    from main import app
+
+    db = make_db("OPEN_FOR_ROSTER", [], roster_count=2)
+    outbox = make_outbox(db, FlakyProvider(), Clock(NOW))
+
+    with patch_app(db, outbox):
+        res = TestClient(app).post("/api/admin/cancelled_dates", json={"date": "2026-03-09", "reason": "Gym closed"})
+
+    assert res.json()["cancelled_events"] == 1
+    assert db.rows("events")[0]["status"] == "CANCELLED"
+    queued = db.rows("email_outbox")
+    assert sorted(row["to_email"] for row in queued) == ["r0@example.com", "r1@example.com"]
+    assert {row["subject"] for row in queued} == {"Events Cancelled: 2026-03-09"}
+
+def test_blackout_cancellation_retries_when_an_event_changes_underneath():
+    from logic import cancel_events_on_date
+    from event_type_cache import EventTypeCache
+
+    db = make_db("OPEN_FOR_ROSTER", [], roster_count=0)
+    db.seed("events", [{"id": "e2", "event_type_id": "t1", "event_date": (EVENT_DATE + timedelta(hours=1)).isoformat(), "status": "OPEN_FOR_ROSTER"}])
+    outbox = make_outbox(db, FlakyProvider(), Clock(NOW))
+
+    # An admin cancels e2 by hand between our read and our write
+    rpc = db.rpc
+    def racing_rpc(name, params=None):
+        db.rpc = rpc
+        db.table("events").update({"status": "CANCELLED", "status_determinant": "MANUAL"}).eq("id", "e2").execute()
+        return rpc(name, params)
+    db.rpc = racing_rpc
+    rendered = []
+    def messages_for(events):
+        rendered.append(sorted(e["id"] for e in events))
+        return [{"to_email": "r@example.com", "subject": f"{len(events)} cancelled", "html": ""}]
+
+    cancelled = cancel_events_on_date(db, "2026-03-09", now=NOW, event_types=EventTypeCache(db), outbox=outbox, messages_for=messages_for)
+
+    assert [e["id"] for e in cancelled] == ["e1"]
+    assert rendered == [["e1", "e2"], ["e1"]]
+    assert [row["subject"] for row in db.rows("email_outbox")] == ["1 cancelled"]
+
+def test_late_stage_email_is_queued_with_the_promotion():
+    import asyncio
+    from main import remove_signup
+    from models import SignupRequest
+
+    db = make_db("FINAL_ORDERING", [], roster_count=15)
+    db.table("profiles").update({"auth_user_id": "auth-r0"}).eq("id", "r0").execute()
+    db.seed("profiles", [{"id": "w0", "email": "w0@example.com", "full_name": "Waitlisted"}])
+    db.seed("event_signups", [{"id": "s-w0", "event_id": "e1", "user_id": "w0", "list_type": "WAITLIST", "sequence_number": 1}])
+    outbox = make_outbox(db, FlakyProvider(), Clock(NOW))
+
+    with patch_app(db, outbox):
+        res = asyncio.run(remove_signup(SignupRequest(event_id="e1", user_id="auth-r0"), None))
+
+    assert res["status"] == "success"
+    assert db._table("event_signups").rows["s-w0"]["list_type"] == "EVENT"
+    queued = db.rows("email_outbox")
+    assert {row["subject"] for row in queued} == {"Late Roster Change: Tuesday Basketball"}
+    assert "w0@example.com" in {row["to_email"] for row in queued} and len(queued) == 15
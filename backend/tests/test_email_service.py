@@ -48,3 +48,138 @@ def test_send_access_granted(email_service):
         assert sent_params['to'] == ["test@example.com"]
         assert "Welcome to Skeddle" in sent_params['subject']
         assert "Jane Doe" in sent_params['html']
+
+def test_started_service_queues_sends_on_the_loop():
+    import asyncio
+    import json
+    import httpx
+
+    requests = []
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, json={"data": [{"id": f"re-{i}"} for i, _ in enumerate(json.loads(request.read()))]})
+
+    async def scenario():
+        service = EmailService(transport=httpx.MockTransport(handler))
+        service.start()
+        results = service.send_final_schedule_notification({"name": "Tuesday Basketball", "event_date": "2026-03-10T02:00:00+00:00"}, "roster@example.com", ["a@example.com", "b@example.com"])
+        # Handed off without waiting for delivery
+        assert results == [{"to": to, "id": "queued"} for to in ["roster@example.com", "a@example.com", "b@example.com"]]
+        assert requests == []
+        await service.aclose()
+
+    with patch('email_service.RESEND_API_KEY', "re_test_key"), patch('email_service.resend.Emails.send') as mock_send:
+        asyncio.run(scenario())
+        mock_send.assert_not_called()
+
+    # The fan-out is a single batch request
+    assert [r.url.path for r in requests] == ["/emails/batch"]
+    assert [m["to"] for m in json.loads(requests[0].read())] == [["roster@example.com"], ["a@example.com"], ["b@example.com"]]
+    assert requests[0].headers["Authorization"] == "Bearer re_test_key"
+
+def test_unstarted_service_sends_synchronously(email_service):
+    with patch('email_service.RESEND_API_KEY', "re_test_key"), patch('email_service.resend.Emails.send') as mock_send:
+        mock_send.return_value = {"id": "test-id"}
+        assert email_service.send_roster_open_notification({"name": "Tuesday Basketball"}, "roster@example.com") == {"id": "test-id"}
+        mock_send.assert_called_once()
+
+def test_fan_out_uses_batch_endpoint_in_chunks(email_service):
+    recipients = [f"player{i}@example.com" for i in range(250)]
+
+    def batch_send(params):
+        if params[0]["to"] == ["player200@example.com"]:
+            raise Exception("rate limited")
+        return {"data": [{"id": f"re-{p['to'][0]}"} for p in params]}
+
+    with patch('email_service.RESEND_API_KEY', "re_test_key"), \
+         patch('email_service.resend.Batch.send', side_effect=batch_send) as mock_batch, \
+         patch('email_service.resend.Emails.send') as mock_send:
+        results = email_service.send_late_stage_change_notification(
+            {"name": "Tuesday Basketball"}, "A player", "B player", recipients + recipients[:10]
+        )
+
+    mock_send.assert_not_called()
+    assert [len(call.args[0]) for call in mock_batch.call_args_list] == [100, 100, 50]
+    # One result per (deduplicated) recipient, in order
+    assert [r["to"] for r in results] == recipients
+    assert results[0]["id"] == "re-player0@example.com"
+    assert all(r["id"] is None and r["error"] == "rate limited" for r in results[200:])
+
+def test_fan_out_mock_mode_prints_each_recipient(email_service, capsys):
+    with patch('email_service.RESEND_API_KEY', None):
+        results = email_service.send_initial_schedule_notification({"name": "Tuesday Basketball"}, "roster@example.com", ["a@example.com"])
+    assert results == [{"to": "roster@example.com", "id": "mock-email-id"}, {"to": "a@example.com", "id": "mock-email-id"}]
+    assert capsys.readouterr().out.count("--- MOCK EMAIL ---") == 2
+
+def test_event_notifications_render_once_per_event_and_type(email_service):
+    from email_templates import render_event_notification
+    event = {"name": "Tuesday Basketball", "event_date": "2026-03-10T18:00:00-08:00"}
+    render_event_notification.cache_clear()
+
+    with patch('email_service.RESEND_API_KEY', "re_test_key"), patch('email_service.resend.Emails.send') as mock_send:
+        email_service.send_reserve_open_notification(event, "res1@example.com")
+        email_service.send_reserve_open_notification(dict(event), "res2@example.com")
+
+    first, second = (call.args[0] for call in mock_send.call_args_list)
+    assert first["html"] is second["html"]
+    assert first["subject"] == "Waitlist/Reserve Open: Tuesday Basketball"
+    assert "Tuesday, March 10, 2026 at 06:00 PM" in first["html"]
+    assert render_event_notification.cache_info().hits == 1
+
+def test_file_sink_records_scheduler_fan_out(tmp_path):
+    import asyncio
+    from datetime import timedelta
+    from email_sinks import FileSink
+    from scheduler import process_status_transitions
+    from tests.test_scheduler import make_db, EVENT_DATE
+
+    sink = FileSink(str(tmp_path / "emails.jsonl"))
+    service = EmailService(sink=sink)
+    with patch('email_service.resend.Batch.send') as mock_batch, patch('email_service.resend.Emails.send') as mock_send:
+        process_status_transitions(make_db("PRELIMINARY_ORDERING", []), EVENT_DATE - timedelta(minutes=60), notifier=service)
+        mock_batch.assert_not_called()
+        mock_send.assert_not_called()
+
+    sent = sink.read()
+    assert sorted(m["to"][0] for m in sent) == sorted(["roster@example.com"] + [f"r{i}@example.com" for i in range(13)])
+    assert {m["subject"] for m in sent} == {"Final Schedule Locked: Tuesday Basketball"}
+    assert len({m["id"] for m in sent}) == len(sent)
+
+    # The async path writes to the same sink
+    async def scenario():
+        service.start()
+        service.send_roster_open_notification({"name": "Tuesday Basketball"}, "roster@example.com")
+        await service.aclose()
+    asyncio.run(scenario())
+    assert sink.read()[-1]["subject"] == "Signups Open: Tuesday Basketball"
+
+def test_smtp_sink_sends_over_one_connection():
+    from email_sinks import SmtpSink, sink_from_env
+
+    sink = sink_from_env("smtp://localhost:1025")
+    assert (sink.host, sink.port) == ("localhost", 1025)
+    with patch('email_sinks.smtplib.SMTP') as smtp:
+        results = EmailService(sink=sink).send_initial_schedule_notification({"name": "Tuesday Basketball"}, "roster@example.com", ["a@example.com"])
+
+    smtp.assert_called_once_with("localhost", 1025, timeout=10.0)
+    sent = [call.args[0] for call in smtp.return_value.__enter__.return_value.send_message.call_args_list]
+    assert [m["To"] for m in sent] == ["roster@example.com", "a@example.com"]
+    assert [r["id"] for r in results] == [m["Message-ID"] for m in sent]
+
+def test_date_change_emails_list_each_recipients_own_events(tmp_path):
+    from email_sinks import FileSink
+
+    sink = FileSink(str(tmp_path / "emails.jsonl"))
+    early = {"id": "e1", "name": "Morning Yoga", "event_date": "2026-03-03T08:00:00-08:00"}
+    late = {"id": "e2", "name": "Tuesday Basketball", "event_date": "2026-03-03T18:00:00-08:00"}
+    EmailService(sink=sink).send_date_change_notification("2026-03-03", {
+        "both@example.com": [late, early],
+        "yoga@example.com": [early],
+        "also-yoga@example.com": [early],
+    })
+
+    sent = {m["to"][0]: m["html"] for m in sink.read()}
+    assert sorted(sent) == ["also-yoga@example.com", "both@example.com", "yoga@example.com"]
+    assert "Morning Yoga" in sent["both@example.com"] and "Tuesday Basketball" in sent["both@example.com"]
+    assert sent["both@example.com"].index("Morning Yoga") < sent["both@example.com"].index("Tuesday Basketball")
+    assert "Tuesday Basketball" not in sent["yoga@example.com"]
@@ -0,0 +1,71 @@
+import pytest
+import sys
+import os
+from datetime import datetime, timedelta, timezone
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from event_type_cache import EventTypeCache
+from mock_supabase import MockSupabase
+from scheduler import process_status_transitions
+from simulation import DEFAULT_EVENT_TYPE, RecordingEmailService
+from clock import SimulatedClock
+
+def make_db():
+    db = MockSupabase()
+    db.seed("user_groups", [
+        {"id": "g-roster", "name": "Roster"},
+        {"id": "g-res1", "name": "Reserves 1"},
+    ])
+    db.seed("event_types", [dict(
+        DEFAULT_EVENT_TYPE, id="t1", name="Tuesday Basketball", day_of_week=2, time_of_day="18:00:00",
+        roster_user_group="g-roster", reserve_first_priority_user_group="g-res1", reserve_second_priority_user_group=None
+    )])
+    return db
+
+def test_attach_joins_event_types_in_memory():
+    db = make_db()
+    cache = EventTypeCache(db)
+    events = [{"id": f"e{i}", "event_type_id": "t1"} for i in range(50)]
+
+    queries_before = db.query_count
+    cache.attach(events)
+    cache.attach(events)
+
+    # One load (event types + group names), then served from memory
+    assert db.query_count - queries_before == 2
+    assert all(e["event_types"]["name"] == "Tuesday Basketball" for e in events)
+
+def test_admin_view_resolves_group_names():
+    cache = EventTypeCache(make_db())
+    (row,) = cache.admin_view()
+    assert row["roster_user_group_name"] == "Roster"
+    assert row["reserve_first_priority_user_group_name"] == "Reserves 1"
+    assert row["reserve_second_priority_user_group_id"] is None
+    assert row["reserve_second_priority_user_group_name"] is None
+    assert row["duration_minutes"] == 120
+
+def test_invalidate_picks_up_edits_and_unknown_ids_reload():
+    db = make_db()
+    cache = EventTypeCache(db)
+    assert cache.get("t1")["max_signups"] == 15
+
+    db._table("event_types").rows["t1"]["max_signups"] = 20
+    assert cache.get("t1")["max_signups"] == 15
+    cache.invalidate()
+    assert cache.get("t1")["max_signups"] == 20
+
+    # Created on another instance: an unknown id triggers one reload
+    db.seed("event_types", [dict(DEFAULT_EVENT_TYPE, id="t2", name="Thursday", day_of_week=4, time_of_day="19:00:00")])
+    assert cache.get("t2")["name"] == "Thursday"
+
+def test_scheduler_with_cache_selects_only_event_columns():
+    db = make_db()
+    event_date = datetime(2026, 3, 10, 2, 0, 0, tzinfo=timezone.utc)
+    db.seed("events", [{"id": "e1", "event_type_id": "t1", "event_date": event_date.isoformat(), "status": "NOT_YET_OPEN"}])
+    now = event_date - timedelta(minutes=1000)  # inside OPEN_FOR_ROSTER
+
+    result = process_status_transitions(db, now, notifier=RecordingEmailService(SimulatedClock(now)), event_types=EventTypeCache(db))
+
+    assert result["transitions"][0]["to"] == "OPEN_FOR_ROSTER"
+    assert db.rows("events")[0]["status"] == "OPEN_FOR_ROSTER"
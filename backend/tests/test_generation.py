@@ -1,115 +1,249 @@
 import pytest
-from unittest.mock import MagicMock, patch
+import sys
+import os
 from datetime import datetime, timezone, timedelta
-from logic import generate_future_events
 
-def test_generate_future_events_basic():
-    """
-    Test that the generator creates events for the correct days of week.
-    """
-    mock_supabase = MagicMock()
-    
-    # 1. Mock Event Types
-    mock_event_types = MagicMock()
-    mock_event_types.data = [{
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from logic import generate_future_events, cancel_events_on_date, restore_events_on_date
+from cancelled_dates_cache import CancelledDatesCache
+from mock_supabase import MockSupabase
+
+# Monday, 2026-03-02
+NOW = datetime(2026, 3, 2, 10, 0, 0, tzinfo=timezone.utc)
+
+def make_db(cancelled_dates=()):
+    db = MockSupabase()
+    db.seed("event_types", [{
         "id": "t1",
         "name": "Tuesday Basketball",
         "day_of_week": 2, # Tuesday
         "time_of_day": "18:00:00",
         "max_signups": 15
-    }]
-    
-    # 2. Mock Blackout Dates
-    mock_blackouts = MagicMock()
-    mock_blackouts.data = []
-    
-    # 3. Mock Check Existing (Empty)
-    mock_existing = MagicMock()
-    mock_existing.data = []
-    
-    # 4. Mock Insert Success
-    mock_insert_res = MagicMock()
-    mock_insert_res.data = [{"id": "new-event-789"}]
-
-    # Set up the chain of mocks
-    # First call: table("event_types").select("*").execute()
-    # Second call: table("cancelled_dates").select("date").execute()
-    # Third call: table("events").select("id").eq().eq().execute()
-    
-    # We'll use a side_effect on the final .execute() for the select chains
-    mock_supabase.table.return_value.select.return_value.execute.side_effect = [
-        mock_event_types,
-        mock_blackouts
-    ]
-    
-    # For the chained eq calls:
-    mock_eq_chain = mock_supabase.table.return_value.select.return_value.eq.return_value.eq.return_value
-    mock_eq_chain.execute.return_value = mock_existing
-    
-    # For the insert call:
-    mock_supabase.table.return_value.insert.return_value.execute.return_value = mock_insert_res
-    
-    with patch('logic.datetime') as mock_date:
-        # Mock "today" as Monday, 2026-03-02
-        mock_date.now.return_value = datetime(2026, 3, 2, 10, 0, 0, tzinfo=timezone.utc)
-        mock_date.fromisoformat = datetime.fromisoformat
-        mock_date.side_effect = lambda *args, **kw: datetime(*args, **kw)
-        
-        count = generate_future_events(mock_supabase, days_ahead_to_ensure=7)
-        
-        # Should have found 1 Tuesday (2026-03-03)
-        assert count == 1
-        
-        mock_supabase.table.return_value.insert.assert_called_once()
-        payload = mock_supabase.table.return_value.insert.call_args[0][0]
-        assert payload["event_type_id"] == "t1"
-        assert "2026-03-03T18:00:00" in payload["event_date"]
-        assert payload["status"] == "NOT_YET_OPEN"
+    }])
+    db.seed("cancelled_dates", [{"date": d} for d in cancelled_dates])
+    return db
+
+def test_generate_future_events_basic():
+    """
+    Test that the generator creates events for the correct days of week.
+    """
+    db = make_db()
+
+    count = generate_future_events(db, days_ahead_to_ensure=7, now=NOW)
+
+    # Should have found 1 Tuesday (2026-03-03)
+    assert count == 1
+    events = db.rows("events")
+    assert len(events) == 1
+    assert events[0]["event_type_id"] == "t1"
+    assert "2026-03-03T18:00:00" in events[0]["event_date"]
+    assert events[0]["status"] == "NOT_YET_OPEN"
 
 def test_generate_future_events_with_blackout():
     """
     Test that matching blackout dates creates CANCELLED events.
     """
-    mock_supabase = MagicMock()
-    
-    mock_event_types = MagicMock()
-    mock_event_types.data = [{
-        "id": "t1",
-        "name": "Tuesday Basketball",
-        "day_of_week": 2,
-        "time_of_day": "18:00:00",
-        "max_signups": 15
-    }]
-    
-    mock_blackouts = MagicMock()
-    mock_blackouts.data = [{"date": "2026-03-03"}]
-    
-    mock_existing = MagicMock()
-    mock_existing.data = []
-    
-    mock_insert_res = MagicMock()
-    mock_insert_res.data = [{"id": "new-event-cancelled"}]
-
-    mock_supabase.table.return_value.select.return_value.execute.side_effect = [
-        mock_event_types,
-        mock_blackouts
+    db = make_db(cancelled_dates=["2026-03-03"])
+
+    count = generate_future_events(db, days_ahead_to_ensure=7, now=NOW)
+
+    assert count == 1
+    assert db.rows("events")[0]["status"] == "CANCELLED"
+
+def test_generate_future_events_is_idempotent_and_bulk():
+    db = make_db()
+    # Already there, stored in UTC by Postgres
+    db.seed("events", [{"id": "e-existing", "event_type_id": "t1", "event_date": "2026-03-04T02:00:00+00:00", "status": "NOT_YET_OPEN"}])
+
+    queries_before = db.query_count
+    count = generate_future_events(db, days_ahead_to_ensure=28, now=NOW)
+
+    # 4 Tuesdays in the horizon, the first already exists
+    assert count == 3
+    assert len(db.rows("events")) == 4
+    # event types + cancelled dates + existing events + one bulk insert + watermark
+    assert db.query_count - queries_before == 5
+
+    assert generate_future_events(db, days_ahead_to_ensure=28, now=NOW) == 0
+    assert len(db.rows("events")) == 4
+
+def test_generation_only_materializes_days_past_the_watermark():
+    db = make_db()
+    generate_future_events(db, days_ahead_to_ensure=14, now=NOW)
+    assert db.rows("event_types")[0]["generated_through"] == "2026-03-16"
+
+    # Same day: nothing new to cover, so no events query at all
+    queries_before = db.query_count
+    assert generate_future_events(db, days_ahead_to_ensure=14, now=NOW + timedelta(hours=1)) == 0
+    assert db.query_count - queries_before == 2
+
+    # A week later only the new week is generated
+    assert generate_future_events(db, days_ahead_to_ensure=14, now=NOW + timedelta(days=7)) == 1
+    assert len(db.rows("events")) == 3
+
+def test_generation_honors_per_type_horizon():
+    db = make_db()
+    db.seed("event_types", [{
+        "id": "t2", "name": "Thursday League", "day_of_week": 4, "time_of_day": "19:00:00",
+        "max_signups": 15, "generation_horizon_days": 56
+    }])
+
+    generate_future_events(db, days_ahead_to_ensure=14, now=NOW)
+
+    by_type = {}
+    for e in db.rows("events"):
+        by_type[e["event_type_id"]] = by_type.get(e["event_type_id"], 0) + 1
+    assert by_type == {"t1": 2, "t2": 8}
+
+def test_schedule_change_regenerates_only_unopened_events():
+    from logic import invalidate_generation_watermark
+    db = make_db()
+    generate_future_events(db, days_ahead_to_ensure=14, now=NOW)
+    first, second = sorted(db.rows("events"), key=lambda e: e["event_date"])
+    # The first Tuesday is already open and has a signup
+    db._table("events").rows[first["id"]]["status"] = "OPEN_FOR_ROSTER"
+    db.seed("event_signups", [{"id": "s1", "event_id": first["id"], "user_id": "u1", "list_type": "EVENT"}])
+
+    # Moved to Wednesdays at 19:00
+    db._table("event_types").rows["t1"].update({"day_of_week": 3, "time_of_day": "19:00:00"})
+    assert invalidate_generation_watermark(db, "t1", now=NOW) == 1
+    assert db.rows("event_types")[0]["generated_through"] == "2026-03-03"
+
+    generate_future_events(db, days_ahead_to_ensure=14, now=NOW)
+
+    dates = sorted(e["event_date"] for e in db.rows("events"))
+    assert dates == ["2026-03-03T18:00:00-08:00", "2026-03-04T19:00:00-08:00", "2026-03-11T19:00:00-07:00"]
+
+def test_generation_uses_each_event_types_time_zone():
+    db = make_db()
+    db.seed("event_types", [{
+        "id": "t2", "name": "Tuesday Basketball East", "day_of_week": 2, "time_of_day": "18:00:00",
+        "time_zone": "America/New_York", "max_signups": 15
+    }])
+
+    generate_future_events(db, days_ahead_to_ensure=7, now=NOW)
+
+    dates = {e["event_type_id"]: datetime.fromisoformat(e["event_date"]) for e in db.rows("events")}
+    assert dates["t1"].isoformat() == "2026-03-03T18:00:00-08:00"
+    assert dates["t2"].isoformat() == "2026-03-03T18:00:00-05:00"
+    assert dates["t1"] - dates["t2"] == timedelta(hours=3)
+
+def test_expansion_handles_dst_gap_and_overlap():
+    from datetime import date
+    from logic import expand_event_type
+    # 2026-03-08 and 2026-11-01 are the US DST switch Sundays
+    gap_type = {"id": "t-gap", "day_of_week": 0, "time_of_day": "02:30:00", "time_zone": "America/Los_Angeles"}
+    overlap_type = dict(gap_type, id="t-overlap", time_of_day="01:30:00")
+
+    (gap_dt, gap_payload), = expand_event_type(gap_type, date(2026, 3, 8), date(2026, 3, 8))
+    # 02:30 does not exist that night; it moves forward by the gap
+    assert gap_payload["event_date"] == "2026-03-08T03:30:00-07:00"
+
+    (overlap_dt, overlap_payload), = expand_event_type(overlap_type, date(2026, 11, 1), date(2026, 11, 1))
+    # 01:30 happens twice; the first (daylight time) instant is used
+    assert overlap_payload["event_date"] == "2026-11-01T01:30:00-07:00"
+
+    # The weeks around the switches keep the same wall-clock time
+    weeks = expand_event_type(overlap_type, date(2026, 10, 20), date(2026, 11, 10))
+    assert [dt.strftime("%H:%M") for dt, _ in weeks] == ["01:30"] * 3
+    assert [dt.utcoffset() for dt, _ in weeks] == [timedelta(hours=-7), timedelta(hours=-7), timedelta(hours=-8)]
+
+def test_expansion_of_many_types_over_a_long_horizon_is_fast():
+    import time
+    from datetime import date
+    from logic import expand_event_type
+    zones = ["America/Los_Angeles", "America/New_York", "Europe/London", "Australia/Sydney"]
+    event_types = [
+        {"id": f"t{i}", "day_of_week": i % 7, "time_of_day": f"{i % 24:02d}:30:00", "time_zone": zones[i % len(zones)]}
+        for i in range(500)
     ]
-    
-    mock_eq_chain = mock_supabase.table.return_value.select.return_value.eq.return_value.eq.return_value
-    mock_eq_chain.execute.return_value = mock_existing
-    
-    mock_supabase.table.return_value.insert.return_value.execute.return_value = mock_insert_res
-    
-    with patch('logic.datetime') as mock_date:
-        # Mock "today" as Monday, 2026-03-02
-        mock_date.now.return_value = datetime(2026, 3, 2, 10, 0, 0, tzinfo=timezone.utc)
-        mock_date.fromisoformat = datetime.fromisoformat
-        mock_date.side_effect = lambda *args, **kw: datetime(*args, **kw)
-        
-        count = generate_future_events(mock_supabase, days_ahead_to_ensure=7)
-        
-        assert count == 1
-        
-        # Verify it attempted to insert CANCELLED status
-        mock_supabase.table.return_value.insert.assert_called_once()
-        assert mock_supabase.table.return_value.insert.call_args[0][0]["status"] == "CANCELLED"
+
+    started = time.perf_counter()
+    slots = []
+    for t in event_types:
+        slots.extend(expand_event_type(t, date(2026, 1, 1), date(2027, 12, 31)))
+    elapsed = time.perf_counter() - started
+
+    # 500 weekly types over two years
+    assert 500 * 104 <= len(slots) <= 500 * 105
+    # Generous CI budget; this takes well under a second locally
+    assert elapsed < 10
+
+def test_generation_uses_in_memory_blackout_dates():
+    db = make_db(cancelled_dates=["2026-03-03"])
+    cache = CancelledDatesCache(db)
+    assert "2026-03-03" in cache
+
+    # The table is not read again: only the in-memory set counts
+    db.table("cancelled_dates").delete().eq("date", "2026-03-03").execute()
+    generate_future_events(db, days_ahead_to_ensure=7, now=NOW, blackout_dates=cache.dates())
+    assert db.rows("events")[0]["status"] == "CANCELLED"
+
+    cache.discard("2026-03-03")
+    cache.add("2026-03-10")
+    assert cache.dates() == {"2026-03-10"}
+
+def test_blackout_date_cancels_and_restores_generated_events():
+    db = make_db()
+    db.seed("event_types", [{
+        "id": "t2", "name": "Tuesday Volleyball", "day_of_week": 2, "time_of_day": "20:00:00",
+        "time_zone": "America/New_York", "max_signups": 12
+    }])
+    generate_future_events(db, days_ahead_to_ensure=14, now=NOW)
+    events = {(e["event_type_id"], e["event_date"][:10]): e for e in db.rows("events")}
+    manual = events[("t2", "2026-03-10")]
+    db.table("events").update({"status": "CANCELLED", "status_determinant": "MANUAL"}).eq("id", manual["id"]).execute()
+
+    queries_before = db.query_count
+    cancelled = cancel_events_on_date(db, "2026-03-10", now=NOW)
+    # One fetch and one set-based update for every event on the date
+    assert db.query_count - queries_before == 2
+    assert [e["event_type_id"] for e in cancelled] == ["t1"]
+
+    statuses = {e["id"]: e["status"] for e in db.rows("events")}
+    assert statuses[events[("t1", "2026-03-10")]["id"]] == "CANCELLED"
+    assert statuses[events[("t1", "2026-03-03")]["id"]] == "NOT_YET_OPEN"
+
+    restored = restore_events_on_date(db, "2026-03-10", now=NOW)
+    assert [e["event_type_id"] for e in restored] == ["t1"]
+    statuses = {e["id"]: e["status"] for e in db.rows("events")}
+    assert statuses[events[("t1", "2026-03-10")]["id"]] == "NOT_YET_OPEN"
+    # Manually cancelled events are not brought back
+    assert statuses[manual["id"]] == "CANCELLED"
+
+def test_schedule_change_fills_days_before_a_kept_later_event():
+    from logic import invalidate_generation_watermark
+    db = make_db()
+    db._table("event_types").rows["t1"]["generation_horizon_days"] = 56
+    generate_future_events(db, now=NOW)
+    events = sorted(db.rows("events"), key=lambda e: e["event_date"])
+    assert len(events) == 8
+    # Week 6 was cancelled by hand, so it survives the schedule change
+    db._table("events").rows[events[5]["id"]].update({"status": "CANCELLED", "status_determinant": "MANUAL"})
+
+    db._table("event_types").rows["t1"]["day_of_week"] = 3
+    assert invalidate_generation_watermark(db, "t1", now=NOW) == 7
+    assert db.rows("event_types")[0]["generated_through"] == "2026-03-03"
+
+    generate_future_events(db, now=NOW)
+
+    wednesdays = sorted(e["event_date"][:10] for e in db.rows("events") if e["event_date"][:10] != "2026-04-07")
+    assert wednesdays == ["2026-03-04", "2026-03-11", "2026-03-18", "2026-03-25", "2026-04-01", "2026-04-08", "2026-04-15", "2026-04-22"]
+
+def test_time_zone_edit_regenerates_events_at_the_new_instants():
+    from unittest.mock import AsyncMock, patch
+    from fastapi.testclient import TestClient
+    from main import app
+
+    db = make_db()
+    generate_future_events(db, days_ahead_to_ensure=14, now=NOW)
+    assert sorted(e["event_date"] for e in db.rows("events")) == ["2026-03-03T18:00:00-08:00", "2026-03-10T18:00:00-07:00"]
+
+    with patch("main.supabase", db), patch("main.get_current_admin", new_callable=AsyncMock), patch("main.get_now", return_value=NOW):
+        res = TestClient(app).put("/api/admin/event_types/t1", json={"time_zone": "America/New_York"})
+    assert res.status_code == 200
+    assert db.rows("event_types")[0]["generated_through"] == "2026-03-02"
+
+    generate_future_events(db, days_ahead_to_ensure=14, now=NOW)
+    assert sorted(e["event_date"] for e in db.rows("events")) == ["2026-03-03T18:00:00-05:00", "2026-03-10T18:00:00-04:00"]
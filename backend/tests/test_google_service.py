@@ -0,0 +1,161 @@
+import asyncio
+import pytest
+import sys
+import os
+import json
+from datetime import datetime, timedelta, timezone
+
+from unittest.mock import patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from google_service import apply_member_changes, collapse_changes, sync_to_google
+from mock_google_service import FakeDirectoryService, http_error
+from mock_supabase import MockSupabase
+
+
+GROUP = "roster@example.com"
+
+
+def test_member_changes_are_sent_in_batches():
+    directory = FakeDirectoryService({GROUP: ["old@example.com"]})
+    to_add = [f"m{i}@example.com" for i in range(120)]
+
+    result = apply_member_changes(directory, "roster@example.com", to_add, ["old@example.com"], batch_size=50, sleep=lambda s: None)
+
+    assert directory.batch_sizes == [50, 50, 21]
+    assert result == {"added": to_add, "removed": ["old@example.com"], "failed": []}
+
+def test_failed_members_are_retried_with_backoff_and_reported():
+    delays = []
+    directory = FakeDirectoryService({GROUP: ["dup@example.com", "down@example.com"]})
+    directory.fail("add", "busy@example.com", http_error(403, "userRateLimitExceeded"), http_error(503, "backendError"))
+    directory.fail("add", "bad@example.com", http_error(400, "invalid"))
+    directory.fail("remove", "down@example.com", *[http_error(503, "backendError")] * 3)
+
+    result = apply_member_changes(
+        directory, "roster@example.com",
+        ["ok@example.com", "busy@example.com", "bad@example.com", "dup@example.com"], ["down@example.com"],
+        max_attempts=3, base_delay=1.0, sleep=delays.append,
+    )
+
+    # Only the retryable failures go into the later batches
+    assert directory.batch_sizes == [5, 2, 2]
+    assert len(delays) == 2 and 1.0 <= delays[0] <= 1.5 and 2.0 <= delays[1] <= 3.0
+    assert result["added"] == ["ok@example.com", "dup@example.com", "busy@example.com"]
+    assert result["removed"] == []
+    assert [(f["action"], f["email"]) for f in result["failed"]] == [("add", "bad@example.com"), ("remove", "down@example.com")]
+
+def test_directory_service_is_built_once_and_shared_across_threads():
+    import threading
+    from unittest.mock import patch
+    from google.oauth2.credentials import Credentials
+    import google_service
+
+    google_service.reset_google_service()
+    creds = Credentials(token="test-token")
+    with patch("google_service._load_credentials", return_value=creds) as load, \
+         patch("google_service.build", wraps=google_service.build) as build:
+        services, https = [], []
+
+        def sync():
+            service = google_service.get_google_service()
+            services.append(service)
+            https.append(service.members().list(groupKey="roster@example.com").http)
+
+        threads = [threading.Thread(target=sync) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        sync()
+
+    # Built once, from the bundled discovery document
+    load.assert_called_once()
+    build.assert_called_once()
+    assert build.call_args.kwargs["static_discovery"] is True
+    assert len({id(s) for s in services}) == 1
+    # Each thread's requests get their own authorized connection
+    assert len({id(h) for h in https[:4]}) == 4
+    assert all(h.credentials is creds for h in https)
+    assert google_service.get_google_service() is services[0]
+    google_service.reset_google_service()
+
+def make_group_db(synced_change_id=None, full_sync_at=None):
+    db = MockSupabase()
+    db.seed("user_groups", [{
+        "id": "g-roster", "name": "Roster", "group_email": "roster@example.com",
+        "google_synced_change_id": synced_change_id, "google_synced_at": None, "google_full_sync_at": full_sync_at,
+    }])
+    db.seed("profiles", [{"id": f"p{i}", "email": f"P{i}@example.com"} for i in range(3)])
+    db.seed("profile_groups", [{"profile_id": f"p{i}", "group_id": "g-roster"} for i in range(3)])
+    return db
+
+def run_sync(db, directory, **kwargs):
+    with patch("google_service.supabase", db), patch("google_service.get_google_service", return_value=directory):
+        return asyncio.run(sync_to_google("g-roster", **kwargs))
+
+def test_collapse_changes_keeps_the_last_op_per_email():
+    changes = [
+        {"id": 1, "email": "a@example.com", "op": "ADD"},
+        {"id": 2, "email": "b@example.com", "op": "REMOVE"},
+        {"id": 3, "email": "A@example.com", "op": "REMOVE"},
+        {"id": 4, "email": "c@example.com", "op": "ADD"},
+        {"id": 5, "email": "b@example.com", "op": "ADD"},
+    ]
+    assert collapse_changes(changes) == (["c@example.com", "b@example.com"], ["a@example.com"])
+
+def test_sync_applies_only_logged_changes_after_a_full_sync():
+    db = make_group_db()
+    db.seed("group_membership_changes", [{"id": 7, "group_id": "g-roster", "email": "p0@example.com", "op": "ADD"}])
+    directory = FakeDirectoryService({GROUP: ["p0@example.com", "gone@example.com"]})
+
+    # Never synced: full reconciliation, watermark set to the latest change
+    result = run_sync(db, directory)
+    assert result["mode"] == "full" and directory.list_calls == 1
+    assert directory.group_members(GROUP) == {"p0@example.com", "p1@example.com", "p2@example.com"}
+    group = db.rows("user_groups")[0]
+    assert group["google_synced_change_id"] == 7 and group["google_full_sync_at"]
+    assert db.rows("group_membership_changes") == []
+
+    # Later changes are applied from the log without listing the group
+    db.seed("group_membership_changes", [
+        {"id": 8, "group_id": "g-roster", "email": "p3@example.com", "op": "ADD"},
+        {"id": 9, "group_id": "g-roster", "email": "p1@example.com", "op": "REMOVE"},
+        {"id": 10, "group_id": "other", "email": "x@example.com", "op": "ADD"},
+    ])
+    result = run_sync(db, directory)
+    assert result["mode"] == "incremental" and directory.list_calls == 1
+    assert (result["added"], result["removed"]) == (["p3@example.com"], ["p1@example.com"])
+    assert directory.group_members(GROUP) == {"p0@example.com", "p2@example.com", "p3@example.com"}
+    assert db.rows("user_groups")[0]["google_synced_change_id"] == 9
+    assert [c["id"] for c in db.rows("group_membership_changes")] == [10]
+
+    # Nothing new: no Google calls at all
+    round_trips = directory.round_trips
+    assert run_sync(db, directory)["summary"] == "Incremental Sync Complete: Added 0, Removed 0"
+    assert directory.round_trips == round_trips
+
+def test_failed_incremental_sync_keeps_the_watermark():
+    db = make_group_db(synced_change_id=3, full_sync_at=datetime.now(timezone.utc).isoformat())
+    db.seed("group_membership_changes", [{"id": 4, "group_id": "g-roster", "email": "new@example.com", "op": "ADD"}])
+    directory = FakeDirectoryService({GROUP: []})
+    directory.fail("add", "new@example.com", http_error(400, "invalid"))
+
+    result = run_sync(db, directory)
+    assert result["failed"][0]["email"] == "new@example.com"
+    assert db.rows("user_groups")[0]["google_synced_change_id"] == 3
+
+    assert run_sync(db, directory)["added"] == ["new@example.com"]
+    assert db.rows("user_groups")[0]["google_synced_change_id"] == 4
+
+def test_stale_full_sync_falls_back_to_reconciliation():
+    stale = (datetime.now(timezone.utc) - timedelta(hours=25)).isoformat()
+    db = make_group_db(synced_change_id=3, full_sync_at=stale)
+    # Drifted outside the log (e.g. edited in the Google admin console)
+    directory = FakeDirectoryService({GROUP: ["p0@example.com", "p1@example.com", "manual@example.com"]})
+
+    result = run_sync(db, directory)
+    assert result["mode"] == "full"
+    assert (result["added"], result["removed"]) == (["p2@example.com"], ["manual@example.com"])
+    assert run_sync(db, directory)["mode"] == "incremental"
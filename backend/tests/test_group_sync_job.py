@@ -0,0 +1,73 @@
+import asyncio
+import pytest
+import sys
+import os
+from unittest.mock import patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from group_sync_job import GroupSyncJob, GroupSyncJobs
+from mock_google_service import FakeDirectoryService
+from mock_supabase import MockSupabase
+
+
+def make_db(group_count=6, members_per_group=5):
+    db = MockSupabase()
+    db.seed("user_groups", [
+        {"id": f"g{i}", "name": f"Group {i}", "group_email": f"group{i}@example.com"} for i in range(group_count)
+    ] + [{"id": "g-internal", "name": "Internal", "group_email": None}])
+    db.seed("profiles", [{"id": f"p{i}", "email": f"p{i}@example.com"} for i in range(members_per_group)])
+    db.seed("profile_groups", [
+        {"profile_id": f"p{j}", "group_id": f"g{i}"} for i in range(group_count) for j in range(members_per_group)
+    ])
+    return db
+
+def run_job(db, directory, **kwargs):
+    with patch("google_service.supabase", db), patch("google_service.get_google_service", return_value=directory):
+        return asyncio.run(GroupSyncJob(db, **kwargs).run())
+
+def test_sync_all_groups_runs_concurrently_under_the_limit():
+    db = make_db()
+    directory = FakeDirectoryService(latency_seconds=0.05, auto_create_groups=True)
+
+    progress = run_job(db, directory, concurrency=3)
+
+    assert progress["status"] == "FINISHED"
+    # Groups without a Google Group email are skipped
+    assert progress["total"] == 6 and progress["completed"] == 6
+    assert progress["counts"] == {"SYNCED": 6}
+    assert directory.max_in_flight == 3
+    assert all(directory.group_members(f"group{i}@example.com") == {f"p{j}@example.com" for j in range(5)} for i in range(6))
+    assert progress["groups"][0]["result"]["added"]
+
+def test_per_group_failures_are_reported():
+    db = make_db(group_count=3)
+    directory = FakeDirectoryService({"group0@example.com": [], "group1@example.com": []})
+    # group2 does not exist in Google -> listing it fails
+
+    progress = run_job(db, directory, concurrency=2)
+
+    assert progress["status"] == "FINISHED"
+    statuses = {g["id"]: g["status"] for g in progress["groups"]}
+    assert statuses == {"g0": "SYNCED", "g1": "SYNCED", "g2": "FAILED"}
+    assert "group2@example.com" in progress["groups"][2]["result"]["message"]
+
+def test_only_one_job_runs_at_a_time():
+    db = make_db(group_count=2)
+    gate = asyncio.Event()
+
+    async def slow_sync(group_id, full=False):
+        await gate.wait()
+        return {"status": "success", "failed": []}
+
+    async def scenario():
+        jobs = GroupSyncJobs(db, sync_fn=slow_sync)
+        first = jobs.start()
+        await asyncio.sleep(0)
+        assert jobs.start() is first
+        assert first.progress()["status"] == "RUNNING"
+        gate.set()
+        await first._task
+        assert jobs.get(first.id).progress()["counts"] == {"SYNCED": 2}
+        assert jobs.latest() is first
+    asyncio.run(scenario())
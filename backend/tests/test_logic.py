@@ -99,3 +99,55 @@ def test_promote_from_holding_overflow_to_waitlist():
     
     assert updates[2]["list_type"] == "WAITLIST"
     assert updates[2]["sequence_number"] == 7
+
+def test_phases_between_lists_skipped_phases():
+    from logic import phases_between
+    assert phases_between("OPEN_FOR_ROSTER", "OPEN_FOR_RESERVES") == ["OPEN_FOR_RESERVES"]
+    assert phases_between("OPEN_FOR_RESERVES", "FINAL_ORDERING") == ["PRELIMINARY_ORDERING", "FINAL_ORDERING"]
+    assert phases_between("SCHEDULED", "FINAL_ORDERING") == ["FINAL_ORDERING"]
+
+def test_resequence_holding_only_returns_changed_rows():
+    from logic import resequence_holding
+    queue = [
+        {"id": "s1", "list_type": "WAITLIST_HOLDING", "sequence_number": 1},
+        {"id": "s3", "list_type": "WAITLIST_HOLDING", "sequence_number": 3},
+        {"id": "s2", "list_type": "WAITLIST_HOLDING", "sequence_number": 2},
+    ]
+
+    updates = resequence_holding(queue)
+
+    # s1 is already in place; the others only change position
+    assert updates == [{"id": "s3", "sequence_number": 2}, {"id": "s2", "sequence_number": 3}]
+
+def test_promote_from_holding_returns_minimal_diffs():
+    from logic import summarize_list_changes
+    queue = [
+        {"id": "s1", "list_type": "WAITLIST_HOLDING", "sequence_number": 1},
+        {"id": "s2", "list_type": "WAITLIST", "sequence_number": 1},
+    ]
+
+    updates = promote_from_holding(queue, 15, 15, 0)
+
+    assert updates == [{"id": "s1", "list_type": "WAITLIST"}, {"id": "s2", "sequence_number": 2}]
+    assert summarize_list_changes(updates) == {"EVENT": 0, "WAITLIST": 1, "WAITLIST_HOLDING": 0, "resequenced": 1}
+
+def test_seeded_lottery_is_reproducible():
+    from logic import recompute_lottery
+    users = [{"id": f"s{i}", "tier": 2 if i % 2 else 3} for i in range(10)]
+
+    first = randomize_holding_queue(list(users), seed=42)
+    again = randomize_holding_queue(list(reversed(users)), seed=42)
+    assert [u["id"] for u in first] == [u["id"] for u in again]
+    assert [u["tier"] for u in first] == [2] * 5 + [3] * 5
+
+    # A withdrawal does not reshuffle anyone else
+    withdrawn = randomize_holding_queue([u for u in users if u["id"] != first[0]["id"]], seed=42)
+    assert [u["id"] for u in withdrawn] == [u["id"] for u in first[1:]]
+
+    # Signups made after the draw are not lottery entrants
+    drawn_at = "2026-03-09T19:00:00+00:00"
+    signups = [dict(u, created_at="2026-03-09T10:00:00+00:00") for u in users]
+    signups.append({"id": "late", "tier": 2, "created_at": "2026-03-09T20:00:00+00:00"})
+    replay = recompute_lottery(signups, 42, drawn_at)
+    assert [s["id"] for s in replay] == [u["id"] for u in first]
+    assert [s["lottery_position"] for s in replay] == list(range(1, 11))
@@ -0,0 +1,69 @@
+import pytest
+import sys
+import os
+from datetime import datetime, timedelta, timezone
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import membership_cache
+from logic import check_signup_eligibility
+from membership_cache import MembershipCache
+from mock_supabase import MockSupabase
+
+def make_db(num_profiles=5):
+    db = MockSupabase()
+    db.seed("cache_versions", [{"name": "memberships", "version": 1}])
+    db.seed("user_groups", [
+        {"id": "g-admin", "name": "Admin", "guest_limit": 0},
+        {"id": "g-roster", "name": "Roster", "guest_limit": 2},
+        {"id": "g-res", "name": "Reserves", "guest_limit": 0},
+    ])
+    db.seed("profiles", [{"id": f"p{i}", "auth_user_id": f"a{i}", "email": f"p{i}@example.com"} for i in range(num_profiles)])
+    db.seed("profile_groups", [{"profile_id": f"p{i}", "group_id": "g-roster" if i % 2 == 0 else "g-res"} for i in range(num_profiles)])
+    db.seed("profile_groups", [{"profile_id": "p1", "group_id": "g-admin"}])
+    return db
+
+def test_bulk_load_builds_compact_group_sets(monkeypatch):
+    monkeypatch.setattr(membership_cache, "PAGE_SIZE", 2)
+    cache = MembershipCache(make_db())
+    cache.load()
+
+    assert cache.group_ids("p0") == frozenset({"g-roster"})
+    assert cache.group_ids("p1") == frozenset({"g-res", "g-admin"})
+    assert cache.group_ids("unknown") == frozenset()
+    assert cache.profile_id_for_auth_user("a4") == "p4"
+    assert cache.max_guest_limit("p0") == 2
+    assert cache.member_counts() == {"g-roster": 3, "g-res": 2, "g-admin": 1}
+
+def test_admin_and_eligibility_checks_need_no_queries():
+    db = make_db()
+    cache = MembershipCache(db, version_check_seconds=3600)
+    cache.load()
+    event = {"status": "OPEN_FOR_RESERVES", "roster_user_group": "g-roster", "reserve_first_priority_user_group": "g-res"}
+    now = datetime(2026, 3, 1, tzinfo=timezone.utc)
+
+    queries_before = db.query_count
+    assert cache.is_admin("a1")
+    assert not cache.is_admin("a0")
+    assert check_signup_eligibility(event, cache.group_ids("p0"), now)["target_list"] == "EVENT"
+    assert check_signup_eligibility(event, cache.group_ids("p1"), now)["target_list"] == "WAITLIST_HOLDING"
+    assert db.query_count == queries_before
+
+def test_local_updates_and_version_invalidation():
+    db = make_db()
+    cache = MembershipCache(db, version_check_seconds=0)
+    cache.load()
+
+    cache.add_members("g-admin", ["p0"])
+    assert cache.is_admin("a0")
+    cache.remove_member("g-admin", "p0")
+    cache.set_groups("p2", [])
+    assert not cache.is_admin("a0")
+    assert cache.group_ids("p2") == frozenset()
+
+    # Another instance changes memberships: the version bump triggers a reload
+    db.seed("profile_groups", [{"profile_id": "p0", "group_id": "g-admin"}])
+    db._table("cache_versions").rows["memberships"]["version"] = 2
+    assert cache.is_admin("a0")
+    assert cache.group_ids("p2") == frozenset({"g-roster"})
+    assert cache.version == 2
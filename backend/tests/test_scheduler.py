@@ -0,0 +1,184 @@
+import pytest
+import sys
+import os
+from datetime import datetime, timedelta, timezone
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_supabase import MockSupabase
+from scheduler import process_status_transitions
+from simulation import RecordingEmailService, DEFAULT_EVENT_TYPE
+from clock import SimulatedClock
+
+EVENT_DATE = datetime(2026, 3, 10, 2, 0, 0, tzinfo=timezone.utc)
+
+def make_db(status, holding_tiers, roster_count=13):
+    db = MockSupabase()
+    db.seed("user_groups", [
+        {"id": "g-roster", "name": "Roster", "group_email": "roster@example.com"},
+        {"id": "g-res1", "name": "Reserves 1", "group_email": "res1@example.com"},
+        {"id": "g-res2", "name": "Reserves 2", "group_email": "res2@example.com"},
+    ])
+    db.seed("event_types", [dict(
+        DEFAULT_EVENT_TYPE, id="t1", name="Tuesday Basketball", day_of_week=2, time_of_day="18:00:00",
+        roster_user_group="g-roster", reserve_first_priority_user_group="g-res1", reserve_second_priority_user_group="g-res2"
+    )])
+    db.seed("events", [{"id": "e1", "event_type_id": "t1", "event_date": EVENT_DATE.isoformat(), "status": status}])
+
+    profiles, signups = [], []
+    for i in range(roster_count):
+        profiles.append({"id": f"r{i}", "email": f"r{i}@example.com"})
+        signups.append({"id": f"s-r{i}", "event_id": "e1", "user_id": f"r{i}", "list_type": "EVENT", "sequence_number": i + 1, "tier": 1})
+    for i, tier in enumerate(holding_tiers):
+        profiles.append({"id": f"h{i}", "email": f"h{i}@example.com"})
+        signups.append({"id": f"s-h{i}", "event_id": "e1", "user_id": f"h{i}", "list_type": "WAITLIST_HOLDING", "sequence_number": i + 1, "tier": tier})
+    db.seed("profiles", profiles)
+    db.seed("event_signups", signups)
+    return db
+
+def run(db, now):
+    recorder = RecordingEmailService(SimulatedClock(now))
+    result = process_status_transitions(db, now, notifier=recorder)
+    return result, recorder.sent
+
+def test_catch_up_from_open_for_reserves_to_final_ordering():
+    # Arrival order puts tier 3 reserves first; the skipped randomization must fix that
+    db = make_db("OPEN_FOR_RESERVES", [3, 3, 2, 2, 3, 2])
+    now = EVENT_DATE - timedelta(minutes=60)  # past final_reserve_scheduling (180 min before)
+
+    result, emails = run(db, now)
+
+    assert result["transitions"] == [{
+        "event_id": "e1",
+        "from": "OPEN_FOR_RESERVES",
+        "to": "FINAL_ORDERING",
+        "skipped": ["PRELIMINARY_ORDERING"],
+        "randomized": 6,
+        "promoted": 6
+    }]
+    assert db.rows("events")[0]["status"] == "FINAL_ORDERING"
+
+    signups = {s["id"]: s for s in db.rows("event_signups")}
+    assert not [s for s in signups.values() if s["list_type"] == "WAITLIST_HOLDING"]
+
+    # 2 open roster spots go to tier 2, everyone else lands on the waitlist with tier 2 ahead of tier 3
+    placed = sorted(
+        [s for s in signups.values() if s["id"].startswith("s-h")],
+        key=lambda s: (s["list_type"] != "EVENT", s["sequence_number"])
+    )
+    assert [s["tier"] for s in placed] == [2, 2, 2, 3, 3, 3]
+    assert [s["list_type"] for s in placed] == ["EVENT", "EVENT", "WAITLIST", "WAITLIST", "WAITLIST", "WAITLIST"]
+
+    # Only the final schedule email is still relevant
+    assert {e["subject"] for e in emails} == {"Final Schedule Locked: Tuesday Basketball"}
+
+def test_catch_up_from_not_yet_open_sends_window_emails_in_order():
+    db = make_db("NOT_YET_OPEN", [2, 3])
+    now = EVENT_DATE - timedelta(minutes=600)  # inside OPEN_FOR_RESERVES
+
+    result, emails = run(db, now)
+
+    assert result["transitions"][0]["skipped"] == ["OPEN_FOR_ROSTER"]
+    assert [e["subject"].split(":")[0] for e in emails] == ["Signups Open", "Waitlist/Reserve Open", "Waitlist/Reserve Open"]
+    # No ordering happens before the preliminary phase
+    assert {s["list_type"] for s in db.rows("event_signups") if s["id"].startswith("s-h")} == {"WAITLIST_HOLDING"}
+
+def test_catch_up_to_finished_skips_ordering_and_emails():
+    db = make_db("OPEN_FOR_RESERVES", [2, 3])
+    now = EVENT_DATE + timedelta(hours=3)
+
+    result, emails = run(db, now)
+
+    assert result["transitions"][0]["to"] == "FINISHED"
+    assert result["users_promoted"] == 0
+    assert emails == []
+
+def test_transition_already_claimed_by_another_instance():
+    db = make_db("OPEN_FOR_ROSTER", [])
+    now = EVENT_DATE - timedelta(minutes=600)
+
+    # Another instance moves the event first, between our read and our write
+    original_table = db.table
+    def racing_table(name):
+        query = original_table(name)
+        if name == "events":
+            original_update = query.update
+            def update(payload):
+                db._table("events").rows["e1"]["status"] = "OPEN_FOR_RESERVES"
+                return original_update(payload)
+            query.update = update
+        return query
+    db.table = racing_table
+
+    result, emails = run(db, now)
+
+    assert result["processed_events"] == 0
+    assert emails == []
+
+def test_lottery_seed_is_recorded_and_replayable():
+    from logic import recompute_lottery
+    db = make_db("OPEN_FOR_RESERVES", [3, 2, 3, 2])
+    now = EVENT_DATE - timedelta(minutes=300)  # inside PRELIMINARY_ORDERING
+
+    run(db, now)
+
+    event = db.rows("events")[0]
+    assert event["status"] == "PRELIMINARY_ORDERING"
+    assert event["lottery_seed"] is not None
+    assert event["lottery_drawn_at"] == now.isoformat()
+
+    holding = sorted([s for s in db.rows("event_signups") if s["list_type"] == "WAITLIST_HOLDING"], key=lambda s: s["sequence_number"])
+    replay = recompute_lottery(db.rows("event_signups"), event["lottery_seed"])
+    assert [s["id"] for s in replay] == [s["id"] for s in holding]
+
+def test_rerun_after_crash_reuses_the_stored_seed():
+    from logic import randomize_holding_queue
+    db = make_db("OPEN_FOR_RESERVES", [3, 2, 3, 2, 2, 3])
+    db._table("events").rows["e1"]["lottery_seed"] = 1234
+    now = EVENT_DATE - timedelta(minutes=300)
+
+    run(db, now)
+
+    assert db.rows("events")[0]["lottery_seed"] == 1234
+    holding = sorted([s for s in db.rows("event_signups") if s["list_type"] == "WAITLIST_HOLDING"], key=lambda s: s["sequence_number"])
+    expected = randomize_holding_queue([s for s in db.rows("event_signups") if s["tier"] in (2, 3)], seed=1234)
+    assert [s["id"] for s in holding] == [s["id"] for s in expected]
+
+def test_group_emails_are_resolved_once_per_run():
+    db = make_db("NOT_YET_OPEN", [2, 3])
+    db.seed("events", [
+        {"id": f"e{n}", "event_type_id": "t1", "event_date": (EVENT_DATE + timedelta(minutes=n)).isoformat(), "status": "NOT_YET_OPEN"}
+        for n in range(2, 6)
+    ])
+    tables = []
+    table = db.table
+    db.table = lambda name: (tables.append(name), table(name))[1]
+
+    result, emails = run(db, EVENT_DATE - timedelta(minutes=600))
+
+    assert result["processed_events"] == 5
+    # 5 events x 3 emails, all resolved from a single user_groups query
+    assert len(emails) == 15
+    assert {e["to"] for e in emails} == {"roster@example.com", "res1@example.com", "res2@example.com"}
+    assert tables.count("user_groups") == 1
+
+def test_signups_covered_by_the_roster_alias_are_not_mailed_twice():
+    db = make_db("PRELIMINARY_ORDERING", [2, 3])
+    # Everyone on the roster except r0 is a member of the roster group (synced to its alias)
+    db.seed("profile_groups", [{"profile_id": f"r{i}", "group_id": "g-roster"} for i in range(1, 13)])
+
+    result, emails = run(db, EVENT_DATE - timedelta(minutes=60))
+
+    assert result["transitions"][0]["to"] == "FINAL_ORDERING"
+    assert sorted(e["to"] for e in emails) == ["h0@example.com", "h1@example.com", "r0@example.com", "roster@example.com"]
+
+def test_sequence_only_diffs_keep_their_list_type():
+    from scheduler import upsert_signup_diffs
+    db = MockSupabase()
+    queue = [{"id": "s1", "event_id": "e1", "user_id": "u1", "list_type": "WAITLIST_HOLDING", "sequence_number": 4}]
+    db.seed("event_signups", queue)
+
+    # resequence_holding diffs carry only the new sequence number
+    assert upsert_signup_diffs(db, "e1", queue, [{"id": "s1", "sequence_number": 1}]) == 1
+    row = db.rows("event_signups")[0]
+    assert (row["list_type"], row["sequence_number"]) == ("WAITLIST_HOLDING", 1)
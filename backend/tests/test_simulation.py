@@ -0,0 +1,60 @@
+import pytest
+import sys
+import os
+from datetime import datetime, timedelta, timezone
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import clock
+from simulation import build_synthetic_dataset, run_simulation
+
+START = datetime(2026, 3, 2, 10, 0, 0, tzinfo=timezone.utc)
+
+def test_simulation_walks_every_event_through_the_lifecycle():
+    db = build_synthetic_dataset(START, num_events=50, num_event_types=5)
+    report = run_simulation(db, START, START + timedelta(days=12))
+
+    summary = report["summary"]
+    assert summary["by_target_status"] == {
+        "OPEN_FOR_ROSTER": 50,
+        "OPEN_FOR_RESERVES": 50,
+        "PRELIMINARY_ORDERING": 50,
+        "FINAL_ORDERING": 50,
+        "FINISHED": 50,
+    }
+    assert all(e["status"] == "FINISHED" for e in db.rows("events"))
+    # Nobody is left in holding once final ordering has run
+    assert not [s for s in db.rows("event_signups") if s["list_type"] == "WAITLIST_HOLDING"]
+    assert summary["users_randomized"] == summary["users_promoted"]
+
+    # Transitions are reported in virtual-time order
+    times = [t["at"] for t in report["transitions"]]
+    assert times == sorted(times)
+
+    subjects = {e["subject"].split(":")[0] for e in report["emails"]}
+    assert subjects == {"Signups Open", "Waitlist/Reserve Open", "Initial Schedule Released", "Final Schedule Locked"}
+
+def test_simulation_fires_transitions_at_exact_timestamps():
+    db = build_synthetic_dataset(START, num_events=5, num_event_types=1)
+    report = run_simulation(db, START, START + timedelta(days=12))
+
+    events = {e["id"]: e for e in db.rows("events")}
+    for t in report["transitions"]:
+        if t["to"] != "OPEN_FOR_ROSTER":
+            continue
+        event_date = datetime.fromisoformat(events[t["event_id"]]["event_date"])
+        assert datetime.fromisoformat(t["at"]) == event_date - timedelta(minutes=4320)
+
+def test_simulation_restores_the_clock():
+    previous = clock.get_clock()
+    db = build_synthetic_dataset(START, num_events=1, num_event_types=1)
+    run_simulation(db, START, START + timedelta(days=1))
+    assert clock.get_clock() is previous
+
+def test_simulation_thousands_of_events_performance():
+    db = build_synthetic_dataset(START, num_events=2000, num_event_types=20)
+    report = run_simulation(db, START, START + timedelta(days=12))
+
+    assert report["summary"]["transitions"] == 2000 * 5
+    # Generous CI budget; a full run takes a few seconds locally
+    assert report["summary"]["elapsed_seconds"] < 60
@@ -0,0 +1,70 @@
+import pytest
+import sys
+import os
+from datetime import datetime, timedelta, timezone
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import status_engine
+from logic import STATUS_ORDER, enrich_event, determine_event_status
+from status_engine import enrich_events, next_transitions, target_statuses, benchmark
+
+NOW = datetime(2026, 3, 10, 12, 0, 0, tzinfo=timezone.utc)
+EVENT_TYPE = {
+    "id": "t1", "name": "Tuesday Basketball", "max_signups": 15, "duration": "01:30:00",
+    "roster_sign_up_open_minutes": 4320, "reserve_sign_up_open_minutes": 720,
+    "initial_reserve_scheduling_minutes": 420, "final_reserve_scheduling_minutes": 180,
+}
+
+def make_rows():
+    rows = []
+    # Event starts from 4 days ahead to 3 hours ago, every 20 minutes, with every stored status
+    for n, minutes in enumerate(range(-180, 4 * 24 * 60, 20)):
+        event_date = NOW + timedelta(minutes=minutes)
+        status = (STATUS_ORDER + ["SCHEDULED", "CANCELLED"])[n % 8]
+        # Mix of UTC strings, other offsets and datetimes
+        if n % 3 == 0:
+            date_value = event_date.isoformat()
+        elif n % 3 == 1:
+            date_value = event_date.astimezone(timezone(timedelta(hours=-8))).isoformat()
+        else:
+            date_value = event_date
+        rows.append({"id": f"e{n}", "event_date": date_value, "status": status, "event_types": dict(EVENT_TYPE)})
+    return rows
+
+@pytest.fixture
+def bulk(monkeypatch):
+    monkeypatch.setattr(status_engine, "BULK_THRESHOLD", 1)
+
+def test_vectorized_statuses_match_per_row_functions(bulk):
+    rows = make_rows()
+    expected = [determine_event_status(enrich_event(dict(r), NOW), NOW) for r in rows]
+    assert target_statuses(rows, NOW) == expected
+
+def test_vectorized_next_transitions_match_enrich_event(bulk):
+    rows = make_rows()
+    expected = [enrich_event(dict(r), NOW) for r in rows]
+    bulk_rows = enrich_events([dict(r) for r in rows], NOW)
+
+    for single, vectorized in zip(expected, bulk_rows):
+        for key in ("status", "next_status", "roster_sign_up_open", "final_reserve_scheduling", "name", "duration"):
+            assert single[key] == vectorized[key], (single["id"], key)
+        # Same instant; the bulk path always reports UTC
+        if single["next_status_at"]:
+            assert datetime.fromisoformat(single["next_status_at"]) == datetime.fromisoformat(vectorized["next_status_at"])
+        else:
+            assert vectorized["next_status_at"] is None
+
+    assert next_transitions(rows, NOW) == [
+        datetime.fromisoformat(e["next_status_at"]) if e["next_status_at"] else None for e in expected
+    ]
+
+def test_small_batches_use_the_per_row_path():
+    rows = make_rows()[:3]
+    assert status_engine.BULK_THRESHOLD > len(rows)
+    assert target_statuses(rows, NOW) == [determine_event_status(enrich_event(dict(r), NOW), NOW) for r in rows]
+
+def test_benchmark_agrees_with_per_row_functions():
+    # The benchmark asserts both paths return the same statuses
+    result = benchmark(5000)
+    assert result["events"] == 5000
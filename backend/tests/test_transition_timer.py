@@ -0,0 +1,57 @@
+import pytest
+import sys
+import os
+from unittest.mock import MagicMock
+from datetime import datetime, timedelta, timezone
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from transition_timer import TransitionTimer
+
+EVENT_TYPE = {
+    "name": "Tuesday Basketball",
+    "max_signups": 15,
+    "roster_sign_up_open_minutes": 4320,
+    "reserve_sign_up_open_minutes": 720,
+    "initial_reserve_scheduling_minutes": 420,
+    "final_reserve_scheduling_minutes": 180,
+    "duration": "02:00:00"
+}
+
+def make_timer(rows):
+    mock_supabase = MagicMock()
+    res = MagicMock()
+    res.data = rows
+    mock_supabase.table.return_value.select.return_value.neq.return_value.neq.return_value.execute.return_value = res
+    return TransitionTimer(mock_supabase, MagicMock())
+
+def test_load_queues_next_transition_per_event():
+    now = datetime(2026, 3, 2, 10, 0, 0, tzinfo=timezone.utc)
+    rows = [
+        # Roster opens 3 days before -> 2026-03-03T02:00
+        {"id": "e1", "status": "NOT_YET_OPEN", "event_date": "2026-03-06T02:00:00+00:00", "event_types": dict(EVENT_TYPE)},
+        # Reserves open 12 hours before -> 2026-03-02T14:00
+        {"id": "e2", "status": "OPEN_FOR_ROSTER", "event_date": "2026-03-03T02:00:00+00:00", "event_types": dict(EVENT_TYPE)},
+        # Manual events are never auto-transitioned
+        {"id": "e3", "status": "OPEN_FOR_ROSTER", "status_determinant": "MANUAL", "event_date": "2026-03-03T02:00:00+00:00", "event_types": dict(EVENT_TYPE)},
+    ]
+    timer = make_timer(rows)
+
+    assert timer.load(now) == 2
+    assert timer.next_fire_at() == datetime(2026, 3, 2, 14, 0, 0, tzinfo=timezone.utc)
+
+    assert timer.pop_due(datetime(2026, 3, 2, 13, 59, 59, tzinfo=timezone.utc)) == set()
+    assert timer.pop_due(datetime(2026, 3, 2, 14, 0, 0, tzinfo=timezone.utc)) == {"e2"}
+    assert timer.next_fire_at() == datetime(2026, 3, 3, 2, 0, 0, tzinfo=timezone.utc)
+
+def test_load_delays_overdue_transitions():
+    now = datetime(2026, 3, 2, 15, 0, 0, tzinfo=timezone.utc)
+    # Reserve window opened at 14:00 but the event is still OPEN_FOR_ROSTER
+    rows = [{"id": "e2", "status": "OPEN_FOR_ROSTER", "event_date": "2026-03-03T02:00:00+00:00", "event_types": dict(EVENT_TYPE)}]
+    timer = make_timer(rows)
+
+    timer.load(now)
+    assert timer.next_fire_at() == now
+
+    timer.load(now, overdue_delay=timedelta(seconds=30))
+    assert timer.next_fire_at() == now + timedelta(seconds=30)
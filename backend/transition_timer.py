@@ -0,0 +1,141 @@
+import asyncio
+import heapq
+from datetime import datetime, timedelta, timezone
+
+from status_engine import next_transitions
+
+
+class TransitionTimer:
+    """
+    Optional in-process scheduler that fires status transitions at their exact
+    timestamps instead of waiting for the next 5-minute cron tick.
+
+    Upcoming transition times (`next_status_at` from enrich_event) are kept in a
+    min-heap. The timer sleeps until the earliest one, then calls
+    `run_transitions(now, event_ids)` for every event that is due. The cron job
+    keeps running as a safety net; because transitions are compare-and-set on
+    the current status, the cron, this timer and any number of other instances
+    can race without double-processing an event.
+    """
+
+    def __init__(self, supabase_client, run_transitions, now_fn=None, reload_interval_seconds=600, retry_delay_seconds=30, event_types=None):
+        self.supabase = supabase_client
+        self.event_types = event_types
+        self.run_transitions = run_transitions
+        self.now_fn = now_fn or (lambda: datetime.now(timezone.utc))
+        self.reload_interval = timedelta(seconds=reload_interval_seconds)
+        self.retry_delay = timedelta(seconds=retry_delay_seconds)
+        self._heap = []
+        self._task = None
+
+    def load(self, now, overdue_delay=timedelta(0)):
+        """
+        Rebuilds the queue from the database: one (fire_at, event_id) entry per
+        active event that has a pending transition.
+
+        Transitions that are already overdue are scheduled at `now + overdue_delay`,
+        so an event whose transition keeps failing is retried instead of spun on.
+        """
+        res = self.supabase.table("events")\
+            .select(self._columns())\
+            .neq("status", "FINISHED")\
+            .neq("status", "CANCELLED")\
+            .execute()
+
+        heap = self._entries(res.data or [], now, overdue_delay)
+        heapq.heapify(heap)
+        self._heap = heap
+        return len(heap)
+
+    def refresh(self, now, event_ids, overdue_delay=timedelta(0)):
+        """Re-queues the given events (e.g. right after they transitioned) without reloading everything."""
+        if not event_ids:
+            return 0
+        res = self.supabase.table("events")\
+            .select(self._columns())\
+            .in_("id", list(event_ids))\
+            .neq("status", "FINISHED")\
+            .neq("status", "CANCELLED")\
+            .execute()
+        entries = self._entries(res.data or [], now, overdue_delay)
+        for entry in entries:
+            heapq.heappush(self._heap, entry)
+        return len(entries)
+
+    def _columns(self):
+        # With an EventTypeCache the type is joined in memory
+        return "*" if self.event_types is not None else "*, event_types(*)"
+
+    def _entries(self, rows, now, overdue_delay):
+        if self.event_types is not None:
+            self.event_types.attach(rows)
+        entries = []
+        rows = [row for row in rows if row.get("status_determinant") != "MANUAL"]
+        for row, fire_at in zip(rows, next_transitions(rows, now)):
+            if fire_at is None:
+                continue
+            if fire_at <= now:
+                fire_at = now + overdue_delay
+            entries.append((fire_at, str(row["id"])))
+        return entries
+
+    def pop_due(self, now):
+        """Removes and returns the ids of all events whose transition time has passed."""
+        due = set()
+        while self._heap and self._heap[0][0] <= now:
+            _, event_id = heapq.heappop(self._heap)
+            due.add(event_id)
+        return due
+
+    def next_fire_at(self):
+        return self._heap[0][0] if self._heap else None
+
+    async def run(self):
+        now = self.now_fn()
+        await asyncio.to_thread(self.load, now)
+        reload_at = now + self.reload_interval
+
+        while True:
+            now = self.now_fn()
+            due = self.pop_due(now)
+
+            if due:
+                print(f"TransitionTimer: firing transitions for {len(due)} event(s) at {now.isoformat()}")
+                try:
+                    await asyncio.to_thread(self.run_transitions, now, sorted(due))
+                except Exception as e:
+                    print(f"TransitionTimer: transition run failed: {e}")
+                # The fired events now have new next_status_at values
+                try:
+                    await asyncio.to_thread(self.refresh, now, due, self.retry_delay)
+                except Exception as e:
+                    print(f"TransitionTimer: failed to re-queue fired events: {e}")
+                    reload_at = now
+
+            if now >= reload_at:
+                try:
+                    await asyncio.to_thread(self.load, now, self.retry_delay)
+                except Exception as e:
+                    print(f"TransitionTimer: failed to reload transition queue: {e}")
+                reload_at = now + self.reload_interval
+
+            wake_at = reload_at
+            next_fire = self.next_fire_at()
+            if next_fire and next_fire < wake_at:
+                wake_at = next_fire
+
+            await asyncio.sleep(max((wake_at - self.now_fn()).total_seconds(), 0))
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run())
+        return self._task
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
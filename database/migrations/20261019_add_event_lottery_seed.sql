@@ -0,0 +1,5 @@
+-- Per-event lottery seed, recorded when the Holding Queue is randomized
+-- (PRELIMINARY_ORDERING). The tier 2/3 ordering can be recomputed from the
+-- seed and the signups created at or before lottery_drawn_at.
+ALTER TABLE events ADD COLUMN IF NOT EXISTS lottery_seed BIGINT;
+ALTER TABLE events ADD COLUMN IF NOT EXISTS lottery_drawn_at TIMESTAMP WITH TIME ZONE;
@@ -0,0 +1,52 @@
+-- Durable queue of outgoing email (backend/email_outbox.py).
+-- Rows are written in the same transaction as the state change that caused
+-- them and delivered by a background dispatcher with retries.
+CREATE TABLE IF NOT EXISTS email_outbox (
+  id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+  dedup_key TEXT UNIQUE, -- NULL = no deduplication
+  event_id UUID REFERENCES events(id) ON DELETE SET NULL,
+  to_email TEXT NOT NULL,
+  subject TEXT NOT NULL,
+  html TEXT NOT NULL,
+  status TEXT NOT NULL DEFAULT 'PENDING', -- PENDING, SENDING, SENT, DEAD
+  attempts INTEGER NOT NULL DEFAULT 0,
+  next_attempt_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+  last_error TEXT,
+  created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+  sent_at TIMESTAMP WITH TIME ZONE
+);
+
+CREATE INDEX IF NOT EXISTS email_outbox_due_idx ON email_outbox (next_attempt_at) WHERE status IN ('PENDING', 'SENDING');
+
+ALTER TABLE email_outbox ENABLE ROW LEVEL SECURITY;
+
+-- Compare-and-set status transition plus its notifications, atomically.
+-- Returns the updated event, or no rows when another run moved it first
+-- (in which case no email is queued either).
+CREATE OR REPLACE FUNCTION transition_event_with_outbox(
+  p_event_id UUID,
+  p_from event_status,
+  p_to event_status,
+  p_messages JSONB
+)
+RETURNS SETOF events AS $$
+DECLARE
+  updated events;
+BEGIN
+  UPDATE events SET status = p_to
+  WHERE id = p_event_id AND status = p_from
+  RETURNING * INTO updated;
+
+  IF NOT FOUND THEN
+    RETURN;
+  END IF;
+
+  INSERT INTO email_outbox (dedup_key, event_id, to_email, subject, html, next_attempt_at)
+  SELECT m->>'dedup_key', p_event_id, m->>'to_email', m->>'subject', m->>'html',
+         COALESCE((m->>'next_attempt_at')::timestamptz, NOW())
+  FROM jsonb_array_elements(COALESCE(p_messages, '[]'::jsonb)) AS m
+  ON CONFLICT (dedup_key) DO NOTHING;
+
+  RETURN NEXT updated;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,33 @@
+-- Digest messages (backend/email_outbox.py, EMAIL_DIGEST_MINUTES): non-urgent
+-- notifications held until the end of the digest window and delivered as one
+-- combined email per recipient.
+ALTER TABLE email_outbox ADD COLUMN IF NOT EXISTS digest BOOLEAN NOT NULL DEFAULT false;
+
+CREATE OR REPLACE FUNCTION transition_event_with_outbox(
+  p_event_id UUID,
+  p_from event_status,
+  p_to event_status,
+  p_messages JSONB
+)
+RETURNS SETOF events AS $$
+DECLARE
+  updated events;
+BEGIN
+  UPDATE events SET status = p_to
+  WHERE id = p_event_id AND status = p_from
+  RETURNING * INTO updated;
+
+  IF NOT FOUND THEN
+    RETURN;
+  END IF;
+
+  INSERT INTO email_outbox (dedup_key, event_id, to_email, subject, html, digest, next_attempt_at)
+  SELECT m->>'dedup_key', p_event_id, m->>'to_email', m->>'subject', m->>'html',
+         COALESCE((m->>'digest')::boolean, false),
+         COALESCE((m->>'next_attempt_at')::timestamptz, NOW())
+  FROM jsonb_array_elements(COALESCE(p_messages, '[]'::jsonb)) AS m
+  ON CONFLICT (dedup_key) DO NOTHING;
+
+  RETURN NEXT updated;
+END;
+$$ LANGUAGE plpgsql;
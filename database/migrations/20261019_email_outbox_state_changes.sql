@@ -0,0 +1,69 @@
+-- State changes made outside the scheduler (blackout date cancel / restore,
+-- late-stage waitlist promotion) written together with their notifications,
+-- like transition_event_with_outbox. Both are compare-and-set: when another
+-- writer got there first nothing is changed and no email is queued, and the
+-- caller re-reads and tries again.
+
+-- Moves every event in p_event_ids to p_to, or none of them: returns no rows
+-- unless each one is still AUTOMATIC and in one of the p_from statuses.
+CREATE OR REPLACE FUNCTION set_events_status_with_outbox(
+  p_event_ids UUID[],
+  p_from event_status[],
+  p_to event_status,
+  p_messages JSONB
+)
+RETURNS SETOF events AS $$
+BEGIN
+  PERFORM 1 FROM events WHERE id = ANY(p_event_ids) FOR UPDATE;
+
+  IF (SELECT count(*) FROM events
+      WHERE id = ANY(p_event_ids)
+        AND status = ANY(p_from)
+        AND status_determinant = 'AUTOMATIC') <> cardinality(p_event_ids) THEN
+    RETURN;
+  END IF;
+
+  UPDATE events SET status = p_to WHERE id = ANY(p_event_ids);
+
+  INSERT INTO email_outbox (dedup_key, event_id, to_email, subject, html, digest, next_attempt_at)
+  SELECT m->>'dedup_key', (m->>'event_id')::uuid, m->>'to_email', m->>'subject', m->>'html',
+         COALESCE((m->>'digest')::boolean, false),
+         COALESCE((m->>'next_attempt_at')::timestamptz, NOW())
+  FROM jsonb_array_elements(COALESCE(p_messages, '[]'::jsonb)) AS m
+  ON CONFLICT (dedup_key) DO NOTHING;
+
+  RETURN QUERY SELECT * FROM events WHERE id = ANY(p_event_ids);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Moves one signup from p_from to p_to at p_sequence_number. Returns the
+-- updated signup, or no rows when it is no longer on p_from.
+CREATE OR REPLACE FUNCTION move_signup_with_outbox(
+  p_signup_id UUID,
+  p_from list_type,
+  p_to list_type,
+  p_sequence_number INTEGER,
+  p_messages JSONB
+)
+RETURNS SETOF event_signups AS $$
+DECLARE
+  updated event_signups;
+BEGIN
+  UPDATE event_signups SET list_type = p_to, sequence_number = p_sequence_number
+  WHERE id = p_signup_id AND list_type = p_from
+  RETURNING * INTO updated;
+
+  IF NOT FOUND THEN
+    RETURN;
+  END IF;
+
+  INSERT INTO email_outbox (dedup_key, event_id, to_email, subject, html, digest, next_attempt_at)
+  SELECT m->>'dedup_key', updated.event_id, m->>'to_email', m->>'subject', m->>'html',
+         COALESCE((m->>'digest')::boolean, false),
+         COALESCE((m->>'next_attempt_at')::timestamptz, NOW())
+  FROM jsonb_array_elements(COALESCE(p_messages, '[]'::jsonb)) AS m
+  ON CONFLICT (dedup_key) DO NOTHING;
+
+  RETURN NEXT updated;
+END;
+$$ LANGUAGE plpgsql;
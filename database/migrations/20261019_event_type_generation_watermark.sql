@@ -0,0 +1,5 @@
+-- Incremental event generation: each event type remembers the last day that
+-- generate_future_events has materialized, and may override the 14-day horizon
+-- (e.g. 56 days for leagues).
+ALTER TABLE event_types ADD COLUMN IF NOT EXISTS generated_through DATE;
+ALTER TABLE event_types ADD COLUMN IF NOT EXISTS generation_horizon_days INTEGER;
@@ -0,0 +1,75 @@
+-- Change log of group memberships for the incremental Google Group sync
+-- (backend/google_service.py). Triggers on profile_groups (and on profile
+-- email changes) append ADD/REMOVE rows; a sync applies the rows after the
+-- group's google_synced_change_id and then prunes them. Sequence ids can
+-- commit out of order, so the periodic full reconciliation stays as a backstop.
+CREATE TABLE IF NOT EXISTS group_membership_changes (
+  id BIGSERIAL PRIMARY KEY,
+  group_id UUID NOT NULL REFERENCES user_groups(id) ON DELETE CASCADE,
+  profile_id UUID,
+  email TEXT,
+  op TEXT NOT NULL CHECK (op IN ('ADD', 'REMOVE')),
+  created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS group_membership_changes_group_idx ON group_membership_changes (group_id, id);
+
+ALTER TABLE group_membership_changes ENABLE ROW LEVEL SECURITY;
+
+ALTER TABLE user_groups ADD COLUMN IF NOT EXISTS google_synced_change_id BIGINT; -- NULL = never synced, next sync is a full one
+ALTER TABLE user_groups ADD COLUMN IF NOT EXISTS google_synced_at TIMESTAMP WITH TIME ZONE;
+ALTER TABLE user_groups ADD COLUMN IF NOT EXISTS google_full_sync_at TIMESTAMP WITH TIME ZONE;
+
+-- Recording a sync must not invalidate every instance's membership cache:
+-- only bump its version for the user_groups columns the cache serves
+DROP TRIGGER IF EXISTS user_groups_bump_version ON user_groups;
+CREATE TRIGGER user_groups_bump_version
+AFTER INSERT OR DELETE OR UPDATE OF name, description, group_email, guest_limit, group_type ON user_groups
+FOR EACH STATEMENT EXECUTE FUNCTION bump_memberships_version();
+
+CREATE OR REPLACE FUNCTION log_profile_group_change()
+RETURNS trigger AS $$
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    INSERT INTO group_membership_changes (group_id, profile_id, email, op)
+    SELECT NEW.group_id, NEW.profile_id, p.email, 'ADD' FROM profiles p WHERE p.id = NEW.profile_id;
+    RETURN NULL;
+  END IF;
+
+  -- When the profile itself is being deleted its row is already gone, so fall
+  -- back to the email logged when the membership was added
+  INSERT INTO group_membership_changes (group_id, profile_id, email, op)
+  VALUES (OLD.group_id, OLD.profile_id, COALESCE(
+    (SELECT email FROM profiles WHERE id = OLD.profile_id),
+    (SELECT email FROM group_membership_changes
+     WHERE group_id = OLD.group_id AND profile_id = OLD.profile_id AND email IS NOT NULL
+     ORDER BY id DESC LIMIT 1)
+  ), 'REMOVE');
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS profile_groups_log_change ON profile_groups;
+CREATE TRIGGER profile_groups_log_change
+AFTER INSERT OR DELETE ON profile_groups
+FOR EACH ROW EXECUTE FUNCTION log_profile_group_change();
+
+-- A changed email moves the member's Google Group subscriptions
+CREATE OR REPLACE FUNCTION log_profile_email_change()
+RETURNS trigger AS $$
+BEGIN
+  INSERT INTO group_membership_changes (group_id, profile_id, email, op)
+  SELECT pg.group_id, NEW.id, e.email, e.op
+  FROM profile_groups pg
+  CROSS JOIN (VALUES (OLD.email, 'REMOVE', 1), (NEW.email, 'ADD', 2)) AS e(email, op, seq)
+  WHERE pg.profile_id = NEW.id AND e.email IS NOT NULL
+  ORDER BY pg.group_id, e.seq;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS profiles_log_email_change ON profiles;
+CREATE TRIGGER profiles_log_email_change
+AFTER UPDATE OF email ON profiles
+FOR EACH ROW WHEN (OLD.email IS DISTINCT FROM NEW.email)
+EXECUTE FUNCTION log_profile_email_change();
@@ -0,0 +1,35 @@
+-- Version counters for in-process caches. Every backend instance polls the
+-- 'memberships' row (backend/membership_cache.py) and reloads its group /
+-- membership index when it changes.
+CREATE TABLE IF NOT EXISTS cache_versions (
+  name TEXT PRIMARY KEY,
+  version BIGINT NOT NULL DEFAULT 0
+);
+
+INSERT INTO cache_versions (name, version) VALUES ('memberships', 0)
+ON CONFLICT (name) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION bump_memberships_version()
+RETURNS trigger AS $$
+BEGIN
+  UPDATE cache_versions SET version = version + 1 WHERE name = 'memberships';
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS profile_groups_bump_version ON profile_groups;
+CREATE TRIGGER profile_groups_bump_version
+AFTER INSERT OR UPDATE OR DELETE ON profile_groups
+FOR EACH STATEMENT EXECUTE FUNCTION bump_memberships_version();
+
+DROP TRIGGER IF EXISTS user_groups_bump_version ON user_groups;
+CREATE TRIGGER user_groups_bump_version
+AFTER INSERT OR UPDATE OR DELETE ON user_groups
+FOR EACH STATEMENT EXECUTE FUNCTION bump_memberships_version();
+
+DROP TRIGGER IF EXISTS profiles_bump_version ON profiles;
+CREATE TRIGGER profiles_bump_version
+AFTER INSERT OR DELETE OR UPDATE OF auth_user_id ON profiles
+FOR EACH STATEMENT EXECUTE FUNCTION bump_memberships_version();
+
+ALTER TABLE cache_versions ENABLE ROW LEVEL SECURITY;
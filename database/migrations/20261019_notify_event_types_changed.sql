@@ -0,0 +1,20 @@
+-- Tell every backend instance to drop its event type cache when event_types
+-- change (backend/event_type_cache.py LISTENs on this channel).
+CREATE OR REPLACE FUNCTION notify_event_types_changed()
+RETURNS trigger AS $$
+BEGIN
+  PERFORM pg_notify('event_types_changed', COALESCE(NEW.id, OLD.id)::text);
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS event_types_changed ON event_types;
+CREATE TRIGGER event_types_changed
+AFTER INSERT OR UPDATE OR DELETE ON event_types
+FOR EACH ROW EXECUTE FUNCTION notify_event_types_changed();
+
+-- Group renames show up in the cached group names too
+DROP TRIGGER IF EXISTS user_groups_changed ON user_groups;
+CREATE TRIGGER user_groups_changed
+AFTER UPDATE OF name OR DELETE ON user_groups
+FOR EACH ROW EXECUTE FUNCTION notify_event_types_changed();
@@ -0,0 +1,18 @@
+-- One event per event type and start time, so future-event generation can bulk
+-- insert with ON CONFLICT DO NOTHING on every cron tick.
+
+-- Drop duplicate events that nobody has signed up for. A slot keeps its rows
+-- with signups; a slot where no row has any keeps its lowest id.
+DELETE FROM events e
+USING events other
+WHERE e.event_type_id = other.event_type_id
+  AND e.event_date = other.event_date
+  AND e.id <> other.id
+  AND NOT EXISTS (SELECT 1 FROM event_signups s WHERE s.event_id = e.id)
+  AND (
+    EXISTS (SELECT 1 FROM event_signups s WHERE s.event_id = other.id)
+    OR other.id < e.id
+  );
+
+-- Fails only if a slot has several events with signups; merge those by hand first.
+ALTER TABLE events ADD CONSTRAINT events_event_type_id_event_date_key UNIQUE (event_type_id, event_date);
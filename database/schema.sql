@@ -12,7 +12,10 @@ CREATE TABLE user_groups (
   google_group_id TEXT,
   group_email TEXT,
   guest_limit INTEGER DEFAULT 0,
-  group_type user_group_type DEFAULT 'OTHER'
+  group_type user_group_type DEFAULT 'OTHER',
+  google_synced_change_id BIGINT, -- last group_membership_changes id applied to the Google Group
+  google_synced_at TIMESTAMP WITH TIME ZONE,
+  google_full_sync_at TIMESTAMP WITH TIME ZONE
 );
 
 -- Profiles (Public user data linked to auth.users)
@@ -35,6 +38,19 @@ ALTER TABLE profiles ENABLE ROW LEVEL SECURITY;
 ALTER TABLE user_groups ENABLE ROW LEVEL SECURITY;
 ALTER TABLE profile_groups ENABLE ROW LEVEL SECURITY;
 
+-- Membership change log for the incremental Google Group sync
+-- (filled by triggers, see migrations/20261019_group_membership_changes.sql)
+CREATE TABLE group_membership_changes (
+  id BIGSERIAL PRIMARY KEY,
+  group_id UUID NOT NULL REFERENCES user_groups(id) ON DELETE CASCADE,
+  profile_id UUID,
+  email TEXT,
+  op TEXT NOT NULL CHECK (op IN ('ADD', 'REMOVE')),
+  created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+CREATE INDEX group_membership_changes_group_idx ON group_membership_changes (group_id, id);
+ALTER TABLE group_membership_changes ENABLE ROW LEVEL SECURITY;
+
 -- Canceled Dates (Blocklist)
 CREATE TABLE cancelled_dates (
     date DATE PRIMARY KEY,
@@ -59,7 +75,9 @@ CREATE TABLE event_types (
   roster_user_group UUID REFERENCES user_groups(id),
   reserve_first_priority_user_group UUID REFERENCES user_groups(id),
   reserve_second_priority_user_group UUID REFERENCES user_groups(id),
-  duration INTERVAL NOT NULL DEFAULT '120 minutes'
+  duration INTERVAL NOT NULL DEFAULT '120 minutes',
+  generation_horizon_days INTEGER, -- NULL = default 14-day window
+  generated_through DATE -- last day generate_future_events has materialized
 );
 
 ALTER TABLE event_types ENABLE ROW LEVEL SECURITY;
@@ -70,7 +88,10 @@ CREATE TABLE events (
   event_type_id UUID REFERENCES event_types(id) ON DELETE CASCADE,
   event_date TIMESTAMP WITH TIME ZONE NOT NULL,
   status event_status DEFAULT 'NOT_YET_OPEN',
-  status_determinant event_status_determinant NOT NULL DEFAULT 'AUTOMATIC'
+  status_determinant event_status_determinant NOT NULL DEFAULT 'AUTOMATIC',
+  lottery_seed BIGINT,
+  lottery_drawn_at TIMESTAMP WITH TIME ZONE,
+  UNIQUE (event_type_id, event_date)
 );
 
 ALTER TABLE events ENABLE ROW LEVEL SECURITY;
@@ -106,6 +127,25 @@ CREATE TABLE registration_requests (
 );
 ALTER TABLE registration_requests ENABLE ROW LEVEL SECURITY;
 
+-- Email Outbox (durable queue drained by backend/email_outbox.py)
+CREATE TABLE email_outbox (
+  id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+  dedup_key TEXT UNIQUE, -- NULL = no deduplication
+  event_id UUID REFERENCES events(id) ON DELETE SET NULL,
+  to_email TEXT NOT NULL,
+  subject TEXT NOT NULL,
+  html TEXT NOT NULL,
+  status TEXT NOT NULL DEFAULT 'PENDING', -- PENDING, SENDING, SENT, DEAD
+  attempts INTEGER NOT NULL DEFAULT 0,
+  digest BOOLEAN NOT NULL DEFAULT false, -- held for the recipient's combined digest
+  next_attempt_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+  last_error TEXT,
+  created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+  sent_at TIMESTAMP WITH TIME ZONE
+);
+CREATE INDEX email_outbox_due_idx ON email_outbox (next_attempt_at) WHERE status IN ('PENDING', 'SENDING');
+ALTER TABLE email_outbox ENABLE ROW LEVEL SECURITY;
+
 
 -- Policies (Simple open policies for now, refine later)
 CREATE POLICY "Public profiles are viewable by everyone" ON profiles FOR SELECT USING (true);